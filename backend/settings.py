@@ -44,13 +44,16 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'homi.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'homi.routers.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'homi.async_views.AsyncViewMiddleware',
 ]
 
 ROOT_URLCONF = 'backend.urls'
@@ -76,13 +79,87 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Perfil de producción de SQLite (homi.sqlite): WAL para que las lecturas no
+# bloqueen a las escrituras, synchronous=NORMAL (seguro con WAL: sólo se pueden
+# perder las últimas transacciones ante un corte de energía, nunca se corrompe),
+# mmap y 64 MB de caché de páginas por conexión. BEGIN IMMEDIATE toma el candado
+# de escritura al empezar la transacción, así que dos transacciones no se
+# bloquean mutuamente a mitad de camino y SQLite espera hasta 'timeout' segundos
+# en cada intento; los reintentos de homi.sqlite (HOMI_SQLITE) se suman a esa
+# espera, por eso es corta
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'homi.sqlite',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA mmap_size=268435456;'
+                'PRAGMA cache_size=-65536;'
+                'PRAGMA temp_store=MEMORY;'
+            ),
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 1,
+        },
+        # Las pruebas usan un archivo con WAL como aquí: en la base en memoria
+        # compartida las lecturas chocan con los candados por tabla
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
+# Reintentos ante "database is locked" (homi.sqlite): RETRIES intentos extra con
+# espera exponencial con jitter entre 0 y min(BACKOFF_MAX, BACKOFF_BASE * 2^n)
+# segundos. MAX_WAIT acota en segundos la espera total de una sentencia contando
+# el 'timeout' de SQLite de cada intento: no se reintenta pasado ese tiempo (el
+# peor caso es MAX_WAIT más un 'timeout'). WRITER_QUEUE hace que las escrituras
+# del proceso esperen su turno en una cola en lugar de competir por el candado
+HOMI_SQLITE = {
+    'RETRIES': 5,
+    'MAX_WAIT': 5,
+    'BACKOFF_BASE': 0.01,
+    'BACKOFF_MAX': 0.5,
+    'WRITER_QUEUE': False,
+    'WRITER_QUEUE_TIMEOUT': 30,
+}
+
+# Réplicas de lectura (homi.routers): las vistas GET leen de una de ALIASES y
+# quien escribe lee del primario durante STICKY_SECONDS. La marca se guarda en
+# CACHE_ALIAS, que con varios procesos debe ser una caché compartida. Para
+# probar en local con un segundo archivo SQLite:
+#   DATABASES['replica'] = {**DATABASES['default'], 'NAME': BASE_DIR / 'replica.sqlite3',
+#                           'TEST': {'MIRROR': 'default'}}
+#   HOMI_READ_REPLICAS['ALIASES'] = ['replica']
+# y copiar el primario periódicamente con
+# python manage.py refresh_sqlite_replica replica --interval 2
+DATABASE_ROUTERS = ['homi.routers.ShardRouter', 'homi.routers.ReplicaRouter']
+
+HOMI_READ_REPLICAS = {
+    'ALIASES': [],
+    'STICKY_SECONDS': 5,
+    'CACHE_ALIAS': 'default',
+}
+
+# Particionado por casa (homi.shards): cada casa vive entera en una de las bases
+# de ALIASES; usuarios, tokens, perfiles y el directorio de shards quedan en
+# 'default'. Las casas nuevas van al shard con menos casas y
+# python manage.py move_household <casa> <alias> (o --rebalance) las mueve en
+# línea. El directorio casa -> shard se guarda DIRECTORY_TIMEOUT segundos en
+# CACHE_ALIAS para las lecturas (las escrituras lo leen de la base). Para mover
+# casas CACHE_ALIAS debe ser compartida entre procesos (no locmem): si no,
+# move_household se niega. Cada shard necesita su esquema:
+# python manage.py migrate --database <alias>
+HOMI_SHARDS = {
+    'ALIASES': ['default'],
+    'CACHE_ALIAS': 'default',
+    'DIRECTORY_TIMEOUT': 300,
+    # Espera a las escrituras en curso antes de copiar una casa
+    'MOVE_DRAIN_SECONDS': 2,
+    # Con más de un shard, ids globales de noticias, gastos, pagos, tareas y
+    # gastos personales que cada proceso reserva de una vez en la base global
+    'ID_BLOCK': 100,
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -127,13 +204,112 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'homi.authentication.CachedTokenAuthentication',
+        'homi.authentication.SignedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
 }
 
+# Caché de token -> usuario -> perfil -> casa actual (homi.authentication)
+# CACHE_ALIAS permite compartirla entre procesos usando una caché de Django
+HOMI_AUTH_CACHE = {
+    'MAX_ENTRIES': 2048,
+    'TIMEOUT': 60,
+    'CACHE_ALIAS': None,
+}
+
+# Duración en segundos de los tokens de acceso firmados (token_mode=signed)
+HOMI_ACCESS_TOKEN_LIFETIME = 15 * 60
+
+# Paginación por cursor de los listados (homi.pagination)
+HOMI_PAGINATION = {
+    'PAGE_SIZE': 50,
+    'MAX_PAGE_SIZE': 200,
+}
+
+# Versiones de las colecciones para los ETag de los listados (homi.versions)
+# Con CACHE_ALIAS se leen de una caché compartida en lugar de la base de datos.
+# Las escrituras las incrementan con incr(), que debe ser atómico entre procesos
+# (Redis, Memcached); TIMEOUT es la vida de cada contador
+HOMI_COLLECTION_VERSIONS = {
+    'CACHE_ALIAS': None,
+    'TIMEOUT': 300,
+}
+
+# Caché de lectura de los listados de la casa (homi.response_cache). Las claves
+# llevan las versiones de las colecciones, así que funciona igual con una caché
+# por proceso (locmem) que con una compartida (archivo, Redis, ...)
+HOMI_RESPONSE_CACHE = {
+    'ENABLED': True,
+    'CACHE_ALIAS': 'default',
+    'TIMEOUT': 300,
+    'LOCK_TIMEOUT': 5,
+    'LOCK_WAIT': 2,
+}
+
+# Agrupación de lecturas idénticas simultáneas dentro del proceso
+# (homi.singleflight). WAIT_TIMEOUT son los segundos que una petición espera el
+# resultado de otra antes de calcularlo ella misma
+HOMI_SINGLEFLIGHT = {
+    'ENABLED': True,
+    'WAIT_TIMEOUT': 10,
+}
+
+# Vistas async de los listados (homi.async_views): con el servidor ASGI
+# (backend/asgi.py) los GET de noticias, tareas, gastos, gastos personales e
+# información de la casa no ocupan un hilo mientras esperan. Sus consultas corren
+# en QUERY_THREADS hilos que conservan sus conexiones entre peticiones. Bajo
+# WSGI y en los lotes se usan siempre las vistas síncronas
+HOMI_ASYNC_VIEWS = {
+    'ENABLED': True,
+    'QUERY_THREADS': 4,
+}
+
+# Métricas por vista (homi.metrics) en GET /api/metrics/, sólo para usuarios
+# staff: peticiones, latencia, consultas SQL, su tiempo y bytes de respuesta, en
+# formato de texto de Prometheus. Son del proceso, sin candados. BUCKETS son los
+# límites en segundos del histograma de latencia. Apagadas por defecto; su costo
+# medido está en benchmarks/metrics_overhead.py
+HOMI_METRICS = {
+    'ENABLED': False,
+    'BUCKETS': (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+}
+
+# Eventos de cambios por casa (homi.events). BACKEND reparte los eventos entre
+# procesos; LocalBackend sólo entrega dentro del mismo proceso
+HOMI_EVENTS = {
+    'BACKEND': 'homi.events.LocalBackend',
+    'QUEUE_SIZE': 100,
+    'KEEPALIVE': 15,
+    'RETRY_MS': 5000,
+}
+
+# Sincronización incremental (homi.sync): cambios por respuesta y días que se
+# conservan en el registro (prune_household_changes)
+HOMI_SYNC = {
+    'MAX_CHANGES': 500,
+    'RETENTION_DAYS': 30,
+}
+
+# Lotes de operaciones (homi.batch): operaciones por lote e hilos para las
+# lecturas consecutivas. Con SQLite local las lecturas usan CPU y no esperan a
+# la base, así que los hilos no ganan (benchmarks/batch_startup.py); subirlo
+# sólo con un servidor de base de datos en red
+HOMI_BATCH = {
+    'MAX_REQUESTS': 20,
+    'MAX_WORKERS': 1,
+}
+
+# Carpeta donde se archivan los gastos personales antes de borrarlos (homi.archiving)
+HOMI_ARCHIVE_DIR = BASE_DIR / 'archive'
+
+# Segundos de vigencia del candado que impide dos archivados a la vez entre
+# procesos; el trabajo lo renueva mientras avanza, así que sólo importa si el
+# proceso se cae sin liberarlo
+HOMI_ARCHIVE_LOCK_TIMEOUT = 10 * 60
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:8000",
     "http://10.0.2.2:8000", 
@@ -141,5 +317,9 @@ CORS_ALLOWED_ORIGINS = [
 
 CORS_ALLOW_ALL_ORIGINS = True
 
+# Cursor de la página siguiente para los clientes que no piden ?limit=/?cursor=
+# y ETag de los listados para las peticiones condicionales
+CORS_EXPOSE_HEADERS = ['X-Next-Cursor', 'ETag']
+
 ALLOWED_HOSTS = ['*']
 
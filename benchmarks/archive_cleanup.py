@@ -0,0 +1,141 @@
+"""Archivado y borrado por lotes de un mes de gastos personales frente al DELETE único.
+
+Uso:
+    python -m benchmarks.archive_cleanup [--rows 2000000] [--households 200] [--batch-size 2000] [--legacy]
+
+Siembra --rows gastos del mes anterior repartidos entre --households casas,
+ejecuta archive_personal_expenses y, mientras tanto, un hilo escritor inserta
+gastos del mes actual para medir cuánto lo bloquea. Con --legacy se repite la
+medición con el DELETE único de antes sobre los mismos datos.
+"""
+import argparse
+import tempfile
+import threading
+import time
+
+from benchmarks.common import create_user, percentile, setup_django
+
+INSERT_SQL = (
+    'INSERT INTO homi_personalexpense '
+    '(title, description, cost, user_id, household_id, source, created_at, month, year) '
+    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)'
+)
+
+
+def seed(rows, households, year, month, prefix='archivo'):
+    from django.db import connection, transaction
+    from django.db.models import Count, Sum
+    from homi.models import Household, PersonalExpense, PersonalExpenseRollup
+
+    users = []
+    for index in range(households):
+        user, _ = create_user(f'{prefix}{index}')
+        household = Household.objects.create(name=f'Casa {index}', created_by=user)
+        household.members.add(user)
+        users.append((user.id, household.id))
+
+    created_at = f'{year}-{month:02d}-15 12:00:00'
+    chunk = 50_000
+    with transaction.atomic(), connection.cursor() as cursor:
+        for start in range(0, rows, chunk):
+            cursor.executemany(INSERT_SQL, [
+                ('Gasto', 'Descripción', '10.00', *users[index % households], 'manual', created_at, month, year)
+                for index in range(start, min(start + chunk, rows))
+            ])
+        PersonalExpenseRollup.objects.bulk_create([
+            PersonalExpenseRollup(**row)
+            for row in PersonalExpense.objects.filter(year=year, month=month)
+            .values('household_id', 'user_id', 'year', 'month')
+            .annotate(total=Sum('cost'), expense_count=Count('id')).order_by()
+        ])
+    return users[0]
+
+
+def writer(owner, stop, latencies, failures):
+    """Inserta gastos del mes actual sin pausa y registra la latencia de cada uno"""
+    from django.db import OperationalError, connection
+    from homi.models import PersonalExpense
+
+    try:
+        while not stop.is_set():
+            began = time.perf_counter()
+            try:
+                PersonalExpense.objects.create(
+                    title='Concurrente', description='...', cost='1.00', user_id=owner[0], household_id=owner[1]
+                )
+            except OperationalError:
+                # "database is locked": se agotó la espera del bloqueo de escritura
+                failures.append(time.perf_counter() - began)
+                continue
+            latencies.append(time.perf_counter() - began)
+    finally:
+        connection.close()
+
+
+def run_with_writer(owner, job):
+    stop = threading.Event()
+    latencies, failures = [], []
+    thread = threading.Thread(target=writer, args=(owner, stop, latencies, failures))
+    thread.start()
+    began = time.perf_counter()
+    try:
+        result = job()
+    finally:
+        elapsed = time.perf_counter() - began
+        stop.set()
+        thread.join()
+    return result, elapsed, (latencies, failures)
+
+
+def report(label, rows, elapsed, writes, max_lock):
+    latencies, failures = writes
+    latencies = [latency * 1000 for latency in latencies] or [0]
+    print(f'{label}: {rows} filas en {elapsed:.1f} s ({rows / elapsed:.0f} filas/s), '
+          f'bloqueo máximo {max_lock * 1000:.1f} ms')
+    print(f'    escritor concurrente: {len(latencies)} inserciones, p50 {percentile(latencies, 0.5):.1f} ms, '
+          f'p99 {percentile(latencies, 0.99):.1f} ms, máx {max(latencies):.1f} ms, '
+          f'{len(failures)} fallidas por bloqueo')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    parser.add_argument('--households', type=int, default=200)
+    parser.add_argument('--batch-size', type=int, default=2000)
+    parser.add_argument('--legacy', action='store_true', help='Medir también el DELETE único')
+    args = parser.parse_args()
+
+    setup_django()
+    from homi.archiving import archive_month, previous_month
+    from homi.models import PersonalExpense
+
+    year, month = previous_month()
+    began = time.perf_counter()
+    owner = seed(args.rows, args.households, year, month)
+    print(f'sembradas {args.rows} filas en {time.perf_counter() - began:.1f} s')
+
+    with tempfile.TemporaryDirectory(prefix='homi-archive-') as directory:
+        stats, elapsed, writes = run_with_writer(
+            owner, lambda: archive_month(year, month, base_dir=directory, batch_size=args.batch_size)
+        )
+    print(f'archivo: {stats["archived_rows"]} filas en {stats["archive_seconds"]:.1f} s '
+          f'({stats["archived_rows"] / stats["archive_seconds"]:.0f} filas/s)')
+    report(f'borrado por lotes ({stats["batches"]} lotes)', stats['deleted_rows'],
+           stats['delete_seconds'], writes, stats['max_lock_seconds'])
+    assert stats['archived_rows'] == stats['deleted_rows'] == args.rows
+    assert not PersonalExpense.objects.filter(year=year, month=month).exists()
+
+    if args.legacy:
+        owner = seed(args.rows, args.households, year, month, prefix='legacy')
+
+        def legacy():
+            began = time.perf_counter()
+            PersonalExpense.objects.filter(year=year, month=month).delete()
+            return time.perf_counter() - began
+
+        lock, elapsed, writes = run_with_writer(owner, legacy)
+        report('DELETE único', args.rows, elapsed, writes, lock)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,299 @@
+"""Listados con 1000 conexiones simultáneas: vistas async con ASGI frente a WSGI.
+
+Uso:
+    python -m benchmarks.asgi_reads [--connections 1000] [--requests 5] [--threads 32] [--households 10] [--members 5]
+
+Cada modo corre en su propio proceso, que hace de un worker del servidor, con
+la misma base sembrada (--households casas de --members miembros):
+
+- wsgi: backend.wsgi con --threads hilos, como un worker gthread de gunicorn;
+  las conexiones que no caben esperan en la cola como en el backlog del socket.
+- asgi-sync: backend.asgi con HOMI_ASYNC_VIEWS['ENABLED'] apagado; Django
+  ejecuta cada vista síncrona en un hilo aparte.
+- asgi: backend.asgi con las vistas async (homi/async_views.py).
+
+Las --connections conexiones piden a la vez --requests listados cada una
+(noticias, tareas, gastos, gastos personales e información de la casa, por
+turnos) con el token de un miembro. Sin red: se llama a la aplicación WSGI o
+ASGI directamente, como en benchmarks/sse_connections.py. Informa peticiones
+por segundo, latencia p50/p99 desde que la conexión pide, y la memoria del
+worker: RSS máximo durante la carga sobre el RSS previo y el máximo de hilos.
+Antes de la carga, el modo asgi compara cada listado con la vista síncrona
+(estado, cuerpo y ETag). Termina con error si alguna petición falla, si una
+respuesta async difiere de la síncrona, o si las vistas async atienden menos
+peticiones por segundo o usan más memoria que las síncronas con ASGI.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+
+from benchmarks.common import create_user, percentile, seed_household, setup_django
+
+MODES = ('wsgi', 'asgi-sync', 'asgi')
+
+URLS = [
+    '/api/household-news/',
+    '/api/household-tasks/',
+    '/api/household-expenses/',
+    '/api/personal-expenses/',
+    '/api/current-household-info/',
+]
+
+
+def rss_bytes():
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+class Sampler(threading.Thread):
+    """Máximo de RSS y de hilos del proceso mientras corre la carga"""
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.stopped = threading.Event()
+        self.peak_rss = rss_bytes()
+        self.peak_threads = threading.active_count()
+
+    def run(self):
+        while not self.stopped.wait(0.01):
+            self.peak_rss = max(self.peak_rss, rss_bytes())
+            self.peak_threads = max(self.peak_threads, threading.active_count())
+
+
+def seed(households, members):
+    tokens = []
+    for number in range(households):
+        data = seed_household(
+            prefix=f'asgi{number}-', members=members, news=20, tasks=20, expenses=20, personal_expenses=20
+        )
+        tokens.extend(data['tokens'])
+    # Un usuario sin casa no debe afectar a nada: sólo se usan los miembros
+    create_user('asgi-outsider')
+    return tokens
+
+
+def wsgi_get(application, path, token):
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '', 'SCRIPT_NAME': '',
+        'SERVER_NAME': 'testserver', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+        'wsgi.input': io.BytesIO(), 'wsgi.url_scheme': 'http', 'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True, 'wsgi.multiprocess': True, 'wsgi.run_once': False,
+        'HTTP_HOST': 'testserver', 'HTTP_AUTHORIZATION': f'Token {token}',
+    }
+    started = []
+
+    def start_response(status, headers, exc_info=None):
+        started.append(int(status.split()[0]))
+
+    body = application(environ, start_response)
+    try:
+        content = b''.join(body)
+    finally:
+        body.close()
+    return started[0], content
+
+
+async def asgi_get(application, path, token, headers=()):
+    """Devuelve (estado, cabeceras, cuerpo) de un GET contra la aplicación ASGI"""
+    response = {'status': None, 'headers': {}, 'body': b''}
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # La conexión sigue abierta hasta que Django termina
+        await asyncio.Future()
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+            response['headers'] = {name.decode().lower(): value.decode() for name, value in message['headers']}
+        elif message['type'] == 'http.response.body':
+            response['body'] += message.get('body', b'')
+
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+        'headers': [(b'host', b'testserver'), (b'authorization', f'Token {token}'.encode()), *headers],
+        'client': ('127.0.0.1', 0), 'server': ('testserver', 80),
+    }
+    await application(scope, receive, send)
+    return response['status'], response['headers'], response['body']
+
+
+def run_wsgi(tokens, connections, requests, threads):
+    from backend.wsgi import application
+
+    for token in tokens:
+        for path in URLS:
+            wsgi_get(application, path, token)
+
+    samples = []
+    pending = queue.Queue()
+    remaining = [connections]
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            item = pending.get()
+            if item is None:
+                return
+            connection, index, requested = item
+            path = URLS[(connection + index) % len(URLS)]
+            status_code, _ = wsgi_get(application, path, tokens[connection % len(tokens)])
+            with lock:
+                samples.append(((time.perf_counter() - requested) * 1000, status_code))
+            if index + 1 < requests:
+                pending.put((connection, index + 1, time.perf_counter()))
+                continue
+            with lock:
+                remaining[0] -= 1
+                finished = remaining[0] == 0
+            if finished:
+                for _ in range(threads):
+                    pending.put(None)
+
+    baseline = rss_bytes()
+    sampler = Sampler()
+    sampler.start()
+    began = time.perf_counter()
+    for connection in range(connections):
+        pending.put((connection, 0, began))
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return samples, time.perf_counter() - began, baseline, sampler
+
+
+def compare_with_sync(application, tokens):
+    """Listados que la vista async responde distinto que la síncrona"""
+    from django.conf import settings
+
+    options = settings.HOMI_ASYNC_VIEWS
+    differences = []
+    for path in URLS:
+        responses = []
+        for enabled in (True, False):
+            settings.HOMI_ASYNC_VIEWS = {**options, 'ENABLED': enabled}
+            status_code, headers, body = asyncio.run(asgi_get(application, path, tokens[-1]))
+            responses.append((status_code, headers.get('etag'), json.loads(body)))
+        if responses[0] != responses[1]:
+            differences.append(path)
+    settings.HOMI_ASYNC_VIEWS = options
+    return differences
+
+
+def run_asgi(tokens, connections, requests, async_views):
+    from django.conf import settings
+    from backend.asgi import application
+
+    differences = compare_with_sync(application, tokens) if async_views else []
+    settings.HOMI_ASYNC_VIEWS = {**settings.HOMI_ASYNC_VIEWS, 'ENABLED': async_views}
+    samples = []
+
+    async def connection(number):
+        for index in range(requests):
+            path = URLS[(number + index) % len(URLS)]
+            requested = time.perf_counter()
+            status_code, _, _ = await asgi_get(application, path, tokens[number % len(tokens)])
+            samples.append(((time.perf_counter() - requested) * 1000, status_code))
+
+    async def load():
+        await asyncio.gather(*(
+            asgi_get(application, path, token) for token in tokens for path in URLS
+        ))
+        baseline = rss_bytes()
+        sampler = Sampler()
+        sampler.start()
+        began = time.perf_counter()
+        await asyncio.gather(*(connection(number) for number in range(connections)))
+        return time.perf_counter() - began, baseline, sampler
+
+    elapsed, baseline, sampler = asyncio.run(load())
+    return samples, elapsed, baseline, sampler, differences
+
+
+def run_mode(mode, args):
+    setup_django()
+    import logging
+    logging.disable(logging.CRITICAL)
+
+    tokens = seed(args.households, args.members)
+    differences = []
+    if mode == 'wsgi':
+        samples, elapsed, baseline, sampler = run_wsgi(tokens, args.connections, args.requests, args.threads)
+    else:
+        samples, elapsed, baseline, sampler, differences = run_asgi(
+            tokens, args.connections, args.requests, mode == 'asgi'
+        )
+    sampler.stopped.set()
+    sampler.join()
+
+    timings = [ms for ms, _ in samples]
+    return {
+        'mode': mode,
+        'requests': len(samples),
+        'elapsed': elapsed,
+        'errors': sum(1 for _, status_code in samples if status_code != 200),
+        'p50': percentile(timings, 0.5),
+        'p99': percentile(timings, 0.99),
+        'memory': max(0, sampler.peak_rss - baseline),
+        'threads': sampler.peak_threads,
+        'differences': differences,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--connections', type=int, default=1000)
+    parser.add_argument('--requests', type=int, default=5, help='Listados que pide cada conexión')
+    parser.add_argument('--threads', type=int, default=32, help='Hilos del worker WSGI')
+    parser.add_argument('--households', type=int, default=10)
+    parser.add_argument('--members', type=int, default=5)
+    parser.add_argument('--run', choices=MODES, help='Corre sólo este modo e imprime JSON')
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run_mode(args.run, args)))
+        return
+
+    print(f'{args.connections} conexiones x {args.requests} listados, {args.households} casas de '
+          f'{args.members} miembros, WSGI con {args.threads} hilos')
+    print(f'{"modo":<11}{"pet/s":>9}{"p50 ms":>9}{"p99 ms":>9}{"memoria MB":>12}{"hilos":>7}{"errores":>9}')
+    results = {}
+    for mode in MODES:
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.asgi_reads', '--run', mode,
+             '--connections', str(args.connections), '--requests', str(args.requests),
+             '--threads', str(args.threads), '--households', str(args.households), '--members', str(args.members)],
+            capture_output=True, text=True, check=True,
+        ).stdout
+        result = results[mode] = json.loads(output.strip().splitlines()[-1])
+        result['throughput'] = result['requests'] / result['elapsed']
+        print(f'{mode:<11}{result["throughput"]:>9.1f}{result["p50"]:>9.1f}{result["p99"]:>9.1f}'
+              f'{result["memory"] / 2 ** 20:>12.1f}{result["threads"]:>7}{result["errors"]:>9}')
+
+    for mode, result in results.items():
+        if result['errors']:
+            raise SystemExit(f'Hubo {result["errors"]} peticiones con error en {mode}')
+    if results['asgi']['differences']:
+        raise SystemExit(f'Las vistas async responden distinto que las síncronas: {results["asgi"]["differences"]}')
+    if results['asgi']['throughput'] < results['asgi-sync']['throughput']:
+        raise SystemExit('Las vistas async atienden menos peticiones por segundo que las síncronas con ASGI')
+    if results['asgi']['memory'] > results['asgi-sync']['memory']:
+        raise SystemExit('Las vistas async usan más memoria que las síncronas con ASGI')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""Consultas SQL por petición para cada ruta de homi/urls.py, antes y después de
+la caché de autenticación (TokenAuthentication vs CachedTokenAuthentication).
+
+Uso:
+    python -m benchmarks.auth_queries
+
+Cada petición se ejecuta dentro de una transacción que se revierte, así todas las
+rutas se miden contra el mismo estado de la base de datos. Termina con error si
+alguna ruta no tiene petición de ejemplo o si la caché le agrega consultas.
+events/ sólo cuenta hasta que empieza a transmitir.
+
+La caché sólo quita la consulta del token y el usuario: las rutas de la casa
+siguen leyendo el perfil y la casa actual de la base en cada petición (una
+consulta con select_related en lugar de dos perezosas), porque la caché local
+de cada proceso no ve las invalidaciones de los demás. Por eso la mayoría de
+las rutas ahorran una consulta y no llegan a cero.
+"""
+from benchmarks.common import PASSWORD, api_client, create_user, seed_household, setup_django
+
+
+def build_requests(data):
+    """Petición representativa por nombre de ruta: (método, kwargs de la URL, cuerpo)"""
+    from django.utils import timezone
+    from homi.models import Expense, Household, News, PersonalExpense, Task
+
+    creator, member = data['users'][0], data['users'][1]
+    member_token = data['tokens'][1]
+    household = data['household']
+    other = Household.objects.create(name='Otra casa', created_by=creator)
+    other.members.add(creator)
+
+    news = News.objects.create(
+        title='Propia', content='...', household=household, created_by=member,
+        expiry_date=timezone.now() + timezone.timedelta(days=1)
+    )
+    permanent = Expense.objects.create(
+        title='Internet', description='...', household=household, created_by=member,
+        total_cost=60, expense_type='permanent'
+    )
+    task = Task.objects.create(
+        title='Propia', description='...', household=household, created_by=member,
+        assigned_to=member, due_datetime=timezone.now() + timezone.timedelta(days=1)
+    )
+    personal = PersonalExpense.objects.create(
+        title='Propio', description='...', cost=5, user=member, household=household
+    )
+    due = (timezone.now() + timezone.timedelta(days=2)).isoformat()
+
+    return {
+        'register': ('post', {}, {'username': 'nuevo', 'email': 'nuevo@example.com', 'password': PASSWORD}),
+        'login': ('post', {}, {'username': member.username, 'password': PASSWORD}),
+        'token_refresh': ('post', {}, {'refresh_token': member_token}),
+        'household_events': ('get', {}, None),
+        'sync_household': ('get', {}, None),
+        'metrics': ('get', {}, None),
+        'batch_requests': ('post', {}, {'requests': [
+            {'method': 'GET', 'path': '/api/household-news/'},
+            {'method': 'GET', 'path': '/api/household-tasks/'},
+            {'method': 'POST', 'path': f'/api/complete-task/{task.id}/'},
+        ]}),
+        'create_household': ('post', {}, {'name': 'Nueva'}),
+        'join_household': ('post', {}, {'code': other.code}),
+        'user_profile': ('get', {}, None),
+        'current_household_info': ('get', {}, None),
+        'dashboard': ('get', {}, None),
+        'leave_household': ('post', {}, None),
+        'delete_household': ('delete', {}, None),
+        'household_news': ('get', {}, None),
+        'create_news': ('post', {}, {'title': 'Hola', 'content': '...', 'expiry_date': due}),
+        'delete_news': ('delete', {'news_id': news.id}, None),
+        'household_expenses': ('get', {}, None),
+        'create_expense': ('post', {}, {'title': 'Luz', 'description': '...', 'total_cost': '40.00'}),
+        'pay_expense': ('post', {'expense_id': permanent.id}, None),
+        'pay_expenses': ('post', {}, {'expense_ids': [permanent.id]}),
+        'update_expense': ('put', {'expense_id': permanent.id}, {'total_cost': '90.00'}),
+        'delete_expense': ('delete', {'expense_id': permanent.id}, None),
+        'household_tasks': ('get', {}, None),
+        'household_members': ('get', {}, None),
+        'create_task': ('post', {}, {'title': 'Barrer', 'description': '...', 'due_datetime': due,
+                                     'assigned_to': member.id}),
+        'complete_task': ('post', {'task_id': task.id}, None),
+        'delete_task': ('delete', {'task_id': task.id}, None),
+        'personal_expenses': ('get', {}, None),
+        'create_personal_expense': ('post', {}, {'title': 'Café', 'description': '...', 'cost': '2.50'}),
+        'delete_personal_expense': ('delete', {'expense_id': personal.id}, None),
+        'cleanup_monthly_expenses': ('post', {}, None),
+    }
+
+
+def count_queries(client, name, spec):
+    from django.db import connection, transaction
+    from django.test.utils import CaptureQueriesContext
+    from django.urls import reverse
+
+    method, kwargs, body = spec
+    url = reverse(name, kwargs=kwargs)
+    with transaction.atomic():
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(client, method)(url, body, content_type='application/json')
+        transaction.set_rollback(True)
+    return len(queries), response.status_code
+
+
+def set_authentication(callbacks, authentication_class):
+    # @api_view fija las clases de autenticación al importar las vistas
+    for callback in callbacks:
+        callback.cls.authentication_classes = [authentication_class]
+
+
+def main():
+    # Se mide el camino a la base de datos, no la caché de respuestas
+    setup_django(HOMI_RESPONSE_CACHE={'ENABLED': False})
+
+    from django.urls import reverse
+    from rest_framework.authentication import TokenAuthentication
+    from homi import urls
+    from homi.authentication import CachedTokenAuthentication, auth_cache
+
+    data = seed_household(members=3)
+    create_user('visitante')
+    requests = build_requests(data)
+    client = api_client(data['tokens'][1])
+    callbacks = [pattern.callback for pattern in urls.urlpatterns if hasattr(pattern.callback, 'cls')]
+
+    print(f"{'ruta':<28}{'antes':>8}{'después':>10}{'estado':>8}")
+    totals = [0, 0]
+    failures = []
+    for pattern in urls.urlpatterns:
+        spec = requests.get(pattern.name)
+        if spec is None:
+            print(f'{pattern.name:<28}{"sin petición de ejemplo":>26}')
+            failures.append(f'{pattern.name} no tiene petición de ejemplo')
+            continue
+
+        set_authentication(callbacks, TokenAuthentication)
+        before, status_code = count_queries(client, pattern.name, spec)
+
+        set_authentication(callbacks, CachedTokenAuthentication)
+        auth_cache.clear()
+        client.get(reverse('user_profile'))  # calentar la caché
+        after, _ = count_queries(client, pattern.name, spec)
+
+        totals[0] += before
+        totals[1] += after
+        print(f'{pattern.name:<28}{before:>8}{after:>10}{status_code:>8}')
+        if after > before:
+            failures.append(f'{pattern.name} hace más consultas con la caché')
+
+    print(f"{'total':<28}{totals[0]:>8}{totals[1]:>10}")
+    if failures:
+        raise SystemExit('; '.join(failures))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Secuencia de arranque de la app: siete GET por separado frente a un batch/.
+
+Uso:
+    python -m benchmarks.batch_startup [--rows 50] [--rounds 30] [--rtt-ms 150] [--workers 4]
+
+Mide el tiempo de servidor de las siete llamadas de arranque hechas una tras
+otra y de un solo batch/ con las lecturas en serie (MAX_WORKERS=1) y en
+paralelo, y estima el tiempo total en una red móvil con --rtt-ms de ida y
+vuelta por petición. Termina con error si alguna respuesta del lote difiere de
+la llamada directa.
+"""
+import argparse
+import json
+import statistics
+import time
+
+from benchmarks.common import api_client, seed_household, setup_django
+
+STARTUP_URLS = [
+    '/api/user-profile/',
+    '/api/current-household-info/',
+    '/api/household-news/',
+    '/api/household-tasks/',
+    '/api/household-expenses/',
+    '/api/personal-expenses/',
+    '/api/household-members/',
+]
+
+
+def timed(rounds, job):
+    timings = []
+    for _ in range(rounds):
+        began = time.perf_counter()
+        job()
+        timings.append(time.perf_counter() - began)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=50, help='Filas por listado')
+    parser.add_argument('--rounds', type=int, default=30)
+    parser.add_argument('--rtt-ms', type=float, default=150.0, help='Ida y vuelta de la red simulada')
+    parser.add_argument('--workers', type=int, default=4, help='Hilos del lote en paralelo')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+
+    data = seed_household(
+        members=4, news=args.rows, tasks=args.rows, expenses=args.rows, personal_expenses=args.rows
+    )
+    client = api_client(data['tokens'][0])
+    client.get('/api/user-profile/')  # calentar la caché de autenticación
+    payload = {'requests': [{'path': url} for url in STARTUP_URLS]}
+
+    def sequential():
+        return [client.get(url) for url in STARTUP_URLS]
+
+    def batched():
+        response = client.post('/api/batch/', payload, content_type='application/json')
+        assert response.status_code == 200
+        return response.json()['responses']
+
+    direct = [json.loads(response.content) for response in sequential()]
+    mismatches = [
+        url for url, expected, result in zip(STARTUP_URLS, direct, batched())
+        if result['status'] != 200 or result['body'] != expected
+    ]
+    if mismatches:
+        raise SystemExit(f'El lote difiere de las llamadas directas en: {", ".join(mismatches)}')
+
+    rows = [('7 GET por separado', len(STARTUP_URLS), timed(args.rounds, sequential))]
+    settings.HOMI_BATCH = {**settings.HOMI_BATCH, 'MAX_WORKERS': 1}
+    rows.append(('batch/ en serie', 1, timed(args.rounds, batched)))
+    settings.HOMI_BATCH = {**settings.HOMI_BATCH, 'MAX_WORKERS': args.workers}
+    rows.append((f'batch/ con {args.workers} hilos', 1, timed(args.rounds, batched)))
+
+    print(f'{"":<24}{"peticiones":>11}{"servidor ms":>13}{f"total con RTT {args.rtt_ms:.0f} ms":>24}')
+    for label, round_trips, server_ms in rows:
+        print(f'{label:<24}{round_trips:>11}{server_ms:>13.1f}{round_trips * args.rtt_ms + server_ms:>24.1f}')
+
+
+if __name__ == '__main__':
+    main()
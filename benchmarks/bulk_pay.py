@@ -0,0 +1,62 @@
+"""Latencia de pagar N gastos con N llamadas a pay-expense/ frente a una sola
+llamada a pay-expenses/.
+
+Uso:
+    python -m benchmarks.bulk_pay [--expenses 50] [--rounds 5]
+"""
+import argparse
+import statistics
+import time
+from decimal import Decimal
+
+from benchmarks.common import api_client, seed_household, setup_django
+
+
+def create_expenses(data, count):
+    from homi.models import Expense
+
+    return [
+        Expense.objects.create(
+            title=f'Gasto {index}', description='...', household=data['household'],
+            created_by=data['users'][0], total_cost=Decimal('30.00'),
+            expense_type='unique' if index % 2 else 'permanent'
+        ).id
+        for index in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--expenses', type=int, default=50)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    data = seed_household(members=3, news=0, tasks=0, expenses=0, personal_expenses=0)
+    client = api_client(data['tokens'][1])
+    client.get('/api/user-profile/')  # calentar la caché de autenticación
+
+    single, bulk = [], []
+    for _ in range(args.rounds):
+        ids = create_expenses(data, args.expenses)
+        began = time.perf_counter()
+        for expense_id in ids:
+            assert client.post(f'/api/pay-expense/{expense_id}/').status_code == 200
+        single.append(time.perf_counter() - began)
+
+        ids = create_expenses(data, args.expenses)
+        began = time.perf_counter()
+        response = client.post('/api/pay-expenses/', {'expense_ids': ids}, content_type='application/json')
+        bulk.append(time.perf_counter() - began)
+        assert response.status_code == 200
+        assert set(response.json()['results'].values()) == {'paid'}
+
+    single_ms = statistics.median(single) * 1000
+    bulk_ms = statistics.median(bulk) * 1000
+    print(f'{args.expenses} llamadas a pay-expense/: {single_ms:8.1f} ms (mediana)')
+    print(f'1 llamada a pay-expenses/:   {bulk_ms:8.1f} ms (mediana)')
+    print(f'aceleración: {single_ms / bulk_ms:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
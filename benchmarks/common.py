@@ -0,0 +1,113 @@
+"""Utilidades compartidas por los benchmarks: base de datos temporal y datos de prueba.
+
+Los benchmarks nunca tocan db.sqlite3: cada ejecución migra una base SQLite
+temporal (o la indicada) antes de sembrar datos.
+"""
+import os
+import sys
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+PASSWORD = 'bench-pass-123'
+
+
+def setup_django(db_name=None, **overrides):
+    """Configura Django contra una base temporal migrada y devuelve su ruta"""
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+
+    from django.conf import settings
+    if db_name is None:
+        fd, db_name = tempfile.mkstemp(prefix='homi-bench-', suffix='.sqlite3')
+        os.close(fd)
+    settings.DATABASES['default']['NAME'] = db_name
+    settings.DEBUG = False
+    for name, value in overrides.items():
+        setattr(settings, name, value)
+
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+    return db_name
+
+
+def create_user(username):
+    from django.contrib.auth.models import User
+    from rest_framework.authtoken.models import Token
+
+    user = User.objects.create_user(username, f'{username}@example.com', PASSWORD)
+    return user, Token.objects.get(user=user).key
+
+
+def seed_household(prefix='bench', members=2, news=5, tasks=5, expenses=5, personal_expenses=5, shard=None):
+    """Crea una casa con sus miembros y algo de historial.
+
+    La casa se guarda en el shard indicado o en el activo (homi.shards). Devuelve
+    un dict con la casa, los usuarios (el primero es el creador) y sus tokens.
+    """
+    from django.utils import timezone
+    from homi import shards
+    from homi.models import Household, News, Expense, Task, PersonalExpense
+
+    users, tokens = [], []
+    for index in range(members):
+        user, key = create_user(f'{prefix}{index}')
+        users.append(user)
+        tokens.append(key)
+
+    alias = shard or shards.current()
+    shards.mirror_users(alias, users)
+    with shards.using(alias):
+        household = Household.objects.create(name=f'Casa {prefix}', created_by=users[0])
+        household.members.add(*users)
+        for user in users:
+            user.profile.current_household = household
+            user.profile.save()
+
+        now = timezone.now()
+        for index in range(news):
+            News.objects.create(
+                title=f'Noticia {index}', content='Contenido', household=household,
+                created_by=users[index % members], expiry_date=now + timedelta(days=7)
+            )
+        for index in range(tasks):
+            Task.objects.create(
+                title=f'Tarea {index}', description='Descripción', household=household,
+                created_by=users[0], assigned_to=users[index % members],
+                due_datetime=now + timedelta(days=index + 1)
+            )
+        for index in range(expenses):
+            Expense.objects.create(
+                title=f'Gasto {index}', description='Descripción', household=household,
+                created_by=users[index % members], total_cost=Decimal('100.00'),
+                expense_type='unique' if index % 2 else 'permanent'
+            )
+        for index in range(personal_expenses):
+            PersonalExpense.objects.create(
+                title=f'Gasto personal {index}', description='Descripción', cost=Decimal('10.00'),
+                user=users[index % members], household=household
+            )
+
+        household.refresh_from_db()
+    return {'household': household, 'users': users, 'tokens': tokens}
+
+
+def api_client(token=None):
+    from django.test import Client
+
+    if token is None:
+        return Client()
+    return Client(HTTP_AUTHORIZATION=f'Token {token}')
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
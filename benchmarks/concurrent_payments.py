@@ -0,0 +1,91 @@
+"""Pagos concurrentes sobre un mismo gasto desde todos los miembros de una casa.
+
+Uso:
+    python -m benchmarks.concurrent_payments [--members 20] [--attempts 3] [--rounds 5]
+
+Cada miembro intenta pagar el mismo gasto permanente --attempts veces a la vez
+desde su propio hilo. Se informa el rendimiento y la distribución de códigos de
+estado, y se verifica que cada miembro haya pagado exactamente una vez y que el
+saldo restante cuadre con los pagos registrados.
+"""
+import argparse
+import threading
+import time
+from collections import Counter
+from decimal import Decimal
+
+from benchmarks.common import api_client, seed_household, setup_django
+
+
+def run_round(data, attempts):
+    from django.db import connection
+    from homi.models import Expense, ExpensePayment
+
+    expense = Expense.objects.create(
+        title='Alquiler', description='...', household=data['household'],
+        created_by=data['users'][0], total_cost=Decimal(len(data['users']) * 10), expense_type='permanent'
+    )
+    url = f'/api/pay-expense/{expense.id}/'
+    barrier = threading.Barrier(len(data['tokens']))
+    statuses = Counter()
+    lock = threading.Lock()
+
+    def member(token):
+        client = api_client(token)
+        client.get('/api/user-profile/')  # calentar la caché de autenticación
+        barrier.wait()
+        try:
+            for _ in range(attempts):
+                status_code = client.post(url).status_code
+                with lock:
+                    statuses[status_code] += 1
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=member, args=(token,)) for token in data['tokens']]
+    began = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - began
+
+    expense.refresh_from_db()
+    payments = ExpensePayment.objects.filter(expense=expense)
+    paid = sum(payment.amount_paid for payment in payments)
+    payers = Counter(payment.user_id for payment in payments)
+    ok = (
+        expense.remaining_amount == expense.total_cost - paid
+        and all(count == 1 for count in payers.values())
+        and statuses[200] == len(payers)
+    )
+    return elapsed, statuses, len(payers), expense.remaining_amount, ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--members', type=int, default=20)
+    parser.add_argument('--attempts', type=int, default=3)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    data = seed_household(members=args.members, news=0, tasks=0, expenses=0, personal_expenses=0)
+
+    failures = 0
+    total_requests = total_time = 0
+    for index in range(args.rounds):
+        elapsed, statuses, payers, remaining, ok = run_round(data, args.attempts)
+        requests = sum(statuses.values())
+        total_requests += requests
+        total_time += elapsed
+        failures += not ok
+        print(f'ronda {index + 1}: {requests / elapsed:7.1f} req/s  estados={dict(sorted(statuses.items()))}  '
+              f'pagadores={payers}  restante={remaining}  {"OK" if ok else "SALDO INCORRECTO"}')
+
+    print(f'total: {total_requests / total_time:.1f} req/s')
+    raise SystemExit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
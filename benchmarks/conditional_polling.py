@@ -0,0 +1,69 @@
+"""Costo de un sondeo de los listados con y sin If-None-Match.
+
+Uso:
+    python -m benchmarks.conditional_polling [--rows 200] [--polls 200]
+
+Para cada listado mide consultas y latencia de un GET completo y de un GET con
+el ETag anterior (304). Termina con error si un 304 hace más de dos consultas:
+el perfil y la casa, que se leen de la base en cada petición aunque la caché
+de autenticación esté caliente, y la tabla de versiones.
+"""
+import argparse
+import statistics
+import time
+
+from benchmarks.common import api_client, seed_household, setup_django
+
+URLS = [
+    '/api/household-news/',
+    '/api/household-tasks/',
+    '/api/household-expenses/',
+    '/api/personal-expenses/',
+]
+# Perfil y casa (nunca desde la caché de autenticación) y versiones
+MAX_QUERIES = 2
+
+
+def measure(client, url, polls, **headers):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    timings = []
+    for _ in range(polls):
+        with CaptureQueriesContext(connection) as queries:
+            began = time.perf_counter()
+            response = client.get(url, **headers)
+            timings.append(time.perf_counter() - began)
+    return response.status_code, len(queries), statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200, help='Filas por listado')
+    parser.add_argument('--polls', type=int, default=200)
+    args = parser.parse_args()
+
+    # Se mide el camino a la base de datos, no la caché de respuestas
+    setup_django(HOMI_RESPONSE_CACHE={'ENABLED': False})
+    data = seed_household(
+        members=4, news=args.rows, tasks=args.rows, expenses=args.rows, personal_expenses=args.rows
+    )
+    client = api_client(data['tokens'][0])
+    client.get('/api/user-profile/')  # calentar la caché de autenticación
+
+    print(f'{"listado":<28}{"200 cons.":>10}{"200 ms":>9}{"304 cons.":>11}{"304 ms":>9}')
+    failures = 0
+    for url in URLS:
+        etag = client.get(url)['ETag']
+        full_status, full_queries, full_ms = measure(client, url, args.polls)
+        status, queries, ms = measure(client, url, args.polls, HTTP_IF_NONE_MATCH=etag)
+        assert full_status == 200 and status == 304
+        failures += queries > MAX_QUERIES
+        print(f'{url:<28}{full_queries:>10}{full_ms:>9.2f}{queries:>11}{ms:>9.2f}')
+
+    if failures:
+        raise SystemExit(f'Algún 304 hace más de {MAX_QUERIES} consultas')
+
+
+if __name__ == '__main__':
+    main()
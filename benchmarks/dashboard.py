@@ -0,0 +1,120 @@
+"""Latencia de dashboard/ en una casa con años de historial.
+
+Uso:
+    python -m benchmarks.dashboard [--years 3] [--members 4] [--requests 300]
+
+Siembra por semana noticias (casi todas vencidas), tareas (casi todas
+completadas) y gastos permanentes ya pagados por todos, más los acumulados de
+gastos personales de cada mes. Mide p50/p95 de dashboard/ y, como referencia,
+de las cinco llamadas a las que reemplaza. Termina con error si dashboard/ hace
+más de cinco consultas (perfil y casa, que no salen de la caché de
+autenticación, versiones para el ETag y tres del resumen).
+"""
+import argparse
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from benchmarks.common import api_client, percentile, seed_household, setup_django
+
+REPLACED_URLS = [
+    '/api/current-household-info/',
+    '/api/household-news/',
+    '/api/household-tasks/',
+    '/api/household-expenses/',
+    '/api/personal-expenses/',
+]
+MAX_QUERIES = 5
+
+
+def seed_history(data, years):
+    """Historial semanal con bulk_create (sin señales: sólo importan las filas)"""
+    from django.utils import timezone
+    from homi.models import Expense, ExpensePayment, News, PersonalExpenseRollup, Task
+
+    household, users = data['household'], data['users']
+    now = timezone.now()
+    weeks = years * 52
+    news, tasks, expenses = [], [], []
+    for week in range(weeks):
+        created = now - timedelta(weeks=weeks - week)
+        for index in range(10):
+            news.append(News(
+                title=f'Aviso {week}-{index}', content='...', household=household,
+                priority=('urgent', 'normal', 'can_wait')[index % 3],
+                created_by=users[index % len(users)], expiry_date=created + timedelta(days=3)
+            ))
+        for index in range(20):
+            tasks.append(Task(
+                title=f'Tarea {week}-{index}', description='...', household=household,
+                created_by=users[0], assigned_to=users[index % len(users)],
+                due_datetime=created + timedelta(days=2), is_completed=True, completed_at=created + timedelta(days=1)
+            ))
+        expenses.append(Expense(
+            title=f'Gasto {week}', description='...', household=household, created_by=users[0],
+            total_cost=Decimal('120.00'), unit_cost=Decimal('120.00') / len(users),
+            remaining_amount=Decimal('0'), expense_type='permanent'
+        ))
+    News.objects.bulk_create(news, batch_size=500)
+    Task.objects.bulk_create(tasks, batch_size=500)
+    expenses = Expense.objects.bulk_create(expenses, batch_size=500)
+    ExpensePayment.objects.bulk_create([
+        ExpensePayment(expense=expense, user=user, amount_paid=expense.unit_cost)
+        for expense in expenses for user in users
+    ], batch_size=500)
+
+    month, year = now.month, now.year
+    rollups = []
+    for _ in range(years * 12):
+        month, year = (12, year - 1) if month == 1 else (month - 1, year)
+        rollups.extend(
+            PersonalExpenseRollup(
+                household=household, user=user, year=year, month=month, total=Decimal('300.00'), expense_count=30
+            )
+            for user in users
+        )
+    PersonalExpenseRollup.objects.bulk_create(rollups, batch_size=500)
+    return len(news), len(tasks), len(expenses)
+
+
+def measure(client, urls, requests):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    timings = []
+    for _ in range(requests):
+        with CaptureQueriesContext(connection) as queries:
+            began = time.perf_counter()
+            for url in urls:
+                assert client.get(url).status_code == 200
+            timings.append((time.perf_counter() - began) * 1000)
+    return len(queries), percentile(timings, 0.5), percentile(timings, 0.95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--years', type=int, default=3)
+    parser.add_argument('--members', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=300)
+    args = parser.parse_args()
+
+    setup_django()
+    data = seed_household(members=args.members, news=20, tasks=40, expenses=10, personal_expenses=60)
+    news, tasks, expenses = seed_history(data, args.years)
+    print(f'Historial: {news} noticias, {tasks} tareas, {expenses} gastos pagados, {args.years * 12} meses')
+
+    client = api_client(data['tokens'][0])
+    client.get('/api/user-profile/')  # calentar la caché de autenticación
+
+    print(f'{"":<26}{"consultas":>10}{"p50 ms":>9}{"p95 ms":>9}')
+    queries, p50, p95 = measure(client, ['/api/dashboard/'], args.requests)
+    print(f'{"dashboard/":<26}{queries:>10}{p50:>9.2f}{p95:>9.2f}')
+    replaced = measure(client, REPLACED_URLS, max(1, args.requests // 5))
+    print(f'{"5 llamadas que reemplaza":<26}{replaced[0]:>10}{replaced[1]:>9.2f}{replaced[2]:>9.2f}')
+
+    if queries > MAX_QUERIES:
+        raise SystemExit(f'dashboard/ hizo {queries} consultas (máximo {MAX_QUERIES})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""Volver a conectar un cliente sin conexión: recarga completa frente a sync/.
+
+Uso:
+    python -m benchmarks.delta_sync [--rows 500] [--changes 10 100]
+
+Siembra una casa con --rows filas por listado, obtiene un cursor y, para cada
+valor de --changes, aplica esa cantidad de escrituras mezcladas desde otro
+miembro. Compara bytes, consultas y latencia de descargar todas las páginas de
+los listados con una sola llamada a sync/. Termina con error si sync/ transfiere
+más que la recarga o si sus consultas crecen con la cantidad de cambios.
+"""
+import argparse
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from benchmarks.common import api_client, seed_household, setup_django
+
+URLS = [
+    '/api/household-news/',
+    '/api/household-tasks/',
+    '/api/household-expenses/',
+    '/api/personal-expenses/',
+    '/api/household-members/',
+]
+
+
+def measure(client, requests):
+    """Ejecuta las peticiones (url, parámetros) y devuelve bytes, consultas, ms y respuestas"""
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    size = 0
+    responses = []
+    with CaptureQueriesContext(connection) as queries:
+        began = time.perf_counter()
+        for url, params in requests:
+            response = client.get(url, params)
+            assert response.status_code == 200, response.content
+            size += len(response.content)
+            responses.append(response)
+        elapsed = time.perf_counter() - began
+    return size, len(queries), elapsed * 1000, responses
+
+
+def full_reload(client):
+    """Todas las páginas de todos los listados"""
+    size = queries = ms = 0
+    for url in URLS:
+        params = {'limit': 200} if url != '/api/household-members/' else {}
+        while True:
+            page_size, page_queries, page_ms, (response,) = measure(client, [(url, params)])
+            size, queries, ms = size + page_size, queries + page_queries, ms + page_ms
+            cursor = response.json().get('next_cursor') if 'limit' in params else None
+            if not cursor:
+                break
+            params = {'limit': 200, 'cursor': cursor}
+    return size, queries, ms
+
+
+def apply_changes(data, client, count):
+    """Escrituras mezcladas por la API: noticias, tareas, pagos y gastos personales"""
+    from django.utils import timezone
+    from homi.models import Expense, Task
+
+    writer = data['users'][1]
+    expense_ids = list(Expense.objects.filter(household=data['household']).exclude(
+        payments__user=writer
+    ).values_list('id', flat=True)[:count])
+    task_ids = list(Task.objects.filter(
+        household=data['household'], assigned_to=writer, is_completed=False
+    ).values_list('id', flat=True)[:count])
+
+    for index in range(count):
+        kind = index % 4
+        if kind == 0:
+            response = client.post('/api/create-news/', {
+                'title': f'Aviso {index}', 'content': 'Contenido', 'priority': 'normal',
+                'expiry_date': (timezone.now() + timedelta(days=3)).isoformat(),
+            }, content_type='application/json')
+        elif kind == 1 and task_ids:
+            response = client.post(f'/api/complete-task/{task_ids.pop()}/')
+        elif kind == 2 and expense_ids:
+            response = client.post(f'/api/pay-expense/{expense_ids.pop()}/')
+        else:
+            response = client.post('/api/create-personal-expense/', {
+                'title': f'Compra {index}', 'description': '...', 'cost': str(Decimal('12.50')),
+            }, content_type='application/json')
+        assert response.status_code in (200, 201), response.content
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=500, help='Filas por listado')
+    parser.add_argument('--changes', type=int, nargs='+', default=[10, 100])
+    args = parser.parse_args()
+
+    setup_django()
+    data = seed_household(
+        members=4, news=args.rows, tasks=args.rows, expenses=args.rows, personal_expenses=args.rows
+    )
+    reader = api_client(data['tokens'][0])
+    writer = api_client(data['tokens'][1])
+    reader.get('/api/user-profile/')  # calentar la caché de autenticación
+
+    print(f'{"cambios":>8}{"recarga KiB":>13}{"cons.":>7}{"ms":>9}{"sync KiB":>10}{"cons.":>7}{"ms":>8}')
+    failures = []
+    sync_queries = set()
+    for count in args.changes:
+        cursor = reader.get('/api/sync/').json()['cursor']
+        apply_changes(data, writer, count)
+
+        reload_size, reload_queries, reload_ms = full_reload(reader)
+        size, queries, ms, (response,) = measure(reader, [('/api/sync/', {'since': cursor})])
+        assert not response.json()['has_more']
+        sync_queries.add(queries)
+        if size >= reload_size:
+            failures.append(f'{count} cambios: sync/ transfiere {size} bytes, la recarga {reload_size}')
+        print(f'{count:>8}{reload_size / 1024:>13.1f}{reload_queries:>7}{reload_ms:>9.1f}'
+              f'{size / 1024:>10.1f}{queries:>7}{ms:>8.1f}')
+
+    if len(sync_queries) > 1:
+        failures.append(f'Las consultas de sync/ dependen de la cantidad de cambios: {sorted(sync_queries)}')
+    if failures:
+        raise SystemExit('\n'.join(failures))
+
+
+if __name__ == '__main__':
+    main()
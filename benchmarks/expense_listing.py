@@ -0,0 +1,72 @@
+"""Consultas y latencia de GET /api/household-expenses/ según el número de gastos.
+
+Uso:
+    python -m benchmarks.expense_listing [--sizes 10 100 1000]
+
+Termina con error si el número de consultas cambia con el tamaño de la casa.
+"""
+import argparse
+import time
+from decimal import Decimal
+
+from benchmarks.common import api_client, seed_household, setup_django
+
+# Tamaño de página máximo (HOMI_PAGINATION['MAX_PAGE_SIZE'])
+PAGE_SIZE = 200
+
+
+def add_expenses(data, count):
+    from homi.models import Expense, ExpensePayment
+
+    users = data['users']
+    expenses = Expense.objects.bulk_create([
+        Expense(
+            title=f'Gasto {index}', description='...', household=data['household'],
+            created_by=users[index % len(users)], total_cost=Decimal('90.00'),
+            unit_cost=Decimal('30.00'), remaining_amount=Decimal('60.00')
+        )
+        for index in range(count)
+    ])
+    ExpensePayment.objects.bulk_create([
+        ExpensePayment(expense=expense, user=users[index % len(users)], amount_paid=Decimal('30.00'))
+        for index, expense in enumerate(expenses)
+    ])
+
+
+def measure(size):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    data = seed_household(prefix=f'gastos{size}-', members=3, news=0, tasks=0, expenses=0, personal_expenses=0)
+    add_expenses(data, size)
+    client = api_client(data['tokens'][0])
+    client.get('/api/household-expenses/')  # calentar la caché de autenticación
+
+    with CaptureQueriesContext(connection) as queries:
+        began = time.perf_counter()
+        response = client.get('/api/household-expenses/', {'limit': PAGE_SIZE})
+        elapsed = time.perf_counter() - began
+    assert response.status_code == 200 and len(response.json()['results']) == min(size, PAGE_SIZE)
+    return len(queries), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000])
+    args = parser.parse_args()
+
+    # Se mide el camino a la base de datos, no la caché de respuestas
+    setup_django(HOMI_RESPONSE_CACHE={'ENABLED': False})
+    print(f'{"gastos":>8}{"consultas":>12}{"ms":>10}')
+    counts = set()
+    for size in args.sizes:
+        queries, elapsed = measure(size)
+        counts.add(queries)
+        print(f'{size:>8}{queries:>12}{elapsed * 1000:>10.1f}')
+
+    if len(counts) != 1:
+        raise SystemExit('El número de consultas depende del número de gastos')
+
+
+if __name__ == '__main__':
+    main()
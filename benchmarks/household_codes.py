@@ -0,0 +1,105 @@
+"""Prueba de estrés del asignador de códigos de casa.
+
+Uso:
+    python -m benchmarks.household_codes [--codes 1000000] [--households 1000000]
+
+1. Calcula --codes códigos consecutivos del contador, comprueba que no haya
+   colisiones y mide el tiempo de asignación por bloque.
+2. Crea --households casas reales con Household.objects.create en una base
+   temporal y comprueba que todos los códigos sean distintos.
+
+Termina con error si hay colisiones, si el número de consultas por casa cambia
+entre bloques o si el último bloque tarda más de --max-growth veces el primero
+(la asignación debe costar lo mismo con la base vacía que llena). Con el millón
+de casas por defecto tarda unos 20 minutos en SQLite; --households 20000 da
+una pasada rápida y --households 0 prueba sólo los códigos.
+"""
+import argparse
+import time
+
+from benchmarks.common import create_user, setup_django
+
+
+def check_codes(count, blocks=10):
+    from homi.codes import CODE_ALPHABET, CODE_LENGTH, code_for
+
+    seen = set()
+    timings = []
+    block = max(1, count // blocks)
+    print(f'{"bloque":>10}{"µs/código":>12}')
+    for start in range(1, count + 1, block):
+        began = time.perf_counter()
+        for value in range(start, min(start + block, count + 1)):
+            seen.add(code_for(value))
+        elapsed = time.perf_counter() - began
+        print(f'{start // block + 1:>10}{elapsed / block * 1e6:>12.2f}')
+
+        timings.append(elapsed / block)
+
+    collisions = count - len(seen)
+    assert all(len(code) == CODE_LENGTH and set(code) <= set(CODE_ALPHABET) for code in list(seen)[:1000])
+    print(f'{count} códigos, {collisions} colisiones')
+    return collisions, timings
+
+
+def check_households(count, blocks=10):
+    from django.db import connection, transaction
+    from homi.models import Household
+
+    user, _ = create_user('creador')
+    block = max(1, count // blocks)
+    print(f'{"bloque":>10}{"µs/casa":>12}{"consultas/casa":>16}')
+    queries = [0]
+    timings, per_house = [], set()
+
+    def count_query(execute, sql, params, many, context):
+        queries[0] += 1
+        return execute(sql, params, many, context)
+
+    for start in range(0, count, block):
+        size = min(block, count - start)
+        queries[0] = 0
+        # Un commit por bloque: se mide la asignación, no el fsync de SQLite
+        with connection.execute_wrapper(count_query), transaction.atomic():
+            began = time.perf_counter()
+            for _ in range(size):
+                Household.objects.create(name='Casa', created_by=user)
+            elapsed = time.perf_counter() - began
+        print(f'{start // block + 1:>10}{elapsed / size * 1e6:>12.1f}{queries[0] / size:>16.1f}')
+        timings.append(elapsed / size)
+        per_house.add(queries[0] / size)
+
+    collisions = count - Household.objects.values('code').distinct().count()
+    print(f'{count} casas, {collisions} colisiones')
+    return collisions, timings, len(per_house) > 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--codes', type=int, default=1_000_000)
+    parser.add_argument('--households', type=int, default=1_000_000)
+    parser.add_argument('--max-growth', type=float, default=2.0,
+                        help='Máximo tiempo del último bloque respecto del primero')
+    args = parser.parse_args()
+
+    setup_django()
+    failures = []
+    collisions, timings = check_codes(args.codes)
+    if collisions:
+        failures.append(f'{collisions} códigos repetidos')
+    if timings[-1] > timings[0] * args.max_growth:
+        failures.append('El tiempo por código crece con el contador')
+    if args.households:
+        collisions, timings, queries_changed = check_households(args.households)
+        if collisions:
+            failures.append(f'{collisions} casas con código repetido')
+        if queries_changed:
+            failures.append('Las consultas por casa cambian entre bloques')
+        if timings[-1] > timings[0] * args.max_growth:
+            failures.append('El tiempo por casa crece con las casas existentes')
+    if failures:
+        raise SystemExit('; '.join(failures))
+
+
+if __name__ == '__main__':
+    main()
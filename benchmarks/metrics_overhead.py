@@ -0,0 +1,227 @@
+"""Costo de las métricas por vista (homi/metrics.py) en el camino caliente.
+
+Uso:
+    python -m benchmarks.metrics_overhead [--rounds 20] [--requests 50] [--members 5]
+
+Pide los listados más usados (noticias, tareas, gastos, gastos personales e
+información de la casa, por turnos, con la caché de respuestas caliente) a la
+aplicación WSGI, con HOMI_METRICS['ENABLED'] apagado y encendido en rondas
+alternadas para que el ruido de la máquina caiga igual en los dos modos. El
+costo es la diferencia de las medianas por petición. Aparte mide por separado
+lo que agregan las métricas: la anotación de una petición en el middleware y el
+envoltorio de una consulta, y el tiempo de generar metrics/.
+
+Después comprueba que metrics/ cuenta lo pedido: peticiones por vista, bytes
+iguales a los cuerpos recibidos y consultas también bajo ASGI, donde las vistas
+async consultan desde el pool de async_views.py.
+
+Presupuesto: las métricas no pueden agregar más de BUDGET_RATIO de la mediana
+por petición (con un margen de BUDGET_MICROSECONDS para el ruido en las
+peticiones más rápidas) ni su parte medida por separado más de
+BUDGET_MICROSECONDS. Termina con error si se pasa o si los conteos no cuadran.
+"""
+import argparse
+import asyncio
+import re
+import statistics
+import time
+
+from benchmarks.asgi_reads import asgi_get, wsgi_get
+from benchmarks.common import create_user, seed_household, setup_django
+
+URLS = [
+    '/api/household-news/',
+    '/api/household-tasks/',
+    '/api/household-expenses/',
+    '/api/personal-expenses/',
+    '/api/current-household-info/',
+]
+
+# Costo máximo de las métricas por petición
+BUDGET_RATIO = 0.03
+BUDGET_MICROSECONDS = 50
+
+
+def set_metrics(enabled):
+    from django.conf import settings
+    from django.db import connections
+
+    settings.HOMI_METRICS = {**settings.HOMI_METRICS, 'ENABLED': enabled}
+    # El envoltorio de consultas se agrega al abrir cada conexión
+    connections.close_all()
+
+
+def timed_requests(application, tokens, count, offset):
+    timings = []
+    for index in range(count):
+        started = time.perf_counter()
+        status_code, _ = wsgi_get(application, URLS[(offset + index) % len(URLS)], tokens[index % len(tokens)])
+        timings.append(time.perf_counter() - started)
+        assert status_code == 200, status_code
+    return timings
+
+
+def request_overhead(application, tokens, rounds, requests):
+    """Mediana por petición (segundos) con las métricas apagadas y encendidas"""
+    samples = {False: [], True: []}
+    for round_index in range(rounds):
+        # Alternar cuál va primero en cada ronda
+        for enabled in (round_index % 2 == 0, round_index % 2 == 1):
+            set_metrics(enabled)
+            samples[enabled].extend(timed_requests(application, tokens, requests, round_index))
+    return statistics.median(samples[False]), statistics.median(samples[True])
+
+
+def isolated_costs(iterations):
+    """Segundos por petición anotada y por consulta envuelta, sin el resto de la petición"""
+    from django.http import HttpResponse
+    from django.test import RequestFactory
+    from django.urls import resolve
+    from homi import metrics
+
+    request = RequestFactory().get('/api/household-news/')
+    request.resolver_match = resolve('/api/household-news/')
+    response = HttpResponse(b'x' * 2048)
+    middleware = metrics.MetricsMiddleware(lambda request: response)
+
+    def execute(sql, params, many, context):
+        return None
+
+    queries = []
+    token = metrics._queries.set(queries)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        metrics.record_query(execute, 'SELECT 1', (), False, {})
+    wrapped = time.perf_counter() - started
+    started = time.perf_counter()
+    for _ in range(iterations):
+        execute('SELECT 1', (), False, {})
+    per_query = (wrapped - (time.perf_counter() - started)) / iterations
+    metrics._queries.reset(token)
+
+    set_metrics(True)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        middleware(request)
+    enabled = time.perf_counter() - started
+    set_metrics(False)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        middleware(request)
+    per_request = (enabled - (time.perf_counter() - started)) / iterations
+    return per_request, per_query
+
+
+def render_cost(times=50):
+    from homi import metrics
+
+    started = time.perf_counter()
+    for _ in range(times):
+        text = metrics.render()
+    return (time.perf_counter() - started) / times, text
+
+
+def sample(text, name, view):
+    match = re.search(rf'^{name}{{view="{view}"}} (\S+)$', text, re.MULTILINE)
+    return float(match.group(1)) if match else 0.0
+
+
+def check_counts(application, tokens, staff_token):
+    """Errores de conteo de metrics/ para unas peticiones conocidas con WSGI y ASGI"""
+    from django.urls import resolve
+    from homi import metrics
+
+    from backend.asgi import application as asgi_application
+
+    set_metrics(True)
+    errors = []
+    for server in ('wsgi', 'asgi'):
+        metrics.registry.reset()
+        received = {}
+        for path in URLS:
+            view = resolve(path).url_name
+            for token in tokens[:3]:
+                if server == 'wsgi':
+                    status_code, body = wsgi_get(application, path, token)
+                else:
+                    status_code, _, body = asyncio.run(asgi_get(asgi_application, path, token))
+                assert status_code == 200, status_code
+                received[view] = received.get(view, 0) + len(body)
+        text = metrics.render()
+        for view, size in received.items():
+            if sample(text, 'homi_http_requests_total', view) != 3:
+                errors.append(f'{server}: {view} no cuenta 3 peticiones')
+            if sample(text, 'homi_http_response_bytes_total', view) != size:
+                errors.append(f'{server}: {view} no cuenta {size} bytes')
+            if sample(text, 'homi_db_queries_total', view) == 0:
+                errors.append(f'{server}: {view} no cuenta consultas')
+
+    status_code, _ = wsgi_get(application, '/api/metrics/', tokens[0])
+    if status_code != 403:
+        errors.append(f'metrics/ responde {status_code} a un usuario que no es staff')
+    status_code, body = wsgi_get(application, '/api/metrics/', staff_token)
+    if status_code != 200 or b'homi_http_request_duration_seconds_bucket' not in body:
+        errors.append(f'metrics/ responde {status_code} a un usuario staff')
+    set_metrics(False)
+    status_code, _ = wsgi_get(application, '/api/metrics/', staff_token)
+    if status_code != 404:
+        errors.append(f'metrics/ responde {status_code} con las métricas apagadas')
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=50, help='Peticiones por modo en cada ronda')
+    parser.add_argument('--members', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    import logging
+    logging.disable(logging.CRITICAL)
+    from django.urls import resolve
+    from backend.wsgi import application
+
+    data = seed_household(prefix='metrics', members=args.members, news=20, tasks=20, expenses=20, personal_expenses=20)
+    tokens = data['tokens']
+    staff, staff_token = create_user('metrics-staff')
+    staff.is_staff = True
+    staff.save()
+
+    # Calentar la caché de respuestas y la de autenticación
+    set_metrics(False)
+    timed_requests(application, tokens, len(URLS) * len(tokens), 0)
+
+    off, on = request_overhead(application, tokens, args.rounds, args.requests)
+    render_seconds, text = render_cost()
+    per_request, per_query = isolated_costs(20000)
+    views = [resolve(path).url_name for path in URLS]
+    queries_per_request = (
+        sum(sample(text, 'homi_db_queries_total', view) for view in views)
+        / sum(sample(text, 'homi_http_requests_total', view) for view in views)
+    )
+    isolated = per_request + per_query * queries_per_request
+
+    overhead = on - off
+    print(f'{args.rounds} rondas x {args.requests} peticiones por modo, WSGI, caché caliente')
+    print(f'mediana por petición: apagadas {off * 1e3:.3f} ms, encendidas {on * 1e3:.3f} ms '
+          f'({overhead * 1e6:+.1f} µs, {overhead / off:+.1%})')
+    print(f'medido aparte: {per_request * 1e6:.2f} µs por petición + {per_query * 1e6:.2f} µs por consulta '
+          f'x {queries_per_request:.1f} consultas = {isolated * 1e6:.1f} µs')
+    print(f'metrics/: {render_seconds * 1e3:.2f} ms para generar {len(text)} bytes')
+    print(f'presupuesto: {BUDGET_RATIO:.0%} de la mediana (+{BUDGET_MICROSECONDS} µs de ruido) '
+          f'y {BUDGET_MICROSECONDS} µs medidos aparte')
+
+    errors = check_counts(application, tokens, staff_token)
+    for error in errors:
+        print(error)
+    if errors:
+        raise SystemExit('metrics/ no cuenta lo pedido')
+    if overhead > off * BUDGET_RATIO + BUDGET_MICROSECONDS / 1e6:
+        raise SystemExit(f'Las métricas agregan {overhead / off:.1%} por petición, más que el presupuesto')
+    if isolated > BUDGET_MICROSECONDS / 1e6:
+        raise SystemExit(f'Las métricas cuestan {isolated * 1e6:.1f} µs por petición, más que el presupuesto')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""Consultas y latencia de GET /api/personal-expenses/ según el número de miembros.
+
+Uso:
+    python -m benchmarks.personal_expense_summary [--sizes 2 20 200] [--expenses 5]
+
+Termina con error si el número de consultas cambia con el tamaño de la casa.
+"""
+import argparse
+import time
+
+from benchmarks.common import api_client, seed_household, setup_django
+
+
+def measure(size, expenses):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    data = seed_household(
+        prefix=f'miembros{size}-', members=size, news=0, tasks=0, expenses=0, personal_expenses=size * expenses
+    )
+    client = api_client(data['tokens'][0])
+    client.get('/api/personal-expenses/')  # calentar la caché de autenticación
+
+    with CaptureQueriesContext(connection) as queries:
+        began = time.perf_counter()
+        response = client.get('/api/personal-expenses/')
+        elapsed = time.perf_counter() - began
+    assert response.status_code == 200 and len(response.json()['members_summary']) == size
+    return len(queries), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[2, 20, 200])
+    parser.add_argument('--expenses', type=int, default=5, help='Gastos personales por miembro')
+    args = parser.parse_args()
+
+    setup_django()
+    print(f'{"miembros":>10}{"consultas":>12}{"ms":>10}')
+    counts = set()
+    for size in args.sizes:
+        queries, elapsed = measure(size, args.expenses)
+        counts.add(queries)
+        print(f'{size:>10}{queries:>12}{elapsed * 1000:>10.1f}')
+
+    if len(counts) != 1:
+        raise SystemExit('El número de consultas depende del número de miembros')
+
+
+if __name__ == '__main__':
+    main()
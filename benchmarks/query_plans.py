@@ -0,0 +1,133 @@
+"""Planes de consulta (EXPLAIN QUERY PLAN) de las consultas calientes sobre SQLite.
+
+Uso:
+    python -m benchmarks.query_plans [--rows 200] [--verbose]
+
+Siembra una casa, llama a los listados (primera página y siguiente por cursor),
+al resumen de gastos personales, a sync/ y al archivado mensual, y explica cada
+sentencia ejecutada. Termina con error si alguna recorre una tabla completa
+(SCAN) o necesita ordenar en un B-tree temporal.
+"""
+import argparse
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+
+from benchmarks.common import api_client, seed_household, setup_django
+
+LIST_URLS = [
+    '/api/household-news/',
+    '/api/household-tasks/',
+    '/api/household-expenses/',
+    '/api/personal-expenses/',
+]
+OTHER_URLS = [
+    '/api/household-members/',
+    '/api/current-household-info/',
+    '/api/user-profile/',
+    '/api/dashboard/',
+]
+
+
+def capture(job):
+    """Ejecuta job y devuelve las sentencias (sql, params) que lanzó"""
+    from django.db import connection
+
+    statements = []
+
+    def record(execute, sql, params, many, context):
+        statements.append((sql, params))
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(record):
+        job()
+    return statements
+
+
+def explain(sql, params):
+    from django.db import connection
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def is_bad(step):
+    return (step.startswith('SCAN ') and step != 'SCAN CONSTANT ROW') or 'TEMP B-TREE' in step
+
+
+def seed_archive_month(data, rows):
+    from homi.archiving import previous_month
+    from homi.models import PersonalExpense
+
+    year, month = previous_month()
+    for index in range(rows):
+        PersonalExpense.objects.create(
+            title=f'Mes anterior {index}', description='...', cost=Decimal('5.00'),
+            user=data['users'][index % len(data['users'])], household=data['household'], year=year, month=month
+        )
+    return year, month
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200, help='Filas por listado')
+    parser.add_argument('--verbose', action='store_true', help='Mostrar todos los planes')
+    args = parser.parse_args()
+
+    # Se mide el camino a la base de datos, no la caché de respuestas
+    setup_django(HOMI_RESPONSE_CACHE={'ENABLED': False})
+    from django.db import connection
+    from homi.archiving import archive_month
+    from django.utils import timezone
+    from homi.models import Task
+    from homi.sync import encode_cursor
+
+    data = seed_household(
+        members=4, news=args.rows, tasks=args.rows, expenses=args.rows, personal_expenses=args.rows
+    )
+    # Vencimientos repetidos para que el cursor de tareas use las columnas de desempate
+    for index, task in enumerate(Task.objects.all()):
+        Task.objects.filter(pk=task.pk).update(due_datetime=task.due_datetime + timedelta(hours=index % 3))
+    year, month = seed_archive_month(data, args.rows)
+
+    client = api_client(data['tokens'][0])
+    client.get('/api/user-profile/')  # calentar la caché de autenticación
+
+    jobs = []
+    for url in LIST_URLS:
+        jobs.append((url, lambda url=url: client.get(url, {'limit': 10})))
+        cursor = client.get(url, {'limit': 10}).json()['next_cursor']
+        jobs.append((f'{url} (cursor)', lambda url=url, cursor=cursor: client.get(url, {'limit': 10, 'cursor': cursor})))
+    for url in OTHER_URLS:
+        jobs.append((url, lambda url=url: client.get(url)))
+    jobs.append(('/api/sync/', lambda: client.get('/api/sync/')))
+    since = encode_cursor(0, timezone.now())
+    jobs.append(('/api/sync/ (since)', lambda: client.get('/api/sync/', {'since': since})))
+    with tempfile.TemporaryDirectory(prefix='homi-plans-') as directory:
+        jobs.append(('archive_month', lambda: archive_month(year, month, base_dir=directory, batch_size=50)))
+
+        failures = 0
+        for label, job in jobs:
+            print(f'== {label}')
+            seen = set()
+            for sql, params in capture(job):
+                verb = sql.lstrip().split(None, 1)[0].upper()
+                if verb not in ('SELECT', 'UPDATE', 'DELETE') or (sql, str(params)) in seen:
+                    continue
+                seen.add((sql, str(params)))
+                plan = explain(sql, params)
+                bad = [step for step in plan if is_bad(step)]
+                failures += bool(bad)
+                if bad or args.verbose:
+                    print(f'  {"MAL" if bad else "ok "} {sql[:120]}')
+                    for step in plan:
+                        print(f'        {step}')
+
+    if failures:
+        raise SystemExit(f'{failures} consultas con SCAN o B-tree temporal')
+    print('Sin recorridos completos ni ordenamientos temporales')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""Réplica de lectura en un segundo archivo SQLite: lecturas propias tras escribir
+y reparto de las lecturas entre primario y réplica.
+
+Uso:
+    python -m benchmarks.read_replicas [--writes 60] [--lag 10] [--members 6] [--rounds 30]
+
+La réplica se copia del primario con refresh_sqlite_replica cada --lag
+escrituras, así que siempre va por detrás. Reparto: --members miembros piden
+los listados durante --rounds rondas mientras uno escribe una noticia por
+ronda; informa las lecturas por base. Lecturas propias: un miembro crea una
+tarea y enseguida pide household-tasks/, con STICKY_SECONDS en 0 (sin fijar al
+primario) y con el valor de settings; cuenta las respuestas que no traen la
+tarea recién creada. Termina con error si hay lecturas viejas con la fijación
+activada o si la réplica no recibe lecturas.
+"""
+import argparse
+import os
+import tempfile
+from datetime import timedelta
+
+from benchmarks.common import api_client, seed_household, setup_django
+
+URLS = [
+    '/api/household-news/',
+    '/api/household-tasks/',
+    '/api/household-expenses/',
+    '/api/household-members/',
+    '/api/current-household-info/',
+]
+
+
+def configure():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+    from django.conf import settings
+
+    fd, replica = tempfile.mkstemp(prefix='homi-replica-', suffix='.sqlite3')
+    os.close(fd)
+    settings.DATABASES['replica'] = {**settings.DATABASES['default'], 'NAME': replica}
+    setup_django(HOMI_READ_REPLICAS={**settings.HOMI_READ_REPLICAS, 'ALIASES': ['replica']})
+
+
+def refresh_replica():
+    from django.db import connections
+    from homi.management.commands.refresh_sqlite_replica import copy_database
+
+    connections['replica'].close()
+    copy_database(str(connections['default'].settings_dict['NAME']), str(connections['replica'].settings_dict['NAME']))
+
+
+def _rows(response):
+    body = response.json()
+    return body['results'] if isinstance(body, dict) else body
+
+
+def read_your_writes(data, writes, lag):
+    """Crea tareas y las busca enseguida en el listado; devuelve cuántas lecturas fueron viejas"""
+    from django.utils import timezone
+
+    client = api_client(data['tokens'][0])
+    stale = 0
+    for index in range(writes):
+        if index % lag == 0:
+            refresh_replica()
+        response = client.post('/api/create-task/', {
+            'title': f'Nueva {index}', 'description': '...', 'assigned_to': data['users'][1].id,
+            'due_datetime': (timezone.now() + timedelta(minutes=1)).isoformat(), 'priority': 'high',
+        }, content_type='application/json')
+        assert response.status_code == 201, response.content
+        task_id = response.json()['id']
+        listed = {task['id'] for task in _rows(client.get('/api/household-tasks/'))}
+        stale += task_id not in listed
+        # Borrarla mantiene la primera página igual en cada iteración
+        assert client.delete(f'/api/delete-task/{task_id}/').status_code == 200
+    return stale
+
+
+def read_split(data, rounds, lag):
+    from django.utils import timezone
+    from homi import routers
+
+    clients = [api_client(token) for token in data['tokens']]
+    writer = clients[-1]
+    routers.counters.reset()
+    for round_index in range(rounds):
+        if round_index % lag == 0:
+            refresh_replica()
+        for client in clients:
+            for url in URLS:
+                assert client.get(url).status_code == 200
+        response = writer.post('/api/create-news/', {
+            'title': f'Aviso {round_index}', 'content': '...', 'priority': 'normal',
+            'expiry_date': (timezone.now() + timedelta(days=3)).isoformat(),
+        }, content_type='application/json')
+        assert response.status_code == 201, response.content
+    return routers.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--writes', type=int, default=60)
+    parser.add_argument('--lag', type=int, default=10, help='Escrituras entre copias de la réplica')
+    parser.add_argument('--members', type=int, default=6)
+    parser.add_argument('--rounds', type=int, default=30)
+    args = parser.parse_args()
+
+    configure()
+    from django.conf import settings
+
+    data = seed_household(members=args.members, news=50, tasks=50, expenses=50, personal_expenses=0)
+    for client in (api_client(token) for token in data['tokens']):
+        client.get('/api/user-profile/')  # calentar la caché de autenticación
+
+    # Primero el reparto: después de la otra prueba el primer miembro seguiría fijado
+    stats = read_split(data, args.rounds, args.lag)
+    print(f'Reparto: {args.members} miembros x {len(URLS)} listados, {args.rounds} rondas, 1 escritura por ronda')
+    print(f'  lecturas por base: {stats["reads"]} ({stats["replica_read_ratio"]:.0%} en réplicas)')
+    print(f'  peticiones GET: {stats["requests"]["replica"]} a réplica, '
+          f'{stats["requests"]["pinned"]} fijadas al primario tras escribir')
+
+    options = settings.HOMI_READ_REPLICAS
+    print(f'Lecturas propias: {args.writes} tareas creadas, réplica copiada cada {args.lag} escrituras')
+    results = {}
+    for sticky in (0, options['STICKY_SECONDS']):
+        settings.HOMI_READ_REPLICAS = {**options, 'STICKY_SECONDS': sticky}
+        results[sticky] = read_your_writes(data, args.writes, args.lag)
+        print(f'  STICKY_SECONDS={sticky}: {results[sticky]} de {args.writes} listados sin la tarea recién creada')
+    settings.HOMI_READ_REPLICAS = options
+
+    if results[options['STICKY_SECONDS']]:
+        raise SystemExit('Hubo lecturas viejas con la fijación al primario activada')
+    if not stats['reads'].get('replica'):
+        raise SystemExit('La réplica no recibió lecturas')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""Caché de lectura de los listados: sondeo de varios miembros con un escritor y
+estampida de peticiones sobre una entrada fría.
+
+Uso:
+    python -m benchmarks.response_cache [--rows 100] [--members 6] [--rounds 50] [--threads 16]
+
+Sondeo: en cada ronda cada miembro pide los cinco listados cacheados y un miembro
+escribe (crea una noticia, completa o crea una tarea o paga un gasto). Compara consultas
+y latencia con la caché apagada y encendida. Estampida: --threads hilos piden a
+la vez el mismo listado recién invalidado contra una caché en archivo compartida.
+Termina con error si la estampida reconstruye la entrada más de una vez.
+"""
+import argparse
+import tempfile
+import threading
+import time
+from datetime import timedelta
+
+from benchmarks.common import api_client, percentile, seed_household, setup_django
+
+URLS = [
+    '/api/household-news/',
+    '/api/household-tasks/',
+    '/api/household-expenses/',
+    '/api/household-members/',
+    '/api/current-household-info/',
+]
+
+
+def write(data, writer, round_index):
+    from django.utils import timezone
+    from homi.models import Expense, Task
+
+    kind = round_index % 3
+    if kind == 0:
+        response = writer.post('/api/create-news/', {
+            'title': f'Aviso {round_index}', 'content': '...', 'priority': 'normal',
+            'expiry_date': (timezone.now() + timedelta(days=3)).isoformat(),
+        }, content_type='application/json')
+    elif kind == 1:
+        task = Task.objects.filter(
+            household=data['household'], assigned_to=data['users'][1], is_completed=False
+        ).first()
+        if task is None:
+            response = writer.post('/api/create-task/', {
+                'title': f'Tarea {round_index}', 'description': '...', 'assigned_to': data['users'][1].id,
+                'due_datetime': (timezone.now() + timedelta(days=1)).isoformat(), 'priority': 'medium',
+            }, content_type='application/json')
+        else:
+            response = writer.post(f'/api/complete-task/{task.id}/')
+    else:
+        expense = Expense.objects.filter(household=data['household'], remaining_amount__gt=0).exclude(
+            payments__user=data['users'][1]
+        ).first()
+        response = writer.post(f'/api/pay-expense/{expense.id}/')
+    assert response.status_code in (200, 201), response.content
+
+
+def polling(data, clients, writer, rounds):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    timings = []
+    with CaptureQueriesContext(connection) as queries:
+        for round_index in range(rounds):
+            for client in clients:
+                for url in URLS:
+                    began = time.perf_counter()
+                    assert client.get(url).status_code == 200
+                    timings.append((time.perf_counter() - began) * 1000)
+            write(data, writer, round_index)
+    return len(queries), percentile(timings, 0.5), percentile(timings, 0.95)
+
+
+def stampede(data, threads):
+    """Peticiones simultáneas sobre la misma entrada fría; devuelve las reconstrucciones"""
+    from django.db import connection
+    from homi import response_cache
+    from homi.models import CollectionVersion
+    from homi.versions import bump
+
+    bump(data['household'].pk, CollectionVersion.EXPENSES)
+    response_cache.counters.reset()
+    clients = [api_client(data['tokens'][index % len(data['tokens'])]) for index in range(threads)]
+    barrier = threading.Barrier(threads)
+
+    def request(client):
+        try:
+            barrier.wait()
+            assert client.get('/api/household-expenses/').status_code == 200
+        finally:
+            connection.close()
+
+    workers = [threading.Thread(target=request, args=(client,)) for client in clients]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return response_cache.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100, help='Filas por listado')
+    parser.add_argument('--members', type=int, default=6)
+    parser.add_argument('--rounds', type=int, default=50)
+    parser.add_argument('--threads', type=int, default=16)
+    args = parser.parse_args()
+
+    cache_dir = tempfile.mkdtemp(prefix='homi-cache-')
+    setup_django(CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'shared': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': cache_dir},
+    })
+    from django.conf import settings
+    from homi import response_cache
+
+    data = seed_household(
+        members=args.members, news=args.rows, tasks=args.rows, expenses=args.rows, personal_expenses=0
+    )
+    clients = [api_client(token) for token in data['tokens']]
+    writer = clients[1]
+    clients[0].get('/api/user-profile/')  # calentar la caché de autenticación
+
+    print(f'Sondeo: {args.members} miembros x {len(URLS)} listados, 1 escritura por ronda, {args.rounds} rondas')
+    print(f'{"caché":<12}{"consultas":>10}{"p50 ms":>9}{"p95 ms":>9}{"aciertos":>10}')
+    options = settings.HOMI_RESPONSE_CACHE
+    for label, enabled in (('apagada', False), ('encendida', True)):
+        settings.HOMI_RESPONSE_CACHE = {**options, 'ENABLED': enabled}
+        response_cache.counters.reset()
+        queries, p50, p95 = polling(data, clients, writer, args.rounds)
+        hit_ratio = f'{response_cache.stats()["hit_ratio"]:.0%}' if enabled else '-'
+        print(f'{label:<12}{queries:>10}{p50:>9.2f}{p95:>9.2f}{hit_ratio:>10}')
+
+    settings.HOMI_RESPONSE_CACHE = {**options, 'CACHE_ALIAS': 'shared'}
+    result = stampede(data, args.threads)
+    print(f'Estampida de {args.threads} hilos (caché en archivo): {result["misses"]} reconstrucción(es), '
+          f'{result["lock_waits"]} esperas, {result["lock_timeouts"]} agotadas')
+    if result['misses'] != 1:
+        raise SystemExit(f'La entrada se reconstruyó {result["misses"]} veces')
+
+
+if __name__ == '__main__':
+    main()
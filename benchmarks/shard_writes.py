@@ -0,0 +1,209 @@
+"""Rendimiento de escritura con las casas repartidas entre 1, 2 y 4 shards.
+
+Uso:
+    python -m benchmarks.shard_writes [--shards 1,2,4] [--households 8] [--writers 2] [--ops 40] [--processes 4]
+
+Cada configuración corre en su propio proceso con bases SQLite nuevas (un
+archivo por shard, perfil de producción de settings.DATABASES). Las
+--households casas se crean con create-household, que coloca cada una en el
+shard con menos casas, y --writers miembros de cada casa escriben a la vez
+(crear noticias, crear y completar tareas, crear gastos personales) --ops
+operaciones cada uno, repartidos entre --processes procesos como los workers
+de un servidor WSGI. Informa escrituras por segundo, latencia p50/p99 y los
+reintentos por candado de homi.sqlite. Termina con error si alguna escritura
+falla o si con el mayor número de shards la latencia p99 no baja respecto de uno
+solo (los escritores de otras casas ya no esperan el mismo candado). Con más de
+una CPU también exige más escrituras por segundo; con una sola, el proceso
+limita el total y repartir el candado no lo aumenta.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.common import api_client, create_user, percentile, setup_django
+
+
+def configure(shard_count):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+    from django.conf import settings
+
+    aliases = ['default']
+    for number in range(1, shard_count):
+        fd, name = tempfile.mkstemp(prefix=f'homi-shard{number}-', suffix='.sqlite3')
+        os.close(fd)
+        alias = f'shard{number}'
+        settings.DATABASES[alias] = {**settings.DATABASES['default'], 'NAME': name}
+        aliases.append(alias)
+    setup_django(HOMI_SHARDS={**settings.HOMI_SHARDS, 'ALIASES': aliases})
+
+    from django.core.management import call_command
+    for alias in aliases[1:]:
+        call_command('migrate', database=alias, verbosity=0)
+    return aliases
+
+
+def create_households(households, writers):
+    """Casas creadas y unidas por la API; devuelve los tokens de los escritores por casa"""
+    from django.db.models import Count
+    from homi.models import HouseholdShard
+
+    tokens = []
+    for number in range(households):
+        members = [create_user(f'shard-bench{number}-{index}') for index in range(writers)]
+        owner = api_client(members[0][1])
+        response = owner.post('/api/create-household/', {'name': f'Casa {number}'}, content_type='application/json')
+        assert response.status_code == 201, response.content
+        for _, token in members[1:]:
+            joined = api_client(token).post(
+                '/api/join-household/', {'code': response.json()['code']}, content_type='application/json'
+            )
+            assert joined.status_code == 200, joined.content
+        tokens.append([token for _, token in members])
+    placement = dict(HouseholdShard.objects.values_list('shard').annotate(total=Count('*')).order_by())
+    return tokens, placement
+
+
+def run_workers(jobs, barrier, results, ops):
+    """Proceso de trabajo: un hilo por escritor de jobs"""
+    from django.db import connections
+    from homi.sqlite.base import counters
+
+    logging.disable(logging.CRITICAL)  # los 500 de las vistas registran el error
+    samples = []
+    lock = threading.Lock()
+
+    def writer(token, user_id):
+        client = api_client(token)
+        client.get('/api/user-profile/')  # calentar la caché de autenticación
+        try:
+            barrier.wait()
+            task_id = None
+            for op in range(ops):
+                kind = op % 4
+                if kind == 0:
+                    url, body = '/api/create-news/', {
+                        'title': f'Aviso {op}', 'content': '...', 'priority': 'normal',
+                        'expiry_date': '2099-01-01T00:00:00Z',
+                    }
+                elif kind == 1:
+                    url, body = '/api/create-task/', {
+                        'title': f'Tarea {op}', 'description': '...', 'assigned_to': user_id,
+                        'due_datetime': '2099-01-01T00:00:00Z', 'priority': 'medium',
+                    }
+                elif kind == 2 and task_id is not None:
+                    url, body = f'/api/complete-task/{task_id}/', None
+                else:
+                    url, body = '/api/create-personal-expense/', {
+                        'title': f'Gasto {op}', 'description': '...', 'cost': '12.50',
+                    }
+                began = time.perf_counter()
+                response = client.post(url, body, content_type='application/json')
+                elapsed = (time.perf_counter() - began) * 1000
+                if kind == 1 and response.status_code == 201:
+                    task_id = response.json()['id']
+                with lock:
+                    samples.append((elapsed, response.status_code))
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=writer, args=job) for job in jobs]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.put((samples, counters.snapshot()))
+
+
+def run_config(shard_count, households, writers, ops, processes):
+    aliases = configure(shard_count)
+    from django.db import connections
+    from rest_framework.authtoken.models import Token
+
+    tokens, placement = create_households(households, writers)
+    users = dict(Token.objects.values_list('key', 'user_id'))
+    jobs = [(token, users[token]) for household_tokens in tokens for token in household_tokens]
+    # Las conexiones no se heredan entre procesos
+    connections.close_all()
+
+    context = multiprocessing.get_context('fork')
+    barrier = context.Barrier(len(jobs))
+    results = context.Queue()
+    workers = [
+        context.Process(target=run_workers, args=(jobs[number::processes], barrier, results, ops))
+        for number in range(processes)
+    ]
+    began = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    collected = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - began
+
+    samples = [sample for worker_samples, _ in collected for sample in worker_samples]
+    timings = [ms for ms, _ in samples]
+    result = {
+        'shards': shard_count,
+        'placement': {alias: placement.get(alias, 0) for alias in aliases},
+        'elapsed': elapsed,
+        'writes': len(samples),
+        'errors': sum(1 for _, status_code in samples if status_code >= 400),
+        'p50': percentile(timings, 0.5),
+        'p99': percentile(timings, 0.99),
+    }
+    for _, snapshot in collected:
+        for field, value in snapshot.items():
+            result[field] = result.get(field, 0) + value
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--shards', default='1,2,4', help='Números de shards a comparar, separados por comas')
+    parser.add_argument('--households', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=2, help='Miembros que escriben en cada casa')
+    parser.add_argument('--ops', type=int, default=40, help='Escrituras por miembro')
+    parser.add_argument('--processes', type=int, default=4, help='Procesos de trabajo, como los workers del servidor')
+    parser.add_argument('--run', type=int, help='Corre sólo esta cantidad de shards e imprime JSON')
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run_config(args.run, args.households, args.writers, args.ops, args.processes)))
+        return
+
+    counts = [int(count) for count in args.shards.split(',')]
+    print(f'{args.households} casas x {args.writers} escritores, {args.ops} escrituras cada uno, '
+          f'{args.processes} procesos')
+    print(f'{"shards":<8}{"casas por shard":<22}{"escr/s":>9}{"p50 ms":>9}{"p99 ms":>9}{"reintentos":>12}{"errores":>9}')
+    results = {}
+    for count in counts:
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.shard_writes', '--run', str(count),
+             '--households', str(args.households), '--writers', str(args.writers), '--ops', str(args.ops),
+             '--processes', str(args.processes)],
+            capture_output=True, text=True, check=True,
+        ).stdout
+        result = results[count] = json.loads(output.strip().splitlines()[-1])
+        placement = '/'.join(str(households) for households in result['placement'].values())
+        print(f'{count:<8}{placement:<22}{result["writes"] / result["elapsed"]:>9.1f}{result["p50"]:>9.1f}'
+              f'{result["p99"]:>9.1f}{result["lock_retries"]:>12}{result["errors"]:>9}')
+
+    for count, result in results.items():
+        if result['errors']:
+            raise SystemExit(f'Hubo escrituras con error con {count} shards: {result}')
+    fewest, most = results[min(counts)], results[max(counts)]
+    if most['p99'] >= fewest['p99']:
+        raise SystemExit(f'La latencia p99 con {max(counts)} shards no baja respecto de {min(counts)}')
+    if (os.cpu_count() or 1) > 1 and most['writes'] / most['elapsed'] <= fewest['writes'] / fewest['elapsed']:
+        raise SystemExit(f'{max(counts)} shards no escriben más rápido que {min(counts)}')
+
+
+if __name__ == '__main__':
+    main()
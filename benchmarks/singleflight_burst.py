@@ -0,0 +1,179 @@
+"""Agrupación de lecturas idénticas simultáneas (singleflight) bajo ráfagas.
+
+Uso:
+    python -m benchmarks.singleflight_burst [--rows 200] [--threads 24] [--bursts 20]
+
+Cada ráfaga invalida los listados (como una escritura) y --threads hilos, como
+los de un servidor WSGI con hilos, piden a la vez los listados de la casa
+repartidos entre los miembros. Cuenta las consultas de todas las conexiones
+con singleflight apagado y encendido, con la caché de respuestas apagada y
+encendida. Después repite la ráfaga con corrutinas en un event loop (do_async,
+como las vistas async bajo ASGI) y cuenta cuántas veces se construye el listado.
+Termina con error si singleflight no reduce las consultas con la caché apagada
+(con la caché encendida el candado de response_cache ya limita las
+reconstrucciones; singleflight ahorra lecturas de la caché, no consultas).
+"""
+import argparse
+import asyncio
+import threading
+import time
+
+from benchmarks.common import api_client, percentile, seed_household, setup_django
+
+URLS = [
+    '/api/household-news/',
+    '/api/household-tasks/',
+    '/api/household-expenses/',
+    '/api/household-members/',
+    '/api/current-household-info/',
+]
+
+
+class QueryCounter:
+    """Cuenta las consultas de todas las conexiones, en cualquier hilo"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def install(self, connection, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+
+def burst(clients, threads):
+    """Una ráfaga simultánea; devuelve las latencias en ms"""
+    from django.db import connection
+
+    barrier = threading.Barrier(threads)
+    timings = []
+    lock = threading.Lock()
+
+    def request(index):
+        client = clients[index % len(clients)]
+        try:
+            barrier.wait()
+            began = time.perf_counter()
+            assert client.get(URLS[index % len(URLS)]).status_code == 200
+            with lock:
+                timings.append((time.perf_counter() - began) * 1000)
+        finally:
+            connection.close()
+
+    workers = [threading.Thread(target=request, args=(index,)) for index in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return timings
+
+
+def run(data, clients, counter, threads, bursts):
+    from homi.models import CollectionVersion
+    from homi.versions import bump
+
+    counter.count = 0
+    timings = []
+    for _ in range(bursts):
+        for collection, _ in CollectionVersion.COLLECTION_CHOICES:
+            bump(data['household'].pk, collection)
+        timings.extend(burst(clients, threads))
+    return counter.count, percentile(timings, 0.5), percentile(timings, 0.95)
+
+
+def async_burst(data, coroutines, coalesce):
+    """Ráfaga de corrutinas sobre el mismo listado; devuelve las construcciones"""
+    from asgiref.sync import sync_to_async
+    from django.db import connection
+    from homi.models import News
+    from homi.serializers import NewsSerializer
+    from homi.singleflight import flights
+
+    builds = []
+
+    def build():
+        builds.append(1)
+        try:
+            rows = News.objects.filter(household=data['household']).select_related('created_by')
+            return NewsSerializer(rows, many=True).data
+        finally:
+            connection.close()
+
+    build_async = sync_to_async(build, thread_sensitive=False)
+
+    async def request():
+        if coalesce:
+            return await flights.do_async(('bench', data['household'].pk, 'news'), build_async)
+        return await build_async()
+
+    async def main():
+        results = await asyncio.gather(*(request() for _ in range(coroutines)))
+        assert all(len(result) == len(results[0]) for result in results)
+
+    asyncio.run(main())
+    return len(builds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200, help='Filas por listado')
+    parser.add_argument('--members', type=int, default=6)
+    parser.add_argument('--threads', type=int, default=24)
+    parser.add_argument('--bursts', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.db import connection
+    from django.db.backends.signals import connection_created
+    from homi.singleflight import flights
+
+    data = seed_household(
+        members=args.members, news=args.rows, tasks=args.rows, expenses=args.rows, personal_expenses=0
+    )
+    clients = [api_client(token) for token in data['tokens']]
+    for client in clients:
+        client.get('/api/user-profile/')  # calentar la caché de autenticación
+
+    counter = QueryCounter()
+    connection_created.connect(counter.install, weak=False)
+    counter.install(connection)
+
+    print(f'{args.bursts} ráfagas de {args.threads} peticiones simultáneas sobre {len(URLS)} listados '
+          f'({args.rows} filas)')
+    print(f'{"caché":<11}{"singleflight":<14}{"consultas":>10}{"por petición":>14}{"p50 ms":>9}{"p95 ms":>9}'
+          f'{"agrupadas":>11}')
+    cache_options = settings.HOMI_RESPONSE_CACHE
+    flight_options = settings.HOMI_SINGLEFLIGHT
+    results = {}
+    for cache_enabled in (False, True):
+        for coalesce in (False, True):
+            settings.HOMI_RESPONSE_CACHE = {**cache_options, 'ENABLED': cache_enabled}
+            settings.HOMI_SINGLEFLIGHT = {**flight_options, 'ENABLED': coalesce}
+            flights.reset_stats()
+            queries, p50, p95 = run(data, clients, counter, args.threads, args.bursts)
+            results[cache_enabled, coalesce] = queries
+            followers = flights.stats()['followers'] if coalesce else '-'
+            print(f'{"encendida" if cache_enabled else "apagada":<11}{"sí" if coalesce else "no":<14}'
+                  f'{queries:>10}{queries / (args.threads * args.bursts):>14.1f}{p50:>9.2f}{p95:>9.2f}'
+                  f'{followers:>11}')
+    settings.HOMI_RESPONSE_CACHE = cache_options
+    settings.HOMI_SINGLEFLIGHT = flight_options
+
+    plain, coalesced = async_burst(data, args.threads, False), async_burst(data, args.threads, True)
+    print(f'Ráfaga async de {args.threads} corrutinas: {plain} construcciones sin singleflight, '
+          f'{coalesced} con singleflight')
+
+    if results[False, True] >= results[False, False]:
+        raise SystemExit('singleflight no redujo las consultas')
+    if coalesced >= plain:
+        raise SystemExit('singleflight no agrupó las corrutinas')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+"""Carga mixta de lecturas y escrituras sobre SQLite con distintos perfiles.
+
+Uso:
+    python -m benchmarks.sqlite_contention [--processes 4] [--writers 8] [--readers 16] [--ops 40]
+
+Cada perfil corre en su propio proceso con una base nueva:
+
+- stock: backend sqlite3 de Django sin opciones (modo de diario por defecto,
+  transacciones diferidas)
+- production: la configuración de settings.DATABASES (homi.sqlite con WAL,
+  pragmas, BEGIN IMMEDIATE y reintentos)
+- writer-queue: production con HOMI_SQLITE['WRITER_QUEUE']
+
+--writers hilos pagan gastos, crean noticias y completan tareas mientras
+--readers hilos piden los listados, todos a la vez y --ops operaciones cada uno,
+repartidos entre --processes procesos como los workers de un servidor WSGI.
+Informa la tasa de errores (respuestas 5xx) y la latencia p50/p99 de lecturas y
+escrituras. Termina con error si el perfil de producción tiene errores.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from benchmarks.common import api_client, percentile, seed_household, setup_django
+
+PROFILES = ('stock', 'production', 'writer-queue')
+
+READ_URLS = [
+    '/api/household-news/',
+    '/api/household-tasks/',
+    '/api/household-expenses/',
+    '/api/personal-expenses/',
+    '/api/current-household-info/',
+]
+
+
+def configure(profile):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+    from django.conf import settings
+
+    overrides = {}
+    if profile == 'stock':
+        settings.DATABASES['default'].update({'ENGINE': 'django.db.backends.sqlite3', 'OPTIONS': {}})
+    elif profile == 'writer-queue':
+        overrides['HOMI_SQLITE'] = {**settings.HOMI_SQLITE, 'WRITER_QUEUE': True}
+    setup_django(**overrides)
+
+
+def writer_plan(data, index, ops):
+    """Operaciones del escritor index: pagar, crear una noticia o completar una tarea"""
+    from homi.models import Expense, Task
+
+    user = data['users'][index]
+    expenses = list(
+        Expense.objects.filter(household=data['household']).exclude(payments__user=user)
+        .values_list('id', flat=True)
+    )
+    tasks = list(
+        Task.objects.filter(household=data['household'], assigned_to=user, is_completed=False)
+        .values_list('id', flat=True)
+    )
+    plan = []
+    for op in range(ops):
+        kind = op % 3
+        if kind == 0 and expenses:
+            plan.append((f'/api/pay-expense/{expenses.pop()}/', None))
+        elif kind == 2 and tasks:
+            plan.append((f'/api/complete-task/{tasks.pop()}/', None))
+        else:
+            plan.append(('/api/create-news/', {
+                'title': f'Aviso {index}-{op}', 'content': '...', 'priority': 'normal',
+                'expiry_date': '2099-01-01T00:00:00Z',
+            }))
+    return plan
+
+
+def run_workers(data, plans, jobs, barrier, results, ops):
+    """Proceso de trabajo: un hilo por (tipo, índice) de jobs"""
+    from django.db import connection
+    from homi.sqlite.base import counters
+
+    logging.disable(logging.CRITICAL)  # los 500 de las vistas registran el error
+    samples = []
+    lock = threading.Lock()
+
+    def record(kind, began, status_code):
+        with lock:
+            samples.append((kind, (time.perf_counter() - began) * 1000, status_code))
+
+    def writer(index):
+        client = api_client(data['tokens'][index])
+        client.get('/api/user-profile/')  # calentar la caché de autenticación
+        try:
+            barrier.wait()
+            for url, body in plans[index]:
+                began = time.perf_counter()
+                response = client.post(url, body, content_type='application/json')
+                record('write', began, response.status_code)
+        finally:
+            connection.close()
+
+    def reader(index):
+        client = api_client(data['tokens'][index % len(data['tokens'])])
+        client.get('/api/user-profile/')
+        try:
+            barrier.wait()
+            for op in range(ops):
+                began = time.perf_counter()
+                response = client.get(READ_URLS[(index + op) % len(READ_URLS)])
+                record('read', began, response.status_code)
+        finally:
+            connection.close()
+
+    targets = {'write': writer, 'read': reader}
+    threads = [threading.Thread(target=targets[kind], args=(index,)) for kind, index in jobs]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.put((samples, counters.snapshot()))
+
+
+def run_profile(profile, processes, writers, readers, ops):
+    configure(profile)
+    from django.db import connection
+
+    data = seed_household(
+        members=writers, news=50, tasks=writers * ops, expenses=writers * ops, personal_expenses=50
+    )
+    plans = [writer_plan(data, index, ops) for index in range(writers)]
+    jobs = [('write', index) for index in range(writers)] + [('read', index) for index in range(readers)]
+    # Las conexiones no se heredan entre procesos
+    connection.close()
+
+    context = multiprocessing.get_context('fork')
+    barrier = context.Barrier(writers + readers)
+    results = context.Queue()
+    workers = [
+        context.Process(target=run_workers, args=(data, plans, jobs[number::processes], barrier, results, ops))
+        for number in range(processes)
+    ]
+    began = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    collected = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - began
+
+    result = {'profile': profile, 'elapsed': elapsed}
+    for _, snapshot in collected:
+        for field, value in snapshot.items():
+            result[field] = result.get(field, 0) + value
+    samples = [sample for worker_samples, _ in collected for sample in worker_samples]
+    for kind in ('read', 'write'):
+        statuses = [status_code for sample_kind, _, status_code in samples if sample_kind == kind]
+        timings = [ms for sample_kind, ms, _ in samples if sample_kind == kind]
+        result[f'{kind}_total'] = len(statuses)
+        result[f'{kind}_errors'] = sum(1 for status_code in statuses if status_code >= 500)
+        result[f'{kind}_rejected'] = sum(1 for status_code in statuses if 400 <= status_code < 500)
+        result[f'{kind}_p50'] = percentile(timings, 0.5)
+        result[f'{kind}_p99'] = percentile(timings, 0.99)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--processes', type=int, default=4, help='Procesos de trabajo, como los workers del servidor')
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--readers', type=int, default=16)
+    parser.add_argument('--ops', type=int, default=40, help='Operaciones por hilo')
+    parser.add_argument('--profile', choices=PROFILES, help='Corre sólo este perfil e imprime JSON')
+    args = parser.parse_args()
+
+    if args.profile:
+        print(json.dumps(run_profile(args.profile, args.processes, args.writers, args.readers, args.ops)))
+        return
+
+    print(f'{args.writers} escritores y {args.readers} lectores en {args.processes} procesos, '
+          f'{args.ops} operaciones por hilo')
+    print(f'{"perfil":<14}{"errores":>9}{"escr. p50":>11}{"escr. p99":>11}{"lect. p50":>11}{"lect. p99":>11}'
+          f'{"seg":>7}{"reintentos":>12}')
+    results = {}
+    for profile in PROFILES:
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.sqlite_contention', '--profile', profile, '--processes', str(args.processes),
+             '--writers', str(args.writers), '--readers', str(args.readers), '--ops', str(args.ops)],
+            capture_output=True, text=True, check=True,
+        ).stdout
+        result = results[profile] = json.loads(output.strip().splitlines()[-1])
+        total = result['read_total'] + result['write_total']
+        errors = result['read_errors'] + result['write_errors']
+        print(f'{profile:<14}{errors / total:>9.1%}{result["write_p50"]:>11.1f}{result["write_p99"]:>11.1f}'
+              f'{result["read_p50"]:>11.1f}{result["read_p99"]:>11.1f}{result["elapsed"]:>7.1f}'
+              f'{result["lock_retries"]:>12}')
+    for profile in ('production', 'writer-queue'):
+        result = results[profile]
+        if result['read_errors'] or result['write_errors'] or result['write_rejected']:
+            raise SystemExit(f'El perfil {profile} tuvo errores: {result}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""Carga del endpoint SSE events/: miles de conexiones ociosas en un worker ASGI.
+
+Uso:
+    python -m benchmarks.sse_connections [--connections 2000] [--members 20]
+
+Abre --connections conexiones contra backend.asgi en un solo proceso (sin red:
+se llama a la aplicación ASGI directamente), mide la memoria por conexión
+(tracemalloc y RSS), crea una noticia y mide cuánto tarda el evento en llegar a
+todas, y verifica que al desconectarse no queden suscripciones.
+"""
+import argparse
+import asyncio
+import os
+import time
+import tracemalloc
+
+from benchmarks.common import seed_household, setup_django
+
+
+def rss_bytes():
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+class Connection:
+    """Cliente ASGI mínimo que acumula lo que recibe"""
+
+    def __init__(self, application, token):
+        self.application = application
+        self.token = token
+        self.disconnect = asyncio.Event()
+        self.received = asyncio.Event()
+        self.status = None
+        self.body = b''
+        self.sent_request = False
+
+    async def receive(self):
+        if not self.sent_request:
+            self.sent_request = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await self.disconnect.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(self, message):
+        if message['type'] == 'http.response.start':
+            self.status = message['status']
+        elif message['type'] == 'http.response.body':
+            self.body += message.get('body', b'')
+            if b'event: news.created' in self.body:
+                self.received.set()
+
+    def run(self):
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': '/api/events/', 'raw_path': b'/api/events/', 'query_string': b'',
+            'root_path': '', 'headers': [(b'host', b'testserver'), (b'authorization', f'Token {self.token}'.encode())],
+            'client': ('127.0.0.1', 0), 'server': ('testserver', 80),
+        }
+        return asyncio.create_task(self.application(scope, self.receive, self.send))
+
+
+async def wait_until(predicate, timeout=120):
+    deadline = time.perf_counter() + timeout
+    while not predicate():
+        if time.perf_counter() > deadline:
+            raise SystemExit('Tiempo de espera agotado')
+        await asyncio.sleep(0.05)
+
+
+async def run(application, data, count):
+    from asgiref.sync import sync_to_async
+    from homi.events import broker
+    from homi.models import News
+    from django.utils import timezone
+
+    tokens = data['tokens']
+    baseline_rss = rss_bytes()
+    tracemalloc.start()
+    baseline_traced = tracemalloc.get_traced_memory()[0]
+
+    began = time.perf_counter()
+    connections = [Connection(application, tokens[index % len(tokens)]) for index in range(count)]
+    tasks = [connection.run() for connection in connections]
+    await wait_until(lambda: broker.connection_count() == count)
+    opened = time.perf_counter() - began
+
+    traced = tracemalloc.get_traced_memory()[0] - baseline_traced
+    tracemalloc.stop()
+    rss = rss_bytes() - baseline_rss
+    print(f'{count} conexiones abiertas en {opened:.1f} s')
+    print(f'memoria por conexión: {traced / count / 1024:.1f} KiB (tracemalloc), {rss / count / 1024:.1f} KiB (RSS)')
+
+    def create_news():
+        News.objects.create(
+            title='Aviso', content='...', expiry_date=timezone.now() + timezone.timedelta(days=1),
+            created_by=data['users'][0], household=data['household']
+        )
+
+    began = time.perf_counter()
+    await sync_to_async(create_news)()
+    await asyncio.wait_for(asyncio.gather(*(connection.received.wait() for connection in connections)), 60)
+    print(f'evento entregado a {count} conexiones en {(time.perf_counter() - began) * 1000:.1f} ms')
+
+    for connection in connections:
+        connection.disconnect.set()
+    await asyncio.wait_for(asyncio.gather(*tasks, return_exceptions=True), 60)
+    await wait_until(lambda: broker.connection_count() == 0)
+    statuses = {connection.status for connection in connections}
+    print(f'desconectadas; suscripciones restantes: {broker.connection_count()}, estados: {statuses}')
+    return statuses == {200}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--connections', type=int, default=2000)
+    parser.add_argument('--members', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    from backend.asgi import application
+
+    data = seed_household(members=args.members, news=0, tasks=0, expenses=0, personal_expenses=0)
+    ok = asyncio.run(run(application, data, args.connections))
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class HomiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'homi'
+
+    def ready(self):
+        # Registrar las señales de invalidación de cachés
+        from . import signals  # noqa: F401
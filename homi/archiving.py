@@ -0,0 +1,316 @@
+"""Archivado y borrado por lotes de los gastos personales de un mes.
+
+Reemplaza el DELETE único de cleanup_old_expenses, que en SQLite mantenía el
+bloqueo de escritura durante todo el borrado y perdía los datos:
+
+1. Archivo: los gastos del mes se escriben, por casa, en
+   <HOMI_ARCHIVE_DIR>/<año>-<mes>/household-<id>.jsonl.gz leyendo en páginas
+   cortas por id (ninguna lectura larga retiene el bloqueo compartido).
+2. Borrado: se eliminan por rangos de id acotados, cada uno en su propia
+   transacción corta que también descuenta los acumulados mensuales, incrementa
+   la versión de personal_expenses de cada casa afectada y registra los
+   borrados para la sincronización (el borrado por lotes no pasa por
+   PersonalExpense.delete()).
+
+El progreso se guarda en manifest.json después de cada casa archivada y de
+cada lote borrado, así que tras una caída basta con volver a ejecutar: las
+casas ya archivadas se saltan y el borrado continúa desde el último lote.
+Con varios shards (shards.py) se procesa una base tras otra, cada una con su
+propio manifest (manifest-<alias>.json salvo 'default').
+
+start_archive_job y archive_month_locked permiten un solo archivado a la vez
+en todos los procesos: toman un JobLock en la base global que se renueva
+mientras el trabajo avanza y vence si el proceso se cae.
+"""
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+from django.db.models import Count, DecimalField, Exists, F, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import shards, versions
+from .models import (
+    CollectionVersion, Household, HouseholdChange, JobLock, PersonalExpense, PersonalExpenseRollup
+)
+
+ARCHIVE_FIELDS = (
+    'id', 'title', 'description', 'cost', 'user_id', 'household_id', 'source',
+    'shared_payment_id', 'created_at', 'month', 'year',
+)
+
+logger = logging.getLogger(__name__)
+
+# Nombre del JobLock del archivado
+JOB_LOCK = 'archive-personal-expenses'
+
+
+def previous_month():
+    now = timezone.now()
+    return (now.year - 1, 12) if now.month == 1 else (now.year, now.month - 1)
+
+
+def archive_dir(year, month, base_dir=None):
+    return Path(base_dir or settings.HOMI_ARCHIVE_DIR) / f'{year}-{month:02d}'
+
+
+def _manifest_name(alias):
+    return 'manifest.json' if alias == DEFAULT_DB_ALIAS else f'manifest-{alias}.json'
+
+
+def _write_manifest(path, manifest):
+    temporary = path.with_suffix('.tmp')
+    temporary.write_text(json.dumps(manifest, indent=2))
+    os.replace(temporary, path)
+
+
+def _load_manifest(path, year, month):
+    if path.exists():
+        return json.loads(path.read_text())
+
+    # Sólo se procesan las filas que existían al empezar. El id máximo de la tabla
+    # sale del índice primario; un MIN/MAX filtrado por mes recorrería todas las filas
+    return {
+        'year': year,
+        'month': month,
+        'snapshot_id': PersonalExpense.objects.aggregate(max_id=Max('id'))['max_id'] or 0,
+        'households': {},
+        'archived': False,
+        'min_id': None,
+        'max_id': None,
+        'deleted_up_to': None,
+        'completed': False,
+    }
+
+
+def _household_ids(page_size):
+    """Ids de todas las casas en páginas por clave primaria"""
+    last_id = 0
+    while True:
+        page = list(Household.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:page_size])
+        if not page:
+            return
+        yield from page
+        last_id = page[-1]
+
+
+def _archive_household(directory, household_id, queryset, page_size):
+    """Escribe los gastos de una casa en streaming; devuelve el archivo, las filas
+    y el primer y último id escritos"""
+    final = directory / f'household-{household_id}.jsonl.gz'
+    temporary = final.with_name(final.name + '.tmp')
+    rows = 0
+    first_id = last_id = 0
+    with gzip.open(temporary, 'wt', encoding='utf-8') as output:
+        while True:
+            page = list(
+                queryset.filter(household_id=household_id, id__gt=last_id)
+                .order_by('id').values(*ARCHIVE_FIELDS)[:page_size]
+            )
+            if not page:
+                break
+            for row in page:
+                output.write(json.dumps(row, cls=DjangoJSONEncoder))
+                output.write('\n')
+            rows += len(page)
+            first_id = first_id or page[0]['id']
+            last_id = page[-1]['id']
+    if not rows:
+        temporary.unlink()
+        return None, 0, None, None
+    os.replace(temporary, final)
+    return final.name, rows, first_id, last_id
+
+
+def _delete_range(year, month, low, high):
+    """Borra un rango de ids del mes en una transacción que también descuenta sus
+    acumulados, incrementa las versiones y registra los borrados de cada casa.
+
+    Devuelve las filas borradas y los segundos que se retuvo el bloqueo de
+    escritura (desde el BEGIN hasta el commit).
+    """
+    batch = PersonalExpense.objects.filter(year=year, month=month, id__gte=low, id__lt=high)
+    per_user = batch.filter(household_id=OuterRef('household_id'), user_id=OuterRef('user_id')).order_by()
+    totals = per_user.values('household_id', 'user_id').annotate(total=Sum('cost')).values('total')
+    counts = per_user.values('household_id', 'user_id').annotate(count=Count('*')).values('count')
+
+    with shards.atomic():
+        # BEGIN IMMEDIATE ya tomó el bloqueo de escritura
+        locked = time.perf_counter()
+        deleted_rows = list(batch.order_by().values_list('household_id', 'id'))
+        PersonalExpenseRollup.objects.filter(year=year, month=month).filter(Exists(per_user)).update(
+            total=F('total') - Coalesce(Subquery(totals), Value(Decimal('0')), output_field=DecimalField()),
+            expense_count=F('expense_count') - Coalesce(Subquery(counts), 0),
+        )
+        deleted, _ = batch.delete()
+        versions.bump_households(
+            sorted({household_id for household_id, _ in deleted_rows}), CollectionVersion.PERSONAL_EXPENSES
+        )
+        HouseholdChange.objects.bulk_create([
+            HouseholdChange(
+                household_id=household_id, entity=CollectionVersion.PERSONAL_EXPENSES,
+                object_id=expense_id, operation=HouseholdChange.DELETE,
+            )
+            for household_id, expense_id in deleted_rows
+        ])
+    return deleted, time.perf_counter() - locked
+
+
+def _delete_range_with_retry(year, month, low, high, attempts=5):
+    """Reintenta el lote si otro escritor retuvo el bloqueo más que el timeout"""
+    for attempt in range(attempts):
+        try:
+            return _delete_range(year, month, low, high)
+        except OperationalError as e:
+            if 'locked' not in str(e) or attempt == attempts - 1:
+                raise
+            time.sleep(0.05 * 2 ** attempt)
+
+
+def archive_month(year, month, base_dir=None, batch_size=2000, log=None, heartbeat=None):
+    """Archiva y borra los gastos personales de un mes en todos los shards; devuelve estadísticas.
+
+    heartbeat se llama después de cada casa archivada y de cada lote borrado.
+    """
+    log = log or (lambda message: None)
+    heartbeat = heartbeat or (lambda: None)
+    directory = archive_dir(year, month, base_dir)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    stats = {
+        'archived_rows': 0, 'archive_seconds': 0.0, 'deleted_rows': 0,
+        'delete_seconds': 0.0, 'batches': 0, 'max_lock_seconds': 0.0,
+    }
+    for alias in shards.aliases():
+        with shards.using(alias):
+            shard_stats = _archive_shard(
+                directory, directory / _manifest_name(alias), year, month, batch_size, log, heartbeat
+            )
+        for field, value in shard_stats.items():
+            stats[field] = max(stats[field], value) if field == 'max_lock_seconds' else stats[field] + value
+    return stats
+
+
+def _archive_shard(directory, manifest_path, year, month, batch_size, log, heartbeat):
+    """archive_month sobre el shard activo"""
+    manifest = _load_manifest(manifest_path, year, month)
+    _write_manifest(manifest_path, manifest)
+
+    stats = {
+        'archived_rows': 0, 'archive_seconds': 0.0, 'deleted_rows': 0,
+        'delete_seconds': 0.0, 'batches': 0, 'max_lock_seconds': 0.0,
+    }
+    if manifest['completed']:
+        log(f'{year}-{month:02d}: nada pendiente')
+        return stats
+
+    month_rows = PersonalExpense.objects.filter(year=year, month=month, id__lte=manifest['snapshot_id'])
+
+    began = time.perf_counter()
+    if not manifest['archived']:
+        # Casa por casa con consultas indexadas cortas; un DISTINCT sobre todas las
+        # filas del mes sería una lectura larga que bloquea a los escritores
+        for household_id in _household_ids(batch_size):
+            if str(household_id) in manifest['households']:
+                continue
+            name, rows, first_id, last_id = _archive_household(directory, household_id, month_rows, batch_size)
+            manifest['households'][str(household_id)] = {
+                'file': name, 'rows': rows, 'first_id': first_id, 'last_id': last_id,
+            }
+            _write_manifest(manifest_path, manifest)
+            heartbeat()
+            stats['archived_rows'] += rows
+            if rows:
+                log(f'Casa {household_id}: {rows} gastos archivados')
+
+        # El borrado se limita al rango de ids efectivamente archivado
+        archived = [entry for entry in manifest['households'].values() if entry['rows']]
+        if archived:
+            manifest['min_id'] = min(entry['first_id'] for entry in archived)
+            manifest['max_id'] = max(entry['last_id'] for entry in archived)
+            manifest['deleted_up_to'] = manifest['min_id']
+        manifest['archived'] = True
+        _write_manifest(manifest_path, manifest)
+    stats['archive_seconds'] = time.perf_counter() - began
+
+    began = time.perf_counter()
+    low = manifest['deleted_up_to']
+    while low is not None and low <= manifest['max_id']:
+        high = min(low + batch_size, manifest['max_id'] + 1)
+        deleted, locked = _delete_range_with_retry(year, month, low, high)
+        stats['max_lock_seconds'] = max(stats['max_lock_seconds'], locked)
+        stats['deleted_rows'] += deleted
+        stats['batches'] += 1
+        manifest['deleted_up_to'] = low = high
+        _write_manifest(manifest_path, manifest)
+        heartbeat()
+
+    # Acumulados que quedaron vacíos
+    PersonalExpenseRollup.objects.filter(year=year, month=month, expense_count__lte=0).delete()
+    manifest['completed'] = True
+    _write_manifest(manifest_path, manifest)
+    stats['delete_seconds'] = time.perf_counter() - began
+    log(f'{year}-{month:02d}: {stats["deleted_rows"]} gastos borrados en {stats["batches"]} lotes')
+    return stats
+
+
+def _lock_timeout():
+    return getattr(settings, 'HOMI_ARCHIVE_LOCK_TIMEOUT', 600)
+
+
+def _heartbeat(owner):
+    """Renueva el JobLock cuando pasó la mitad de su vigencia"""
+    timeout = _lock_timeout()
+    renewed = time.monotonic()
+
+    def beat():
+        nonlocal renewed
+        if time.monotonic() - renewed < timeout / 2:
+            return
+        if not JobLock.refresh(JOB_LOCK, owner, timeout):
+            logger.warning('El candado del archivado venció antes de renovarlo')
+        renewed = time.monotonic()
+
+    return beat
+
+
+def _run_locked(owner, year, month, **kwargs):
+    try:
+        return archive_month(year, month, heartbeat=_heartbeat(owner), **kwargs)
+    finally:
+        JobLock.release(JOB_LOCK, owner)
+
+
+def archive_month_locked(year, month, **kwargs):
+    """archive_month con el candado entre procesos; None si ya hay un archivado en curso"""
+    owner = JobLock.acquire(JOB_LOCK, _lock_timeout())
+    if owner is None:
+        return None
+    return _run_locked(owner, year, month, **kwargs)
+
+
+def start_archive_job(year, month, **kwargs):
+    """Lanza archive_month en un hilo; devuelve False si ya hay uno en curso en cualquier proceso"""
+    owner = JobLock.acquire(JOB_LOCK, _lock_timeout())
+    if owner is None:
+        return False
+
+    def run():
+        try:
+            _run_locked(owner, year, month, **kwargs)
+        except Exception as e:
+            logger.error(f"Error archiving personal expenses {year}-{month:02d}: {e}")
+        finally:
+            connections.close_all()
+
+    threading.Thread(target=run, name=f'archive-{year}-{month:02d}', daemon=True).start()
+    return True
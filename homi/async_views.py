@@ -0,0 +1,179 @@
+"""Versiones async de los listados más pedidos para servirlos con ASGI (backend/asgi.py).
+
+Django ejecuta una vista síncrona entera en un hilo aparte, que queda ocupado
+mientras la petición espera a la base, a la caché o a otra petición idéntica
+(singleflight). Las vistas GET de views.py marcadas con async_variant tienen una
+versión async: con el servidor ASGI, AsyncViewMiddleware la usa en lugar de la
+síncrona; bajo WSGI no hace nada y los lotes (batch.py) siguen llamando a las
+vistas síncronas. Cada versión responde lo mismo que la síncrona: cuerpo,
+ETag, cabeceras y errores.
+
+Sólo el trabajo síncrono sale del event loop: la parte de DRF y de los
+decoradores (autenticación, permisos, réplica, casa y ETag) en un solo salto, y
+después las consultas. Corren en un pool de HOMI_ASYNC_VIEWS['QUERY_THREADS']
+hilos con conexiones propias, así que las consultas independientes de una
+respuesta (miembros, acumulados y gastos del mes en personal-expenses/) corren a
+la vez. Con el ORM async de Django (aget(), async for) irían una detrás de otra
+en el único hilo de la petición. Cada hilo del pool conserva sus conexiones
+entre peticiones, porque abrir una conexión SQLite con los PRAGMA del perfil
+cuesta más que las consultas de un listado. El pool recibe una copia del
+contexto, con el shard activo y el enrutamiento a réplicas.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+
+from . import shards
+from .decorators import list_etag, load_household, not_modified
+from .routers import use_replica
+from .versions import request_versions
+
+# Vista síncrona -> su versión async
+ASYNC_VIEWS = {}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _options():
+    return getattr(settings, 'HOMI_ASYNC_VIEWS', {})
+
+
+def _executor():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=_options().get('QUERY_THREADS', 4), thread_name_prefix='homi-async'
+            )
+        return _pool
+
+
+def _call(function, args):
+    try:
+        return function(*args)
+    except DatabaseError:
+        # Una conexión que falló no se reutiliza
+        connections.close_all()
+        raise
+
+
+async def run_sync(function, *args):
+    """Ejecuta function(*args) en un hilo del pool sin bloquear el event loop"""
+    return await sync_to_async(_call, thread_sensitive=False, executor=_executor())(function, args)
+
+
+def _prepare(sync_view, request, args, kwargs, collections, conditional):
+    """Lo que hacen @api_view y los decoradores de la vista síncrona antes de su cuerpo.
+
+    Devuelve (vista de DRF, petición de DRF, ETag, respuesta); si la respuesta
+    no es None (401, 400 sin casa, 304, ...) es la definitiva. Con otro
+    renderer que JSON (la API navegable) la respuesta es sync_view.
+    """
+    view = sync_view.cls(**sync_view.initkwargs)
+    view.args, view.kwargs = args, kwargs
+    request = view.initialize_request(request, *args, **kwargs)
+    view.request = request
+    view.headers = view.default_response_headers
+    etag = None
+    try:
+        view.initial(request, *args, **kwargs)
+        if not isinstance(request.accepted_renderer, JSONRenderer):
+            return view, request, None, sync_view
+        use_replica(request)
+        error = load_household(request)
+        if error is not None:
+            return view, request, None, error
+        with shards.using(request.shard.alias):
+            # La caché de respuestas las usa después sin consultar la base
+            request_versions(request, collections)
+            if conditional is not None:
+                etag = list_etag(request, collections, **conditional)
+                response = not_modified(request, etag)
+                if response is not None:
+                    return view, request, etag, response
+    except Exception as exc:
+        return view, request, etag, view.handle_exception(exc)
+    return view, request, etag, None
+
+
+def _render(view, request, response):
+    """finalize_response de DRF y el renderizado, en el event loop.
+
+    Devuelve un HttpResponse ya renderizado: con una Response de DRF Django
+    volvería a pasar a un hilo sólo para llamar a render().
+    """
+    response = view.finalize_response(request, response)
+    response.render()
+    rendered = HttpResponse(response.content, status=response.status_code, headers=response.headers)
+    if not response.has_header('Content-Type'):
+        del rendered['Content-Type']
+    return rendered
+
+
+def async_variant(sync_view, *collections, conditional=True, per_user=True, time_bucket=None, monthly=False):
+    """Registra la corrutina decorada como versión async de sync_view, una vista GET de views.py.
+
+    Hace lo mismo que @api_view, @permission_classes, @read_replica,
+    @household_required y, con conditional, @conditional_list(*collections,
+    per_user=..., time_bucket=..., monthly=...) de la vista síncrona. collections
+    son también las colecciones de su caché de respuestas. La corrutina recibe
+    la petición de DRF con la casa cargada y su shard activo, y devuelve una
+    Response.
+    """
+    options = {'per_user': per_user, 'time_bucket': time_bucket, 'monthly': monthly} if conditional else None
+
+    def decorator(body):
+        @wraps(body)
+        async def view(request, *args, **kwargs):
+            drf_view, request, etag, response = await run_sync(
+                _prepare, sync_view, request, args, kwargs, collections, options
+            )
+            if response is sync_view:
+                return await sync_to_async(sync_view)(request._request, *args, **kwargs)
+            if response is None:
+                try:
+                    with shards.using(request.shard.alias):
+                        response = await body(request, *args, **kwargs)
+                except Exception as exc:
+                    response = drf_view.handle_exception(exc)
+                if etag is not None and response.status_code == status.HTTP_200_OK:
+                    response['ETag'] = etag
+            return _render(drf_view, request, response)
+
+        ASYNC_VIEWS[sync_view] = view
+        return view
+
+    return decorator
+
+
+class AsyncViewMiddleware:
+    """Con ASGI responde los GET de las vistas con versión async; bajo WSGI no hace nada"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+            # Sin process_view en modo WSGI Django ni siquiera llama al middleware por vista
+            self.process_view = self._process_view
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    async def _process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method != 'GET' or not _options().get('ENABLED', True):
+            return None
+        view = ASYNC_VIEWS.get(view_func)
+        if view is None:
+            return None
+        return await view(request, *view_args, **view_kwargs)
@@ -0,0 +1,236 @@
+"""Autenticación por token con caché de usuario, perfil y casa actual"""
+import hashlib
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, TokenAuthentication, get_authorization_header
+from rest_framework.authtoken.models import Token
+
+from .models import UserProfile
+
+# Relaciones que se resuelven junto con el token en una sola consulta
+AUTH_SELECT_RELATED = 'user__profile__current_household__created_by'
+
+ACCESS_TOKEN_SALT = 'homi.authentication.access-token'
+
+
+class AuthContextCache:
+    """LRU en proceso (y opcionalmente una caché compartida de Django) que guarda
+    el token con su usuario, perfil y casa actual ya resueltos.
+
+    Las entradas se guardan serializadas con pickle para que cada petición reciba
+    sus propias instancias y nunca comparta objetos mutables con otra.
+    """
+
+    def __init__(self, max_entries=2048, timeout=60, cache_alias=None):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.cache_alias = cache_alias
+        self._entries = OrderedDict()  # clave -> (expira_en, user_id, household_id, payload)
+        self._keys_by_user = {}
+        self._keys_by_household = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        config = getattr(settings, 'HOMI_AUTH_CACHE', {})
+        return cls(
+            max_entries=config.get('MAX_ENTRIES', 2048),
+            timeout=config.get('TIMEOUT', 60),
+            cache_alias=config.get('CACHE_ALIAS'),
+        )
+
+    @staticmethod
+    def make_key(raw_key):
+        # Nunca usar el token en claro como clave de una caché compartida
+        return hashlib.sha256(raw_key.encode()).hexdigest()
+
+    @property
+    def shared(self):
+        return caches[self.cache_alias] if self.cache_alias else None
+
+    def get(self, raw_key):
+        key = self.make_key(raw_key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    return pickle.loads(entry[3])
+                self._discard(key)
+
+        if self.shared is not None:
+            payload = self.shared.get(f'homi:auth:{key}')
+            if payload is not None:
+                value = pickle.loads(payload)
+                self._store_local(key, value, payload)
+                return value
+        return None
+
+    def set(self, raw_key, value):
+        """Guarda un objeto (token o usuario) con sus relaciones ya cargadas"""
+        key = self.make_key(raw_key)
+        payload = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        self._store_local(key, value, payload)
+        if self.shared is not None:
+            self.shared.set(f'homi:auth:{key}', payload, self.timeout)
+
+    def _store_local(self, key, value, payload):
+        user = getattr(value, 'user', value)
+        profile = user._state.fields_cache.get('profile')
+        household_id = profile.current_household_id if profile is not None else None
+
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (time.monotonic() + self.timeout, user.pk, household_id, payload)
+            self._keys_by_user.setdefault(user.pk, set()).add(key)
+            if household_id is not None:
+                self._keys_by_household.setdefault(household_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._discard(next(iter(self._entries)))
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        _, user_id, household_id, _ = entry
+        for index, index_key in ((self._keys_by_user, user_id), (self._keys_by_household, household_id)):
+            keys = index.get(index_key)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del index[index_key]
+
+    def invalidate(self, raw_keys=(), user_ids=(), household_ids=()):
+        """Elimina las entradas de los tokens, usuarios o casas indicados"""
+        user_ids = set(user_ids)
+        household_ids = set(household_ids)
+        keys = {self.make_key(raw_key) for raw_key in raw_keys}
+
+        with self._lock:
+            for user_id in user_ids:
+                keys.update(self._keys_by_user.get(user_id, ()))
+            for household_id in household_ids:
+                keys.update(self._keys_by_household.get(household_id, ()))
+            for key in keys:
+                self._discard(key)
+
+        if self.shared is not None and (user_ids or household_ids):
+            # La caché compartida no tiene índices: resolver los tokens afectados
+            if household_ids:
+                user_ids.update(UserProfile.objects.filter(
+                    current_household_id__in=household_ids
+                ).values_list('user_id', flat=True))
+            keys.update(self.make_key(raw_key) for raw_key in Token.objects.filter(
+                user_id__in=user_ids
+            ).values_list('key', flat=True))
+            keys.update(self.make_key(f'uid:{user_id}') for user_id in user_ids)
+        if self.shared is not None and keys:
+            self.shared.delete_many([f'homi:auth:{key}' for key in keys])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+            self._keys_by_household.clear()
+
+
+auth_cache = AuthContextCache.from_settings()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication que resuelve token, usuario, perfil y casa actual en una
+    sola consulta y reutiliza el resultado entre peticiones.
+
+    En el caso común (token ya visto) la autenticación no hace ninguna consulta,
+    pero las vistas de la casa siguen haciendo una: household_required lee el
+    perfil y la casa actual con un select_related (ver más abajo). Sin la caché
+    eran una para el token y el usuario y dos perezosas para el perfil y la casa;
+    benchmarks/auth_queries mide la diferencia por ruta. La caché se invalida
+    con señales de Token, User, UserProfile y Household (ver signals.py).
+    Con varios procesos conviene configurar HOMI_AUTH_CACHE['CACHE_ALIAS'] para
+    que la invalidación llegue a todos; el LRU local sólo ve las escrituras de su
+    propio proceso y depende del TIMEOUT para el resto. Por eso el acceso a la
+    casa nunca sale de esta caché: household_required vuelve a leer el perfil y
+    la casa actual de la base (decorators.get_household_context).
+    """
+
+    def authenticate_credentials(self, key):
+        token = auth_cache.get(key)
+        if token is None:
+            try:
+                token = Token.objects.select_related(AUTH_SELECT_RELATED).get(key=key)
+            except Token.DoesNotExist:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            auth_cache.set(key, token)
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+        return (token.user, token)
+
+
+def issue_access_token(user):
+    """Emite un token de acceso firmado con HMAC que lleva sólo el usuario.
+
+    La casa actual no va en el token: cambia sin que el token se renueve, así que
+    household_required la lee de la base en cada petición.
+    """
+    return signing.dumps({'uid': user.pk}, salt=ACCESS_TOKEN_SALT)
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """Autenticación con tokens de acceso firmados y de corta duración.
+
+    Header: ``Authorization: Bearer <access_token>``. Validar la firma no toca la
+    base de datos; el usuario se resuelve con la misma caché que
+    CachedTokenAuthentication. Los tokens se renuevan con el Token de siempre
+    (ver la vista refresh_access_token) y no se pueden revocar antes de expirar,
+    por eso HOMI_ACCESS_TOKEN_LIFETIME debe ser corto.
+    """
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed('Header de token de acceso inválido')
+
+        try:
+            payload = signing.loads(
+                auth[1].decode(),
+                salt=ACCESS_TOKEN_SALT,
+                max_age=settings.HOMI_ACCESS_TOKEN_LIFETIME
+            )
+        except signing.SignatureExpired:
+            raise exceptions.AuthenticationFailed('El token de acceso ha expirado')
+        except (signing.BadSignature, UnicodeDecodeError):
+            raise exceptions.AuthenticationFailed('Token de acceso inválido')
+
+        cache_key = f"uid:{payload['uid']}"
+        user = auth_cache.get(cache_key)
+        if user is None:
+            try:
+                user = User.objects.select_related(
+                    'profile__current_household__created_by'
+                ).get(pk=payload['uid'])
+            except User.DoesNotExist:
+                raise exceptions.AuthenticationFailed('Token de acceso inválido')
+            auth_cache.set(cache_key, user)
+
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+        return (user, payload)
+
+    def authenticate_header(self, request):
+        return self.keyword
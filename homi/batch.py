@@ -0,0 +1,202 @@
+"""Varias operaciones de la API en una sola petición (batch/).
+
+Cada operación se despacha a la vista de homi.urls que le corresponde con una
+petición interna que reutiliza el usuario ya autenticado (y su perfil y casa
+actual cargados), así que la autenticación ocurre una sola vez por lote.
+
+Las operaciones se ejecutan en orden. Las lecturas (GET) consecutivas forman un
+grupo que puede ejecutarse en paralelo con hasta HOMI_BATCH['MAX_WORKERS'] hilos,
+cada uno con su propia conexión (por defecto 1: con SQLite local no compensa);
+una escritura hace de barrera, de modo que las lecturas posteriores ven sus
+cambios. Con atomic todas las operaciones corren en
+orden dentro de una transacción que se deshace si alguna falla.
+"""
+import contextvars
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.http import HttpRequest, QueryDict
+from django.urls import Resolver404, resolve
+from rest_framework import status
+
+from . import shards
+from .pagination import NEXT_CURSOR_HEADER
+
+METHODS = ('GET', 'POST', 'PUT', 'PATCH', 'DELETE')
+READ_METHODS = ('GET',)
+
+# Vistas que no pueden ir dentro de un lote
+EXCLUDED_VIEWS = ('batch_requests', 'household_events', 'metrics')
+
+# Cabeceras de las respuestas internas que se devuelven al cliente
+FORWARDED_HEADERS = ('ETag', NEXT_CURSOR_HEADER)
+
+# Cabeceras de la petición externa que no se heredan
+_BODY_META = ('CONTENT_TYPE', 'CONTENT_LENGTH', 'HTTP_IF_NONE_MATCH', 'HTTP_IF_MATCH', 'wsgi.input')
+
+
+class InvalidBatch(ValueError):
+    """Cuerpo del lote inválido"""
+
+
+def _options():
+    return getattr(settings, 'HOMI_BATCH', {})
+
+
+class Operation:
+    def __init__(self, index, item):
+        if not isinstance(item, dict):
+            raise InvalidBatch(f'La operación {index} debe ser un objeto')
+        self.id = item.get('id', index)
+        self.method = str(item.get('method', 'GET')).upper()
+        if self.method not in METHODS:
+            raise InvalidBatch(f'Método no soportado en la operación {index}')
+        path = item.get('path')
+        if not isinstance(path, str) or not path.startswith('/'):
+            raise InvalidBatch(f'La operación {index} necesita un path absoluto')
+        self.path, self.query = urlsplit(path)[2:4]
+        self.body = item.get('body')
+        self.headers = item.get('headers') or {}
+        if not isinstance(self.headers, dict):
+            raise InvalidBatch(f'headers de la operación {index} debe ser un objeto')
+
+    @property
+    def read_only(self):
+        return self.method in READ_METHODS
+
+
+def parse(data):
+    """Valida el cuerpo del lote y devuelve (operaciones, atomic)"""
+    if not isinstance(data, dict) or not isinstance(data.get('requests'), list) or not data['requests']:
+        raise InvalidBatch('requests debe ser una lista de operaciones')
+    max_requests = _options().get('MAX_REQUESTS', 20)
+    if len(data['requests']) > max_requests:
+        raise InvalidBatch(f'Un lote admite hasta {max_requests} operaciones')
+    return [Operation(index, item) for index, item in enumerate(data['requests'])], bool(data.get('atomic'))
+
+
+def _internal_request(request, operation):
+    body = b'' if operation.body is None else json.dumps(operation.body).encode()
+    internal = HttpRequest()
+    internal.method = operation.method
+    internal.path = internal.path_info = operation.path
+    internal.META = {key: value for key, value in request.META.items() if key not in _BODY_META}
+    internal.META.update({
+        'REQUEST_METHOD': operation.method,
+        'PATH_INFO': operation.path,
+        'QUERY_STRING': operation.query,
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(body)),
+    })
+    for name, value in operation.headers.items():
+        internal.META['HTTP_' + name.upper().replace('-', '_')] = str(value)
+    internal.GET = QueryDict(operation.query)
+    internal._stream = io.BytesIO(body)
+    internal._read_started = False
+    # DRF usa este usuario en lugar de volver a autenticar (ForcedAuthentication)
+    internal._force_auth_user = request.user
+    internal._force_auth_token = request.auth
+    return internal
+
+
+def _result(operation, status_code, body, response=None):
+    result = {'id': operation.id, 'status': status_code, 'body': body}
+    if response is not None:
+        headers = {name: response[name] for name in FORWARDED_HEADERS if response.has_header(name)}
+        if headers:
+            result['headers'] = headers
+    return result
+
+
+def execute(request, operation, uncommitted=False):
+    """Ejecuta una operación con su vista y devuelve su resultado.
+
+    uncommitted marca la petición interna de un lote atómico: sus lecturas ven
+    cambios que todavía pueden deshacerse (ver decorators.conditional_list).
+    """
+    try:
+        match = resolve(operation.path)
+    except Resolver404:
+        return _result(operation, status.HTTP_404_NOT_FOUND, {'error': 'Ruta no encontrada'})
+    if match.func.__module__ != 'homi.views' or match.url_name in EXCLUDED_VIEWS:
+        return _result(operation, status.HTTP_400_BAD_REQUEST, {'error': 'Esta ruta no se puede usar en un lote'})
+
+    internal = _internal_request(request, operation)
+    internal.resolver_match = match
+    internal.uncommitted = uncommitted
+    response = match.func(internal, *match.args, **match.kwargs)
+    if hasattr(response, 'data'):
+        # Respuesta de DRF sin renderizar: se reutilizan sus datos
+        body = response.data
+    else:
+        body = json.loads(response.content) if response.content else None
+    return _result(operation, response.status_code, body, response)
+
+
+def _parallel_allowed():
+    # Una base SQLite en memoria no se comparte entre conexiones de distintos hilos
+    return not (connection.vendor == 'sqlite' and connection.is_in_memory_db())
+
+
+def _execute_in_thread(request, operation):
+    try:
+        return execute(request, operation)
+    finally:
+        # La base global y la del shard de la casa
+        connections.close_all()
+
+
+def _run_reads(request, operations, results):
+    workers = min(_options().get('MAX_WORKERS', 4), len(operations))
+    if workers <= 1 or not _parallel_allowed():
+        results.extend(execute(request, operation) for operation in operations)
+        return
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='homi-batch') as executor:
+        # Cada hilo hereda el contexto de la petición (enrutamiento a réplicas y shard activo)
+        futures = [
+            executor.submit(contextvars.copy_context().run, _execute_in_thread, request, operation)
+            for operation in operations
+        ]
+        results.extend(future.result() for future in futures)
+
+
+def run(request, operations):
+    """Ejecuta el lote: lecturas consecutivas en paralelo, escrituras en orden"""
+    results = []
+    reads = []
+    for operation in operations:
+        if operation.read_only:
+            reads.append(operation)
+            continue
+        if reads:
+            _run_reads(request, reads, results)
+            reads = []
+        results.append(execute(request, operation))
+    if reads:
+        _run_reads(request, reads, results)
+    return results
+
+
+def run_atomic(request, operations):
+    """Ejecuta el lote en una transacción; devuelve (resultados, confirmado)"""
+    results = []
+    with shards.atomic():
+        for operation in operations:
+            with shards.atomic():
+                result = execute(request, operation, uncommitted=True)
+            results.append(result)
+            if result['status'] >= status.HTTP_400_BAD_REQUEST:
+                transaction.set_rollback(True, using=shards.current())
+                break
+
+    if len(results) == len(operations) and results[-1]['status'] < status.HTTP_400_BAD_REQUEST:
+        return results, True
+    results.extend(
+        _result(operation, status.HTTP_424_FAILED_DEPENDENCY, {'error': 'No se ejecutó: falló una operación anterior'})
+        for operation in operations[len(results):]
+    )
+    return results, False
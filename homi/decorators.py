@@ -0,0 +1,175 @@
+from functools import wraps
+
+from django.utils import timezone
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+from . import shards
+from .models import UserProfile
+from .routers import use_replica
+from .versions import collection_etag
+
+
+def get_household_context(request):
+    """Devuelve el perfil del usuario con su casa actual y el creador de la casa ya cargados.
+
+    El perfil y la casa se leen de la base con un único select_related aunque la
+    autenticación los traiga de su caché (CachedTokenAuthentication): esa caché
+    sólo se invalida en el proceso que escribe, y la casa actual decide el acceso
+    a la casa y member_count el reparto de los gastos. Una casa de otro shard se
+    carga aparte desde su base (shards.attach_household). Deja en request.shard
+    el Placement de la casa, o None si no tiene; las peticiones que escriben lo
+    leen del directorio en la base y no de la caché.
+    """
+    request.shard = None
+    user = request.user
+    # Una vez por petición: las operaciones de un lote comparten el usuario
+    profile = getattr(user, '_homi_profile', None)
+    if profile is None:
+        try:
+            profile = UserProfile.objects.select_related(
+                'current_household__created_by'
+            ).get(user_id=user.pk)
+        except UserProfile.DoesNotExist:
+            return None
+        profile.user = user
+        user._state.fields_cache['profile'] = profile
+        user._homi_profile = profile
+
+    if profile.current_household_id is not None:
+        request.shard = shards.attach_household(profile, fresh=request.method not in SAFE_METHODS)
+    return profile
+
+
+def household_required(view):
+    """Exige que el usuario tenga una casa actual y la adjunta a la petición.
+
+    Deja disponibles request.profile y request.household (con created_by cargado)
+    y activa el shard de la casa durante la vista.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        error = load_household(request)
+        if error is not None:
+            return error
+        with shards.using(request.shard.alias):
+            return view(request, *args, **kwargs)
+
+    return wrapper
+
+
+def load_household(request):
+    """Deja request.profile y request.household, o devuelve la respuesta de error.
+
+    Es la comprobación de household_required sin activar el shard; las vistas
+    async (async_views.py) la usan igual.
+    """
+    profile = get_household_context(request)
+    if profile is None or profile.current_household is None:
+        return Response({
+            'error': 'No tienes una casa asignada'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    if request.shard.moving and request.method not in SAFE_METHODS:
+        return household_moving_response()
+
+    request.profile = profile
+    request.household = profile.current_household
+    return None
+
+
+def household_moving_response():
+    """503 para las escrituras sobre una casa que move_household está copiando a otro shard"""
+    response = Response({
+        'error': 'La casa se está moviendo de base de datos, intenta de nuevo en unos segundos'
+    }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    response['Retry-After'] = '5'
+    return response
+
+
+def household_shard(view):
+    """Activa el shard de la casa actual durante la vista, sin exigir que haya casa.
+
+    Como household_required, rechaza con 503 las escrituras mientras la casa se
+    mueve de shard.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        get_household_context(request)
+        shard = request.shard
+        if shard is not None and shard.moving and request.method not in SAFE_METHODS:
+            return household_moving_response()
+        with shards.using(shard.alias if shard is not None else shards.current()):
+            return view(request, *args, **kwargs)
+
+    return wrapper
+
+
+def read_replica(view):
+    """Lee de una réplica salvo que el usuario haya escrito hace poco (routers.py).
+
+    Usar antes de household_required para que la casa también se lea de la réplica.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        use_replica(request)
+        return view(request, *args, **kwargs)
+
+    return wrapper
+
+
+def _weak(etag):
+    return etag[2:] if etag.startswith('W/') else etag
+
+
+def conditional_list(*collections, per_user=True, time_bucket=None, monthly=False):
+    """GET condicional para los listados de la casa (usar después de household_required).
+
+    El ETag sale de las versiones de las colecciones indicadas (versions.py); si
+    coincide con If-None-Match se responde 304 sin ejecutar la vista. per_user
+    separa el ETag por usuario cuando la respuesta depende de él, time_bucket
+    (segundos) lo renueva periódicamente para campos que dependen de la hora
+    (vencimientos) y monthly lo renueva al cambiar de mes. Dentro de un lote
+    atómico no hay ETag: las versiones aún no están confirmadas y, si el lote
+    se deshace, una escritura real volvería a alcanzarlas con otras filas.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if getattr(request, 'uncommitted', False):
+                return view(request, *args, **kwargs)
+            etag = list_etag(request, collections, per_user, time_bucket, monthly)
+            response = not_modified(request, etag)
+            if response is not None:
+                return response
+
+            response = view(request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                response['ETag'] = etag
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def list_etag(request, collections, per_user=True, time_bucket=None, monthly=False):
+    """ETag del listado con las opciones de conditional_list"""
+    now = timezone.now()
+    extra = []
+    if time_bucket:
+        extra.append(int(now.timestamp()) // time_bucket)
+    if monthly:
+        extra.append(f'{now.year}-{now.month}')
+    return collection_etag(request, collections, per_user=per_user, extra=extra)
+
+
+def not_modified(request, etag):
+    """304 si If-None-Match coincide con etag; None si hay que responder el listado"""
+    if_none_match = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+    if '*' in if_none_match or _weak(etag) in {_weak(tag) for tag in if_none_match}:
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        response['ETag'] = etag
+        return response
+    return None
@@ -0,0 +1,127 @@
+"""Eventos de cambios por casa para el endpoint SSE (events/).
+
+Las señales publican eventos livianos (tipo e id, nunca el objeto completo) al
+confirmar la transacción. El broker los reparte entre las conexiones abiertas
+de la casa en este proceso; cada conexión tiene su propia cola en su event loop.
+
+El reparto entre procesos pasa por un backend configurable en
+HOMI_EVENTS['BACKEND']. LocalBackend entrega en el mismo proceso (suficiente
+con un único worker y para pruebas). Un backend entre workers (Redis pub/sub,
+LISTEN/NOTIFY, ...) implementa publish() enviando el mensaje al canal
+compartido y, al recibirlo en cada proceso, llama a broker.dispatch().
+"""
+import asyncio
+import itertools
+import json
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from . import shards
+from django.utils.module_loading import import_string
+
+# Evento que pide al cliente recargar: se perdieron eventos por cola llena
+RESYNC = 'resync'
+
+
+def _options():
+    return getattr(settings, 'HOMI_EVENTS', {})
+
+
+class Subscription:
+    """Conexión abierta: cola acotada atada al event loop que la consume"""
+
+    def __init__(self, household_id, loop, queue_size):
+        self.household_id = household_id
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+    def deliver(self, message):
+        # Se ejecuta en el loop de la conexión
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Cliente lento: se descarta lo pendiente y se le pide recargar
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({'type': RESYNC})
+
+
+class Broker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)
+        self._ids = itertools.count(1)
+        self._backend = None
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            path = _options().get('BACKEND', 'homi.events.LocalBackend')
+            self._backend = import_string(path)(self)
+        return self._backend
+
+    def subscribe(self, household_id):
+        subscription = Subscription(
+            household_id, asyncio.get_running_loop(), _options().get('QUEUE_SIZE', 100)
+        )
+        with self._lock:
+            self._subscriptions[household_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.household_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.household_id]
+
+    def connection_count(self):
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+    def publish(self, household_id, event_type, **data):
+        self.backend.publish(household_id, {'id': next(self._ids), 'type': event_type, **data})
+
+    def dispatch(self, household_id, message):
+        """Entrega un mensaje a las conexiones de la casa en este proceso (seguro entre hilos)"""
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(household_id, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, message)
+            except RuntimeError:
+                # El loop de la conexión ya se cerró
+                self.unsubscribe(subscription)
+
+
+class LocalBackend:
+    """Reparto dentro del mismo proceso"""
+
+    def __init__(self, broker):
+        self.broker = broker
+
+    def publish(self, household_id, message):
+        self.broker.dispatch(household_id, message)
+
+
+broker = Broker()
+
+
+def publish_on_commit(household_id, event_type, **data):
+    """Publica el evento sólo si la transacción actual se confirma"""
+    shards.on_commit(lambda: broker.publish(household_id, event_type, **data))
+
+
+def format_event(message):
+    """Mensaje en formato text/event-stream"""
+    return (
+        f'id: {message.get("id", "")}\n'
+        f'event: {message["type"]}\n'
+        f'data: {json.dumps(message, separators=(",", ":"))}\n\n'
+    )
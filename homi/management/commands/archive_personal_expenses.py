@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from homi.archiving import archive_dir, archive_month_locked, previous_month
+
+
+class Command(BaseCommand):
+    help = 'Archiva en .jsonl.gz por casa y borra por lotes los gastos personales de un mes (reanudable)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--year', type=int, help='Por defecto, el del mes anterior')
+        parser.add_argument('--month', type=int, help='Por defecto, el mes anterior')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Filas por página de archivo y rango de borrado')
+        parser.add_argument('--archive-dir', help='Por defecto, settings.HOMI_ARCHIVE_DIR')
+
+    def handle(self, *args, **options):
+        year, month = previous_month()
+        year = options['year'] or year
+        month = options['month'] or month
+        if not 1 <= month <= 12:
+            raise CommandError('El mes debe estar entre 1 y 12')
+
+        stats = archive_month_locked(
+            year, month, base_dir=options['archive_dir'], batch_size=options['batch_size'],
+            log=self.stdout.write
+        )
+        if stats is None:
+            raise CommandError('Ya hay un archivado en curso')
+
+        archived_rate = stats['archived_rows'] / stats['archive_seconds'] if stats['archive_seconds'] else 0
+        deleted_rate = stats['deleted_rows'] / stats['delete_seconds'] if stats['delete_seconds'] else 0
+        self.stdout.write(f'Archivo: {archive_dir(year, month, options["archive_dir"])}')
+        self.stdout.write(f'Archivadas: {stats["archived_rows"]} filas ({archived_rate:.0f} filas/s)')
+        self.stdout.write(f'Borradas: {stats["deleted_rows"]} filas en {stats["batches"]} lotes ({deleted_rate:.0f} filas/s)')
+        self.stdout.write(self.style.SUCCESS(
+            f'Bloqueo de escritura máximo: {stats["max_lock_seconds"] * 1000:.1f} ms'
+        ))
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from homi import shards
+from homi.models import HouseholdShard
+
+
+class Command(BaseCommand):
+    help = 'Mueve una casa a otro shard en línea, o reparte las casas entre los shards con --rebalance'
+
+    def add_arguments(self, parser):
+        parser.add_argument('household_id', nargs='?', type=int)
+        parser.add_argument('shard', nargs='?', help='Alias de destino en HOMI_SHARDS["ALIASES"]')
+        parser.add_argument(
+            '--rebalance', action='store_true',
+            help='Mover casas del shard con más casas al que tiene menos hasta igualarlos'
+        )
+        parser.add_argument('--max-moves', type=int, default=10, help='Casas a mover como máximo con --rebalance')
+        parser.add_argument(
+            '--drain', type=float,
+            help='Segundos de espera a las escrituras en curso; por defecto HOMI_SHARDS["MOVE_DRAIN_SECONDS"]'
+        )
+
+    def handle(self, *args, **options):
+        if options['rebalance']:
+            try:
+                moves = shards.rebalance(options['max_moves'], drain=options['drain'], log=self.stdout.write)
+            except shards.ShardMoveError as e:
+                raise CommandError(str(e))
+            counts = dict(HouseholdShard.objects.values_list('shard').annotate(total=Count('*')).order_by())
+            summary = ', '.join(f'{alias}: {counts.get(alias, 0)}' for alias in shards.aliases())
+            self.stdout.write(self.style.SUCCESS(f'{len(moves)} casas movidas. Casas por shard: {summary}'))
+            return
+
+        if options['household_id'] is None or not options['shard']:
+            raise CommandError('Indica la casa y el shard de destino, o usa --rebalance')
+        try:
+            copied = shards.move_household(
+                options['household_id'], options['shard'], drain=options['drain'], log=self.stdout.write
+            )
+        except shards.ShardMoveError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f'Casa {options["household_id"]} movida a {options["shard"]} ({copied} filas)'
+        ))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from homi import shards
+from homi.models import HouseholdChange
+from homi.sync import retention
+
+
+class Command(BaseCommand):
+    help = 'Borra por lotes los cambios del registro de sincronización más antiguos que HOMI_SYNC["RETENTION_DAYS"]'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help='Cambios por transacción de borrado')
+
+    def handle(self, *args, **options):
+        # La retención no es configurable aquí: sync/ la usa para decidir qué
+        # cursores necesitan reset, y ambos deben coincidir
+        cutoff = timezone.now() - retention()
+        deleted = 0
+        for alias in shards.aliases():
+            with shards.using(alias):
+                while True:
+                    # Los ids crecen con el tiempo: los más antiguos están al principio
+                    ids = list(
+                        HouseholdChange.objects.filter(created_at__lt=cutoff)
+                        .order_by('id').values_list('id', flat=True)[:options['batch_size']]
+                    )
+                    if not ids:
+                        break
+                    deleted += HouseholdChange.objects.filter(id__in=ids).delete()[0]
+        self.stdout.write(self.style.SUCCESS(f'{deleted} cambios anteriores a {cutoff:%Y-%m-%d} borrados'))
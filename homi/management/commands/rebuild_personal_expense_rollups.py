@@ -0,0 +1,59 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Count, Sum
+
+from homi import shards
+from homi.models import Household, PersonalExpense, PersonalExpenseRollup
+
+
+def rebuild_chunk(alias, household_ids):
+    """Recalcula los acumulados de un bloque de casas del shard alias en una sola transacción"""
+    try:
+        with shards.using(alias), shards.atomic():
+            # Borrar primero: la primera sentencia escribe y toma el bloqueo de escritura
+            PersonalExpenseRollup.objects.filter(household_id__in=household_ids).delete()
+            totals = (
+                PersonalExpense.objects.filter(household_id__in=household_ids)
+                .values('household_id', 'user_id', 'year', 'month')
+                .annotate(total=Sum('cost'), expense_count=Count('id'))
+                .order_by()
+            )
+            rollups = PersonalExpenseRollup.objects.bulk_create(
+                [PersonalExpenseRollup(**row) for row in totals],
+                batch_size=500
+            )
+        return len(rollups)
+    finally:
+        connections[alias].close()
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los acumulados mensuales de gastos personales desde las filas, en bloques paralelos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=200, help='Casas por bloque')
+        parser.add_argument('--workers', type=int, default=4)
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        chunks = []
+        households = 0
+        for alias in shards.aliases():
+            household_ids = list(Household.objects.using(alias).order_by('pk').values_list('pk', flat=True))
+            households += len(household_ids)
+            chunks.extend(
+                (alias, household_ids[start:start + chunk_size]) for start in range(0, len(household_ids), chunk_size)
+            )
+
+        rebuilt = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            futures = [executor.submit(rebuild_chunk, alias, chunk) for alias, chunk in chunks]
+            for done, future in enumerate(as_completed(futures), 1):
+                rebuilt += future.result()
+                self.stdout.write(f'Bloque {done}/{len(chunks)} listo')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{households} casas procesadas, {rebuilt} acumulados recalculados'
+        ))
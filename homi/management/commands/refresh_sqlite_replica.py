@@ -0,0 +1,43 @@
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+def copy_database(source, target, timeout=30):
+    """Copia en línea la base SQLite source sobre target con la API de backup"""
+    origin = sqlite3.connect(source, timeout=timeout)
+    copy = sqlite3.connect(target, timeout=timeout)
+    try:
+        origin.backup(copy)
+    finally:
+        copy.close()
+        origin.close()
+
+
+class Command(BaseCommand):
+    help = 'Copia la base SQLite primaria sobre una réplica de lectura para probar homi.routers en local'
+
+    def add_arguments(self, parser):
+        parser.add_argument('alias', help='Alias de la réplica en DATABASES')
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Repetir cada tantos segundos (simula el retraso de la replicación)'
+        )
+
+    def handle(self, *args, **options):
+        alias = options['alias']
+        if alias == DEFAULT_DB_ALIAS or alias not in connections.databases:
+            raise CommandError(f'"{alias}" no es una réplica definida en DATABASES')
+        source = connections[DEFAULT_DB_ALIAS].settings_dict
+        target = connections[alias].settings_dict
+        if connections[DEFAULT_DB_ALIAS].vendor != 'sqlite' or connections[alias].vendor != 'sqlite':
+            raise CommandError('Este comando sólo copia entre bases SQLite')
+
+        while True:
+            copy_database(str(source['NAME']), str(target['NAME']))
+            self.stdout.write(f'{alias} actualizada desde {source["NAME"]}')
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from homi import shards
+from homi.models import Household
+
+
+class Command(BaseCommand):
+    help = 'Verifica Household.member_count contra la tabla de miembros y repara las diferencias en lote'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Sólo informar, sin guardar cambios')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        checked = repaired = 0
+
+        for alias in shards.aliases():
+            last_pk = 0
+            with shards.using(alias):
+                while True:
+                    batch = list(
+                        Household.objects.filter(pk__gt=last_pk)
+                        .annotate(actual=Count('members'))
+                        .order_by('pk')
+                        .values_list('pk', 'member_count', 'actual')[:batch_size]
+                    )
+                    if not batch:
+                        break
+                    last_pk = batch[-1][0]
+                    checked += len(batch)
+
+                    wrong = [Household(pk=pk, member_count=actual) for pk, stored, actual in batch if stored != actual]
+                    for household in wrong:
+                        self.stdout.write(f'Casa {household.pk}: member_count -> {household.member_count}')
+                    if wrong and not options['dry_run']:
+                        with shards.atomic():
+                            Household.objects.bulk_update(wrong, ['member_count'])
+                    repaired += len(wrong)
+
+        action = 'con diferencias' if options['dry_run'] else 'reparadas'
+        self.stdout.write(self.style.SUCCESS(f'{checked} casas verificadas, {repaired} {action}'))
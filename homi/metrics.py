@@ -0,0 +1,271 @@
+"""Métricas por vista en formato de texto de Prometheus (metrics/).
+
+Con HOMI_METRICS['ENABLED'], MetricsMiddleware mide cada petición y la anota
+con el nombre de su URL en homi/urls.py (las demás rutas cuentan como 'other'):
+peticiones, histograma de latencia, consultas SQL y su tiempo, y bytes de la
+respuesta. Las consultas las mide record_query, un envoltorio de ejecución que
+signals.py agrega a cada conexión nueva; cada duración se anota en la lista de
+la petición en curso, que viaja en una ContextVar hasta los hilos de
+sync_to_async, del pool de las vistas async y de los lotes.
+
+Los acumulados no usan candados: cada hilo que termina peticiones escribe sólo
+en los suyos (los hilos del worker WSGI, el del event loop con ASGI) y metrics/
+los suma al leerlos. Una lectura simultánea puede ver una petición a medio
+anotar, pero ninguna se pierde. Los acumulados son del proceso: con varios
+workers cada lectura ve sólo el que responde. Apagado, el middleware sólo
+consulta el ajuste y las conexiones nuevas no llevan el envoltorio.
+"""
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from . import response_cache, routers, singleflight
+from .sqlite.base import counters as sqlite_counters
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Límites superiores (segundos) de los buckets del histograma de latencia
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Etiqueta de las rutas que no son de homi/urls.py
+OTHER_VIEW = 'other'
+
+# Duraciones de las consultas de la petición en curso
+_queries = ContextVar('homi_metrics_queries', default=None)
+
+
+def _options():
+    return getattr(settings, 'HOMI_METRICS', {})
+
+
+def enabled():
+    return _options().get('ENABLED', False)
+
+
+class Series:
+    """Acumulados de una vista"""
+
+    __slots__ = ('bounds', 'buckets', 'requests', 'seconds', 'queries', 'query_seconds', 'response_bytes')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        # Un bucket por límite y el último para +Inf, sin acumular
+        self.buckets = [0] * (len(bounds) + 1)
+        self.requests = 0
+        self.seconds = 0.0
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.response_bytes = 0
+
+    def observe(self, seconds, query_durations, response_bytes):
+        self.buckets[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.requests += 1
+        self.seconds += seconds
+        self.queries += len(query_durations)
+        self.query_seconds += sum(query_durations)
+        self.response_bytes += response_bytes
+
+    def add(self, other):
+        for index, count in enumerate(other.buckets):
+            self.buckets[index] += count
+        self.requests += other.requests
+        self.seconds += other.seconds
+        self.queries += other.queries
+        self.query_seconds += other.query_seconds
+        self.response_bytes += other.response_bytes
+
+
+class Registry:
+    """Series por hilo y vista; sólo se suman al leerlas"""
+
+    def __init__(self):
+        self.reset()
+
+    def series(self, view):
+        per_thread = getattr(self._local, 'series', None)
+        if per_thread is None:
+            per_thread = self._local.series = {}
+            # list.append es atómico: no hace falta candado para registrar el hilo
+            self._threads.append(per_thread)
+        series = per_thread.get(view)
+        if series is None:
+            series = per_thread[view] = Series(tuple(_options().get('BUCKETS', DEFAULT_BUCKETS)))
+        return series
+
+    def snapshot(self):
+        """Vista -> Series con la suma de todos los hilos"""
+        totals = {}
+        for per_thread in list(self._threads):
+            for view, series in list(per_thread.items()):
+                if view not in totals:
+                    totals[view] = Series(series.bounds)
+                totals[view].add(series)
+        return totals
+
+    def reset(self):
+        self._local = threading.local()
+        self._threads = []
+
+
+registry = Registry()
+
+
+def stats():
+    return {
+        view: {
+            'requests': series.requests,
+            'seconds': series.seconds,
+            'queries': series.queries,
+            'query_seconds': series.query_seconds,
+            'response_bytes': series.response_bytes,
+        }
+        for view, series in registry.snapshot().items()
+    }
+
+
+def record_query(execute, sql, params, many, context):
+    """Envoltorio de ejecución: anota la duración de la consulta en la petición en curso"""
+    queries = _queries.get()
+    if queries is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        queries.append(time.perf_counter() - started)
+
+
+def install(connection):
+    """Agrega record_query a una conexión nueva si las métricas están activadas"""
+    if enabled() and record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None or match.func.__module__ != 'homi.views':
+        return OTHER_VIEW
+    return match.url_name
+
+
+def _response_bytes(response):
+    if response.streaming:
+        return 0
+    # CommonMiddleware ya calculó Content-Length
+    length = response.get('Content-Length')
+    return int(length) if length else len(response.content)
+
+
+def _observe(request, response, seconds, queries):
+    registry.series(_view_name(request)).observe(seconds, queries, _response_bytes(response))
+
+
+class MetricsMiddleware:
+    """Mide cada petición para metrics/ (va primero en MIDDLEWARE para medirla entera)"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not enabled():
+            return self.get_response(request)
+        queries = []
+        token = _queries.set(queries)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _queries.reset(token)
+        _observe(request, response, time.perf_counter() - started, queries)
+        return response
+
+    async def __acall__(self, request):
+        if not enabled():
+            return await self.get_response(request)
+        queries = []
+        token = _queries.set(queries)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _queries.reset(token)
+        _observe(request, response, time.perf_counter() - started, queries)
+        return response
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Exposition:
+    """Texto de Prometheus: cada familia con su HELP y su TYPE antes de las muestras"""
+
+    def __init__(self):
+        self.lines = []
+
+    def family(self, name, kind, help_text):
+        self.lines.append(f'# HELP {name} {help_text}')
+        self.lines.append(f'# TYPE {name} {kind}')
+
+    def sample(self, name, labels, value):
+        rendered = ','.join(f'{label}="{_escape(label_value)}"' for label, label_value in labels.items())
+        self.lines.append(f'{name}{{{rendered}}} {_number(value)}')
+
+    def counters(self, name, help_text, label, values):
+        self.family(name, 'counter', help_text)
+        for key, value in sorted(values.items()):
+            self.sample(name, {label: key}, value)
+
+    def text(self):
+        return '\n'.join(self.lines) + '\n'
+
+
+def render():
+    """Métricas del proceso en formato de texto de Prometheus 0.0.4"""
+    views = sorted(registry.snapshot().items())
+    out = _Exposition()
+
+    out.counters('homi_http_requests_total', 'Peticiones atendidas por vista', 'view',
+                 {view: series.requests for view, series in views})
+    out.family('homi_http_request_duration_seconds', 'histogram', 'Latencia de las peticiones por vista')
+    for view, series in views:
+        cumulative = 0
+        for bound, count in zip((*series.bounds, '+Inf'), series.buckets):
+            cumulative += count
+            out.sample('homi_http_request_duration_seconds_bucket', {'view': view, 'le': bound}, cumulative)
+        out.sample('homi_http_request_duration_seconds_sum', {'view': view}, series.seconds)
+        out.sample('homi_http_request_duration_seconds_count', {'view': view}, series.requests)
+    out.counters('homi_db_queries_total', 'Consultas SQL por vista', 'view',
+                 {view: series.queries for view, series in views})
+    out.counters('homi_db_query_seconds_total', 'Tiempo en consultas SQL por vista', 'view',
+                 {view: series.query_seconds for view, series in views})
+    out.counters('homi_http_response_bytes_total', 'Bytes de las respuestas por vista', 'view',
+                 {view: series.response_bytes for view, series in views})
+
+    # Contadores del proceso de los demás módulos
+    cache = response_cache.counters.snapshot()
+    out.counters('homi_response_cache_events_total', 'Caché de respuestas: aciertos, fallos y esperas', 'event', cache)
+    out.counters('homi_singleflight_calls_total', 'Lecturas agrupadas: quien calcula y quien espera', 'role',
+                 singleflight.flights.stats())
+    route = routers.counters.snapshot()
+    out.counters('homi_db_reads_total', 'Lecturas enrutadas por base', 'database', route['reads'])
+    out.counters('homi_replica_requests_total', 'Peticiones GET enviadas a réplica o fijadas al primario',
+                 'target', route['requests'])
+    out.counters('homi_sqlite_lock_events_total', 'Reintentos y esperas por el candado de SQLite', 'event',
+                 sqlite_counters.snapshot())
+    return out.text()
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:08
+
+from django.db import migrations, models
+
+
+def create_sequence(apps, schema_editor):
+    HouseholdCodeSequence = apps.get_model('homi', 'HouseholdCodeSequence')
+    HouseholdCodeSequence.objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('homi', '0005_personalexpense'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HouseholdCodeSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_sequence, migrations.RunPython.noop),
+    ]
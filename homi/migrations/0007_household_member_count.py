@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:10
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_member_count(apps, schema_editor):
+    Household = apps.get_model('homi', 'Household')
+    households = Household.objects.annotate(total=Count('members'))
+    Household.objects.bulk_update(
+        [Household(pk=household.pk, member_count=household.total) for household in households],
+        ['member_count'],
+        batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('homi', '0006_householdcodesequence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='household',
+            name='member_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_member_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_rollups(apps, schema_editor):
+    PersonalExpense = apps.get_model('homi', 'PersonalExpense')
+    PersonalExpenseRollup = apps.get_model('homi', 'PersonalExpenseRollup')
+    totals = (
+        PersonalExpense.objects.values('household_id', 'user_id', 'year', 'month')
+        .annotate(total=Sum('cost'), expense_count=Count('id'))
+        .order_by()
+    )
+    PersonalExpenseRollup.objects.bulk_create(
+        [PersonalExpenseRollup(**row) for row in totals],
+        batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('homi', '0007_household_member_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PersonalExpenseRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.IntegerField()),
+                ('month', models.IntegerField()),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('expense_count', models.IntegerField(default=0)),
+                ('household', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='personal_expense_rollups', to='homi.household')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='personal_expense_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('household', 'user', 'year', 'month')},
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('homi', '0008_personalexpenserollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['household', '-created_at', '-id'], name='homi_expens_househo_2999dc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='news',
+            index=models.Index(fields=['household', '-created_at', '-id'], name='homi_news_househo_56a899_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='personalexpense',
+            index=models.Index(fields=['household', 'year', 'month', '-created_at', '-id'], name='homi_person_househo_1c828e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['household', 'is_completed', 'due_datetime', '-created_at', '-id'], name='homi_task_househo_923d50_idx'),
+        ),
+    ]
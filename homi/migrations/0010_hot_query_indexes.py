@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:07
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('homi', '0009_cursor_pagination_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='task',
+            name='homi_task_househo_923d50_idx',
+        ),
+        migrations.AddIndex(
+            model_name='expensepayment',
+            index=models.Index(fields=['expense', '-payment_date'], name='homi_expens_expense_deb339_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='personalexpenserollup',
+            index=models.Index(fields=['year', 'month'], name='homi_person_year_bd3a2b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('is_completed', False)), fields=['household', 'due_datetime', '-created_at', '-id'], name='homi_task_pending_idx'),
+        ),
+    ]
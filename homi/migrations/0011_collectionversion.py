@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('homi', '0010_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CollectionVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('collection', models.CharField(choices=[('news', 'Noticias'), ('tasks', 'Tareas'), ('expenses', 'Gastos'), ('personal_expenses', 'Gastos personales'), ('members', 'Miembros')], max_length=20)),
+                ('version', models.BigIntegerField(default=0)),
+                ('household', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='collection_versions', to='homi.household')),
+            ],
+            options={
+                'unique_together': {('household', 'collection')},
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations
+
+
+def backfill_versions(apps, schema_editor):
+    # Las casas existentes necesitan su fila de versión: un borrado sólo
+    # incrementa filas existentes y nunca las crea
+    Household = apps.get_model('homi', 'Household')
+    CollectionVersion = apps.get_model('homi', 'CollectionVersion')
+    collections = ['news', 'tasks', 'expenses', 'personal_expenses', 'members']
+    CollectionVersion.objects.bulk_create(
+        [
+            CollectionVersion(household_id=household_id, collection=collection, version=1)
+            for household_id in Household.objects.values_list('pk', flat=True)
+            for collection in collections
+        ],
+        batch_size=500,
+        ignore_conflicts=True
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('homi', '0011_collectionversion'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_versions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('homi', '0012_backfill_collection_versions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HouseholdChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity', models.CharField(choices=[('news', 'Noticias'), ('tasks', 'Tareas'), ('expenses', 'Gastos'), ('personal_expenses', 'Gastos personales'), ('members', 'Miembros')], max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('operation', models.CharField(choices=[('upsert', 'Creado o modificado'), ('delete', 'Eliminado')], max_length=6)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('household', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='changes', to='homi.household')),
+            ],
+        ),
+    ]
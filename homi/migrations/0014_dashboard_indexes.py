@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('homi', '0013_householdchange'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['household', 'remaining_amount'], name='homi_expens_househo_ee06f1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='news',
+            index=models.Index(fields=['household', 'priority', 'expiry_date'], name='homi_news_househo_9312f1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('is_completed', False)), fields=['assigned_to', 'household', 'due_datetime', '-created_at', '-id'], name='homi_task_assigned_pending_idx'),
+        ),
+    ]
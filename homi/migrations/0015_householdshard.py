@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('homi', '0014_dashboard_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HouseholdShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.CharField(db_index=True, max_length=100)),
+                ('code', models.CharField(max_length=6, unique=True)),
+                ('moving', models.BooleanField(default=False)),
+                ('moved_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='userprofile',
+            name='current_household',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to='homi.household'),
+        ),
+    ]
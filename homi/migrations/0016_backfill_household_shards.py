@@ -0,0 +1,35 @@
+from django.core.management.color import no_style
+from django.db import migrations
+
+
+def backfill_directory(apps, schema_editor):
+    # Las casas existentes viven en 'default'; el directorio también reserva sus
+    # ids y códigos para las casas nuevas de otros shards
+    db_alias = schema_editor.connection.alias
+    if db_alias != 'default':
+        return
+    Household = apps.get_model('homi', 'Household')
+    HouseholdShard = apps.get_model('homi', 'HouseholdShard')
+    HouseholdShard.objects.using(db_alias).bulk_create(
+        [
+            HouseholdShard(pk=household_id, shard='default', code=code)
+            for household_id, code in Household.objects.using(db_alias).values_list('pk', 'code')
+        ],
+        batch_size=500,
+        ignore_conflicts=True
+    )
+    # Con ids explícitos la secuencia del directorio debe seguir al mayor
+    with schema_editor.connection.cursor() as cursor:
+        for statement in schema_editor.connection.ops.sequence_reset_sql(no_style(), [HouseholdShard]):
+            cursor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('homi', '0015_householdshard'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_directory, migrations.RunPython.noop),
+    ]
@@ -1,12 +1,16 @@
-from django.db import models
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, models, router, transaction
 from django.contrib.auth.models import User
+from django.db.models import Count, DecimalField, Exists, F, Max, OuterRef, Prefetch, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Round
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from rest_framework.authtoken.models import Token
 from django.utils import timezone
-from datetime import datetime
-import random
-import string
+from datetime import datetime, timedelta
+from decimal import Decimal
+import uuid
+from . import shards
+from .codes import code_for
 
 # Señal para crear token automáticamente
 @receiver(post_save, sender=User)
@@ -14,22 +18,202 @@ def create_auth_token(sender, instance=None, created=False, **kwargs):
     if created:
         Token.objects.create(user=instance)
 
+# Contador monótono para asignar códigos de casa (ver codes.py)
+class HouseholdCodeSequence(models.Model):
+    value = models.BigIntegerField(default=0)
+    
+    @classmethod
+    def next_value(cls):
+        """Incrementa el contador de forma atómica y devuelve el nuevo valor"""
+        with transaction.atomic():
+            if not cls.objects.filter(pk=1).update(value=F('value') + 1):
+                cls.objects.get_or_create(pk=1)
+                cls.objects.filter(pk=1).update(value=F('value') + 1)
+            return cls.objects.values_list('value', flat=True).get(pk=1)
+
+# Directorio de shards (shards.py): en qué base vive cada casa. Vive en la base
+# global, asigna los ids de casa (únicos entre todas las bases) y resuelve los
+# códigos de invitación
+class HouseholdShard(models.Model):
+    shard = models.CharField(max_length=100, db_index=True)
+    code = models.CharField(max_length=6, unique=True)
+    # Mientras move_household copia la casa a otra base sólo acepta lecturas
+    moving = models.BooleanField(default=False)
+    moved_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"{self.pk} ({self.code}) -> {self.shard}"
+    
+    @classmethod
+    def allocate(cls, shard, code=''):
+        """Reserva el id y el código de una casa nueva que se guardará en shard"""
+        while True:
+            # Código único de 6 caracteres sin consultas de existencia
+            candidate = code or code_for(HouseholdCodeSequence.next_value())
+            try:
+                with transaction.atomic(using=DEFAULT_DB_ALIAS):
+                    return cls.objects.using(DEFAULT_DB_ALIAS).create(shard=shard, code=candidate)
+            except IntegrityError:
+                # Sólo puede chocar con un código aleatorio anterior al contador
+                if code or not cls.objects.using(DEFAULT_DB_ALIAS).filter(code=candidate).exists():
+                    raise
+
+# Secuencias globales de ids (shards.py): las filas que los clientes guardan por
+# id (noticias, gastos, pagos, tareas y gastos personales) reciben ids únicos
+# entre todas las bases, así que mover una casa de shard no los cambia
+class ShardIdSequence(models.Model):
+    table = models.CharField(max_length=100, primary_key=True)
+    value = models.BigIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.table}: {self.value}"
+    
+    @classmethod
+    def reserve(cls, model, size):
+        """Avanza la secuencia de model en size ids y devuelve el último reservado"""
+        table = model._meta.db_table
+        sequences = cls.objects.using(DEFAULT_DB_ALIAS)
+        with transaction.atomic(using=DEFAULT_DB_ALIAS):
+            if not sequences.filter(table=table).update(value=F('value') + size):
+                # Primera reserva: después de las filas que ya existen en cualquier shard
+                existing = max(
+                    model.objects.using(alias).aggregate(last=Max('pk'))['last'] or 0
+                    for alias in shards.aliases()
+                )
+                sequences.get_or_create(table=table, defaults={'value': existing})
+                sequences.filter(table=table).update(value=F('value') + size)
+            return sequences.values_list('value', flat=True).get(table=table)
+
+# Candados de trabajos en segundo plano compartidos por todos los procesos
+# (archiving.py). Viven en la base global y vencen: si el dueño se cae sin
+# liberarlo, otro lo puede tomar cuando pasa expires_at
+class JobLock(models.Model):
+    name = models.CharField(max_length=100, primary_key=True)
+    owner = models.CharField(max_length=32)
+    expires_at = models.DateTimeField()
+    
+    def __str__(self):
+        return f"{self.name} ({self.owner}) hasta {self.expires_at}"
+    
+    @classmethod
+    def acquire(cls, name, timeout):
+        """Toma el candado por timeout segundos; devuelve el dueño o None si otro lo tiene"""
+        owner = uuid.uuid4().hex
+        now = timezone.now()
+        locks = cls.objects.using(DEFAULT_DB_ALIAS)
+        with transaction.atomic(using=DEFAULT_DB_ALIAS):
+            locks.filter(name=name, expires_at__lte=now).delete()
+            try:
+                with transaction.atomic(using=DEFAULT_DB_ALIAS):
+                    locks.create(name=name, owner=owner, expires_at=now + timedelta(seconds=timeout))
+            except IntegrityError:
+                return None
+        return owner
+    
+    @classmethod
+    def refresh(cls, name, owner, timeout):
+        """Extiende el candado del dueño; False si ya no lo tiene"""
+        return bool(cls.objects.using(DEFAULT_DB_ALIAS).filter(name=name, owner=owner).update(
+            expires_at=timezone.now() + timedelta(seconds=timeout)
+        ))
+    
+    @classmethod
+    def release(cls, name, owner):
+        cls.objects.using(DEFAULT_DB_ALIAS).filter(name=name, owner=owner).delete()
+
+class ShardedIdQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        missing = [obj for obj in objs if obj.pk is None]
+        for obj, pk in zip(missing, shards.allocate_ids(self.model, len(missing))):
+            obj.pk = pk
+        return super().bulk_create(objs, *args, **kwargs)
+
+# Base de los modelos con ids globales (ShardIdSequence), también en bulk_create
+class ShardedIdModel(models.Model):
+    objects = ShardedIdQuerySet.as_manager()
+    
+    class Meta:
+        abstract = True
+    
+    def save(self, *args, **kwargs):
+        if self.pk is None:
+            self.pk = shards.allocate_ids(type(self), 1)[0]
+            if self.pk is not None:
+                kwargs['force_insert'] = True
+        super().save(*args, **kwargs)
+
 # Modelo para las casas/hogares
 class Household(models.Model):
     name = models.CharField(max_length=100)
     code = models.CharField(max_length=6, unique=True, blank=True)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='created_households')
     members = models.ManyToManyField(User, related_name='households')
+    # Contador desnormalizado de miembros, mantenido por la señal m2m_changed
+    member_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    @classmethod
+    def recount_members(cls, household_ids):
+        """Recalcula member_count de las casas indicadas en una sola sentencia"""
+        memberships = cls.members.through.objects.filter(
+            household_id=OuterRef('pk')
+        ).values('household_id').annotate(total=Count('*')).values('total')
+        cls.objects.filter(pk__in=household_ids).update(
+            member_count=Coalesce(Subquery(memberships), 0)
+        )
+    
+    @classmethod
+    def get_dashboard(cls, household_id, user, now=None):
+        """Casa con los contadores de la pantalla de inicio del usuario en una sola consulta.
+        
+        Cada contador es una subconsulta escalar indexada, así que el costo no
+        depende del historial de la casa (noticias vencidas, tareas completadas,
+        gastos ya pagados o meses anteriores).
+        """
+        now = now or timezone.now()
+        
+        def count(queryset):
+            grouped = queryset.order_by().values('household_id').annotate(total=Count('*')).values('total')
+            return Coalesce(Subquery(grouped), 0)
+        
+        pending_tasks = Task.objects.filter(household_id=OuterRef('pk'), assigned_to=user, is_completed=False)
+        owed = Expense.objects.filter(household_id=OuterRef('pk'), remaining_amount__gt=0).exclude(
+            Exists(ExpensePayment.objects.filter(expense_id=OuterRef('pk'), user=user))
+        )
+        # SQLite guarda unit_cost sin redondear: se suma lo que muestran los listados
+        owed_total = owed.order_by().values('household_id').annotate(
+            total=Sum(Round('unit_cost', 2))
+        ).values('total')
+        rollup = PersonalExpenseRollup.objects.filter(
+            household_id=OuterRef('pk'), user=user, year=now.year, month=now.month
+        )
+        
+        return cls.objects.filter(pk=household_id).select_related('created_by').annotate(
+            urgent_news_count=count(News.objects.filter(
+                household_id=OuterRef('pk'), priority='urgent', expiry_date__gt=now
+            )),
+            open_task_count=count(pending_tasks),
+            overdue_task_count=count(pending_tasks.filter(due_datetime__lt=now)),
+            owed_expense_count=count(owed),
+            owed_total=Coalesce(
+                Subquery(owed_total), Value(Decimal('0')), output_field=DecimalField(max_digits=12, decimal_places=2)
+            ),
+            month_total=Coalesce(
+                Subquery(rollup.values('total')[:1]), Value(Decimal('0')),
+                output_field=DecimalField(max_digits=12, decimal_places=2)
+            ),
+            month_expense_count=Coalesce(Subquery(rollup.values('expense_count')[:1]), 0),
+        ).first()
+    
     def save(self, *args, **kwargs):
-        if not self.code:
-            # Generar código único de 6 caracteres
-            while True:
-                code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
-                if not Household.objects.filter(code=code).exists():
-                    self.code = code
-                    break
+        if self.pk is None:
+            # Id y código los asigna el directorio de shards; la casa se guarda
+            # en la base activa (ver shards.py)
+            using = kwargs.get('using') or router.db_for_write(Household, instance=self)
+            entry = HouseholdShard.allocate(using, self.code)
+            self.pk, self.code = entry.pk, entry.code
+            kwargs['force_insert'] = True
         super().save(*args, **kwargs)
     
     def delete(self, *args, **kwargs):
@@ -38,7 +222,7 @@ class Household(models.Model):
         for member in self.members.all():
             try:
                 profile = member.profile
-                if profile.current_household == self:
+                if profile.current_household_id == self.pk:
                     profile.current_household = None
                     profile.save()
             except:
@@ -53,7 +237,10 @@ class Household(models.Model):
 # Modelo para el perfil de usuario
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
-    current_household = models.ForeignKey(Household, on_delete=models.SET_NULL, null=True, blank=True)
+    # Sin restricción de clave foránea: la casa puede vivir en otro shard
+    current_household = models.ForeignKey(
+        Household, on_delete=models.SET_NULL, null=True, blank=True, db_constraint=False
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
@@ -66,7 +253,7 @@ def create_user_profile(sender, instance, created, **kwargs):
         UserProfile.objects.create(user=instance)
 
 # Modelo para las noticias
-class News(models.Model):
+class News(ShardedIdModel):
     PRIORITY_CHOICES = [
         ('urgent', 'Urgente'),
         ('normal', 'Normal'),
@@ -85,6 +272,12 @@ class News(models.Model):
     class Meta:
         ordering = ['-created_at']
         verbose_name_plural = 'News'
+        indexes = [
+            # Paginación por cursor del listado de la casa
+            models.Index(fields=['household', '-created_at', '-id']),
+            # Noticias vigentes por prioridad (dashboard/) sin recorrer las vencidas
+            models.Index(fields=['household', 'priority', 'expiry_date']),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.household.name}"
@@ -95,7 +288,7 @@ class News(models.Model):
 
 
 # Modelo para los gastos compartidos
-class Expense(models.Model):
+class Expense(ShardedIdModel):
     EXPENSE_TYPE_CHOICES = [
         ('unique', 'Gasto Único'),
         ('permanent', 'Gasto Permanente'),
@@ -114,6 +307,12 @@ class Expense(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Paginación por cursor del listado de la casa
+            models.Index(fields=['household', '-created_at', '-id']),
+            # Gastos con saldo pendiente (dashboard/) sin recorrer los ya pagados
+            models.Index(fields=['household', 'remaining_amount']),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.household.name}"
@@ -121,7 +320,7 @@ class Expense(models.Model):
     def save(self, *args, **kwargs):
         # Calcular costo unitario y monto restante automáticamente
         if self.household:
-            members_count = self.household.members.count()
+            members_count = self.household.member_count
             if members_count > 0:
                 self.unit_cost = self.total_cost / members_count
                 # Si es un gasto nuevo, el monto restante es el total
@@ -131,9 +330,27 @@ class Expense(models.Model):
     
     def is_fully_paid(self):
         return self.remaining_amount <= 0
+    
+    @classmethod
+    def get_household_expenses(cls, household, user=None):
+        """Gastos de una casa con pagos, usuarios y estado de pago del usuario ya cargados.
+        
+        El número de consultas es constante sin importar cuántos gastos haya. Sin
+        user no se anota user_has_paid (contenido compartido de la caché de respuestas).
+        """
+        expenses = cls.objects.filter(household=household).select_related(
+            'created_by', 'household'
+        ).prefetch_related(
+            Prefetch('payments', queryset=ExpensePayment.objects.select_related('user').order_by('expense_id', '-payment_date'))
+        )
+        if user is None:
+            return expenses
+        return expenses.annotate(
+            user_has_paid=Exists(ExpensePayment.objects.filter(expense=OuterRef('pk'), user=user))
+        )
 
 # Modelo para el registro de pagos
-class ExpensePayment(models.Model):
+class ExpensePayment(ShardedIdModel):
     expense = models.ForeignKey(Expense, on_delete=models.CASCADE, related_name='payments')
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='expense_payments')
     amount_paid = models.DecimalField(max_digits=10, decimal_places=2)
@@ -142,12 +359,16 @@ class ExpensePayment(models.Model):
     class Meta:
         unique_together = ['expense', 'user']  
         ordering = ['-payment_date']
+        indexes = [
+            # Pagos precargados por gasto (expense_id IN (...)) ya ordenados
+            models.Index(fields=['expense', '-payment_date']),
+        ]
     
     def __str__(self):
         return f"{self.user.username} pagó {self.amount_paid} para {self.expense.title}"
 
 # Modelo para las tareas del hogar
-class Task(models.Model):
+class Task(ShardedIdModel):
     PRIORITY_CHOICES = [
         ('low', 'Baja'),
         ('medium', 'Media'),
@@ -168,6 +389,21 @@ class Task(models.Model):
     
     class Meta:
         ordering = ['due_datetime', '-created_at']
+        indexes = [
+            # Paginación por cursor de las tareas pendientes de la casa. Parcial: Django
+            # filtra is_completed=False como NOT is_completed, que no usa una igualdad
+            models.Index(
+                fields=['household', 'due_datetime', '-created_at', '-id'],
+                condition=models.Q(is_completed=False),
+                name='homi_task_pending_idx'
+            ),
+            # Tareas pendientes propias (dashboard/) sin recorrer las ya completadas
+            models.Index(
+                fields=['assigned_to', 'household', 'due_datetime', '-created_at', '-id'],
+                condition=models.Q(is_completed=False),
+                name='homi_task_assigned_pending_idx'
+            ),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.household.name}"
@@ -177,10 +413,10 @@ class Task(models.Model):
         return timezone.now() > self.due_datetime and not self.is_completed
     
     def can_complete(self, user):
-        return self.assigned_to == user and not self.is_completed
+        return self.assigned_to_id == user.id and not self.is_completed
 
 # NUEVO MODELO: Gastos Personales Mensuales
-class PersonalExpense(models.Model):
+class PersonalExpense(ShardedIdModel):
     EXPENSE_SOURCE_CHOICES = [
         ('manual', 'Manual'),  # Agregado manualmente
         ('shared_payment', 'Pago de Gasto Compartido'),  # Viene de un pago de gasto compartido
@@ -202,6 +438,8 @@ class PersonalExpense(models.Model):
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['user', 'household', 'month', 'year']),
+            # Paginación por cursor de los gastos del mes de la casa
+            models.Index(fields=['household', 'year', 'month', '-created_at', '-id']),
         ]
     
     def __str__(self):
@@ -213,7 +451,27 @@ class PersonalExpense(models.Model):
             now = timezone.now()
             self.month = now.month
             self.year = now.year
-        super().save(*args, **kwargs)
+        
+        # Mantener los totales mensuales en la misma transacción
+        with shards.atomic():
+            previous = None
+            if self.pk is not None:
+                previous = PersonalExpense.objects.filter(pk=self.pk).first()
+            super().save(*args, **kwargs)
+            PersonalExpenseRollup.apply_changes(added=[self], removed=[previous] if previous else [])
+    
+    def delete(self, *args, **kwargs):
+        from .events import publish_on_commit
+        from .versions import bump
+        
+        with shards.atomic():
+            PersonalExpenseRollup.apply_changes(removed=[self])
+            bump(self.household_id, CollectionVersion.PERSONAL_EXPENSES)
+            HouseholdChange.record(self.household_id, CollectionVersion.PERSONAL_EXPENSES, [self.pk], deleted=True)
+            publish_on_commit(
+                self.household_id, 'personal_expense.deleted', personal_expense_id=self.pk, user_id=self.user_id
+            )
+            return super().delete(*args, **kwargs)
     
     @classmethod
     def get_current_month_expenses(cls, user, household):
@@ -234,30 +492,170 @@ class PersonalExpense(models.Model):
             month = now.month
             year = now.year
         
-        expenses = cls.objects.filter(
+        # Leído del acumulado mensual en lugar de sumar las filas
+        total = PersonalExpenseRollup.objects.filter(
             user=user,
             household=household,
             month=month,
             year=year
-        )
-        
-        total = expenses.aggregate(total=models.Sum('cost'))['total']
+        ).values_list('total', flat=True).first()
         return total if total else 0
     
     @classmethod
     def cleanup_old_expenses(cls):
-        """Elimina gastos del mes anterior - Se puede llamar desde un cron job"""
-        now = timezone.now()
-        # Calcular el mes anterior
-        if now.month == 1:
-            prev_month = 12
-            prev_year = now.year - 1
-        else:
-            prev_month = now.month - 1
-            prev_year = now.year
+        """Archiva y elimina gastos del mes anterior - Se puede llamar desde un cron job"""
+        # Archivado previo y borrado por lotes cortos (ver archiving.py)
+        from .archiving import archive_month_locked, previous_month
+        
+        prev_year, prev_month = previous_month()
+        # None si otro proceso ya está archivando
+        return archive_month_locked(prev_year, prev_month)
+
+# Totales mensuales de gastos personales por casa y usuario
+class PersonalExpenseRollup(models.Model):
+    household = models.ForeignKey(Household, on_delete=models.CASCADE, related_name='personal_expense_rollups')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='personal_expense_rollups')
+    year = models.IntegerField()
+    month = models.IntegerField()
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    expense_count = models.IntegerField(default=0)
+    
+    class Meta:
+        unique_together = ['household', 'user', 'year', 'month']
+        indexes = [
+            # Archivado y limpieza de un mes completo
+            models.Index(fields=['year', 'month']),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id} - {self.month}/{self.year}: ${self.total} ({self.expense_count})"
+    
+    @staticmethod
+    def _key(expense):
+        return (expense.household_id, expense.user_id, expense.year, expense.month)
+    
+    @classmethod
+    def apply_changes(cls, added=(), removed=()):
+        """Suma los gastos agregados y resta los eliminados de sus acumulados.
         
-        # Eliminar gastos del mes anterior
-        cls.objects.filter(
-            month=prev_month,
-            year=prev_year
-        ).delete()
\ No newline at end of file
+        Debe llamarse en la misma transacción que el cambio de los gastos; los
+        caminos que no pasan por save()/delete() (bulk_create, borrados masivos)
+        la llaman explícitamente.
+        """
+        deltas = {}
+        for sign, expenses in ((1, added), (-1, removed)):
+            for expense in expenses:
+                total, count = deltas.get(cls._key(expense), (0, 0))
+                deltas[cls._key(expense)] = (total + sign * Decimal(str(expense.cost)), count + sign)
+        
+        for (household_id, user_id, year, month), (total, count) in deltas.items():
+            if not total and not count:
+                continue
+            filters = dict(household_id=household_id, user_id=user_id, year=year, month=month)
+            changes = dict(total=F('total') + total, expense_count=F('expense_count') + count)
+            if cls.objects.filter(**filters).update(**changes):
+                continue
+            try:
+                with shards.atomic():
+                    cls.objects.create(total=total, expense_count=count, **filters)
+            except IntegrityError:
+                # Otra transacción creó el acumulado al mismo tiempo
+                cls.objects.filter(**filters).update(**changes)
+
+# Versión por casa y colección para las peticiones condicionales (ETag)
+class CollectionVersion(models.Model):
+    NEWS = 'news'
+    TASKS = 'tasks'
+    EXPENSES = 'expenses'
+    PERSONAL_EXPENSES = 'personal_expenses'
+    MEMBERS = 'members'
+    COLLECTION_CHOICES = [
+        (NEWS, 'Noticias'),
+        (TASKS, 'Tareas'),
+        (EXPENSES, 'Gastos'),
+        (PERSONAL_EXPENSES, 'Gastos personales'),
+        (MEMBERS, 'Miembros'),
+    ]
+    
+    household = models.ForeignKey(Household, on_delete=models.CASCADE, related_name='collection_versions')
+    collection = models.CharField(max_length=20, choices=COLLECTION_CHOICES)
+    version = models.BigIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ['household', 'collection']
+    
+    def __str__(self):
+        return f"{self.household_id} - {self.collection}: {self.version}"
+    
+    @classmethod
+    def bump(cls, household_id, *collections, create=True):
+        """Incrementa la versión de las colecciones indicadas de una casa"""
+        for collection in collections:
+            filters = dict(household_id=household_id, collection=collection)
+            if cls.objects.filter(**filters).update(version=F('version') + 1) or not create:
+                continue
+            try:
+                with shards.atomic():
+                    cls.objects.create(version=1, **filters)
+            except IntegrityError:
+                # Otra transacción creó la fila al mismo tiempo
+                cls.objects.filter(**filters).update(version=F('version') + 1)
+    
+    @classmethod
+    def bump_households(cls, household_ids, collection):
+        """bump() de una colección en varias casas con un UPDATE y un INSERT en total"""
+        rows = cls.objects.filter(household_id__in=household_ids, collection=collection)
+        existing = set(rows.values_list('household_id', flat=True))
+        rows.update(version=F('version') + 1)
+        missing = [household_id for household_id in household_ids if household_id not in existing]
+        try:
+            with shards.atomic():
+                cls.objects.bulk_create([
+                    cls(household_id=household_id, collection=collection, version=1) for household_id in missing
+                ])
+        except IntegrityError:
+            # Otra transacción creó alguna de las filas al mismo tiempo
+            for household_id in missing:
+                cls.bump(household_id, collection)
+    
+    @classmethod
+    def get_versions(cls, household_id, collections):
+        """Versiones actuales en una sola consulta; 0 si la colección nunca cambió"""
+        versions = dict.fromkeys(collections, 0)
+        versions.update(cls.objects.filter(
+            household_id=household_id,
+            collection__in=collections
+        ).values_list('collection', 'version'))
+        return versions
+
+# Registro de cambios por casa para la sincronización incremental (sync/)
+class HouseholdChange(models.Model):
+    UPSERT = 'upsert'
+    DELETE = 'delete'
+    OPERATION_CHOICES = [
+        (UPSERT, 'Creado o modificado'),
+        (DELETE, 'Eliminado'),
+    ]
+    
+    # Sin restricción de clave foránea: el borrado en cascada de una casa registra
+    # los borrados de sus filas en la misma transacción; el registro de la casa se
+    # elimina después, al terminar ese borrado (signals.py)
+    household = models.ForeignKey(
+        Household, on_delete=models.DO_NOTHING, db_constraint=False, related_name='changes'
+    )
+    entity = models.CharField(max_length=20, choices=CollectionVersion.COLLECTION_CHOICES)
+    object_id = models.BigIntegerField()
+    operation = models.CharField(max_length=6, choices=OPERATION_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.household_id} - {self.entity} {self.object_id}: {self.operation}"
+    
+    @classmethod
+    def record(cls, household_id, entity, object_ids, deleted=False):
+        """Agrega al registro, en la transacción actual, los cambios de varias filas"""
+        operation = cls.DELETE if deleted else cls.UPSERT
+        cls.objects.bulk_create([
+            cls(household_id=household_id, entity=entity, object_id=object_id, operation=operation)
+            for object_id in object_ids
+        ])
\ No newline at end of file
@@ -0,0 +1,112 @@
+"""Paginación por cursor (keyset) para los listados de la casa.
+
+Cada página se pide con ?limit=<n>&cursor=<cursor>. El cursor es opaco (JSON en
+base64) y guarda los valores de ordenamiento de la última fila entregada; la
+página siguiente se obtiene con un WHERE sobre esos valores en lugar de un
+OFFSET, así que cuesta lo mismo en la primera página que en la milésima y no
+salta ni repite filas cuando se crean registros nuevos entre páginas.
+
+Los clientes que no envían limit ni cursor reciben la primera página con la
+forma de siempre (una lista) y el cursor siguiente en la cabecera X-Next-Cursor.
+"""
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.response import Response
+
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+# Ordenamientos de los listados; 'id' desempata filas con el mismo created_at
+NEWS_ORDERING = ('-created_at', '-id')
+EXPENSE_ORDERING = ('-created_at', '-id')
+PERSONAL_EXPENSE_ORDERING = ('-created_at', '-id')
+TASK_ORDERING = ('due_datetime', '-created_at', '-id')
+
+
+class InvalidPage(ValueError):
+    """limit o cursor inválidos"""
+
+
+def _page_settings():
+    options = getattr(settings, 'HOMI_PAGINATION', {})
+    return options.get('PAGE_SIZE', 50), options.get('MAX_PAGE_SIZE', 200)
+
+
+def is_paginated_request(request):
+    return 'limit' in request.query_params or 'cursor' in request.query_params
+
+
+def encode_cursor(ordering, values):
+    payload = json.dumps({'o': list(ordering), 'v': values}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, ordering):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values = payload['v']
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise InvalidPage('Cursor inválido')
+    if payload.get('o') != list(ordering) or not isinstance(values, list) or len(values) != len(ordering):
+        raise InvalidPage('Cursor inválido')
+    return values
+
+
+def _keyset_filter(model, ordering, values):
+    """(a, b, c) después de (x, y, z) respetando la dirección de cada columna"""
+    condition = Q()
+    equal = {}
+    for field, raw in zip(ordering, values):
+        name = field.lstrip('-')
+        try:
+            value = model._meta.get_field(name).to_python(raw)
+        except Exception:
+            raise InvalidPage('Cursor inválido')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        condition |= Q(**equal, **{f'{name}__{lookup}': value})
+        equal[name] = value
+    return condition
+
+
+def _cursor_values(obj, ordering):
+    values = []
+    for field in ordering:
+        value = getattr(obj, field.lstrip('-'))
+        values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+    return values
+
+
+def paginate(queryset, ordering, request):
+    """Devuelve (filas de la página, cursor siguiente o None)"""
+    page_size, max_page_size = _page_settings()
+    try:
+        limit = int(request.query_params.get('limit', page_size))
+    except (TypeError, ValueError):
+        raise InvalidPage('limit debe ser un número')
+    if not 1 <= limit <= max_page_size:
+        raise InvalidPage(f'limit debe estar entre 1 y {max_page_size}')
+
+    queryset = queryset.order_by(*ordering)
+    cursor = request.query_params.get('cursor')
+    if cursor:
+        queryset = queryset.filter(_keyset_filter(queryset.model, ordering, decode_cursor(cursor, ordering)))
+
+    rows = list(queryset[:limit + 1])
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(ordering, _cursor_values(rows[-1], ordering))
+
+
+def paginated_response(request, data, next_cursor):
+    """Lista simple para los clientes antiguos; sobre con results/next_cursor si se pidió paginar"""
+    if is_paginated_request(request):
+        return Response({'results': data, 'next_cursor': next_cursor})
+    response = Response(data)
+    if next_cursor:
+        response[NEXT_CURSOR_HEADER] = next_cursor
+    return response
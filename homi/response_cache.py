@@ -0,0 +1,237 @@
+"""Caché de lectura de los listados de la casa.
+
+Guarda la parte compartida de la respuesta (la misma para todos los miembros)
+en la caché de Django HOMI_RESPONSE_CACHE['CACHE_ALIAS']. La clave incluye las
+versiones de las colecciones de las que depende el listado (versions.py): las
+señales que incrementan una versión al escribir invalidan con precisión todas
+las entradas afectadas y nada más; las claves viejas expiran solas.
+
+Los campos que dependen del usuario (user_has_paid, can_complete_task,
+is_creator, ...) nunca se guardan: cada vista los calcula sobre una copia del
+contenido compartido después de leerlo.
+
+Ante un fallo sólo una petición reconstruye la entrada: toma un candado con
+cache.add() y las demás esperan hasta HOMI_RESPONSE_CACHE['LOCK_WAIT'] segundos
+a que aparezca antes de reconstruirla ellas mismas. Dentro del proceso las
+peticiones idénticas simultáneas se agrupan antes (singleflight.py): una sola
+consulta la caché o construye y las demás reciben su resultado, también con la
+caché apagada. shared_payload_async() hace lo mismo para las vistas async
+(async_views.py) sin ocupar un hilo mientras espera.
+
+Las entradas se guardan al confirmar la transacción en curso (de inmediato
+fuera de una): dentro de un lote atómico la clave lleva versiones sin confirmar
+y el contenido filas que pueden deshacerse, y una entrada guardada antes del
+rollback se serviría cuando una escritura real alcance esas versiones.
+"""
+import asyncio
+import hashlib
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.utils import timezone
+
+from . import shards, singleflight
+from .versions import request_versions
+
+# Cambiarlo invalida todas las entradas (p. ej. si cambia un serializer)
+CACHE_FORMAT = 1
+
+_POLL_SECONDS = 0.01
+
+
+def _options():
+    return getattr(settings, 'HOMI_RESPONSE_CACHE', {})
+
+
+class Counters:
+    """Contadores del proceso: aciertos, fallos y esperas por el candado"""
+
+    FIELDS = ('hits', 'misses', 'lock_waits', 'lock_timeouts')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def increment(self, field):
+        with self._lock:
+            self._values[field] += 1
+
+    def reset(self):
+        with self._lock:
+            self._values = dict.fromkeys(self.FIELDS, 0)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+
+counters = Counters()
+
+
+def stats():
+    values = counters.snapshot()
+    lookups = values['hits'] + values['misses']
+    values['hit_ratio'] = values['hits'] / lookups if lookups else 0.0
+    return values
+
+
+def _cache():
+    if not _options().get('ENABLED', True):
+        return None
+    return caches[_options().get('CACHE_ALIAS', 'default')]
+
+
+def cache_key(request, name, collections, time_bucket=None):
+    versions = request_versions(request, collections)
+    parts = [
+        CACHE_FORMAT,
+        *(f'{collection}={versions[collection]}' for collection in collections),
+        request.META.get('QUERY_STRING', ''),
+    ]
+    if time_bucket:
+        parts.append(int(timezone.now().timestamp()) // time_bucket)
+    digest = hashlib.sha1(':'.join(str(part) for part in parts).encode()).hexdigest()[:20]
+    return f'homi:response:{request.household.pk}:{name}:{digest}'
+
+
+def _wait_for(cache, key, lock_key):
+    """Espera a que quien tiene el candado guarde la entrada; None si no llega"""
+    deadline = time.monotonic() + _options().get('LOCK_WAIT', 2)
+    while time.monotonic() < deadline:
+        time.sleep(_POLL_SECONDS)
+        payload = cache.get(key)
+        if payload is not None:
+            return payload
+        if cache.get(lock_key) is None:
+            # Quien construía falló o terminó sin guardar
+            return cache.get(key)
+    counters.increment('lock_timeouts')
+    return None
+
+
+def shared_payload(request, name, collections, build, time_bucket=None):
+    """Contenido compartido del listado desde la caché o construido con build().
+
+    name identifica la vista, collections son las colecciones de las que depende
+    y time_bucket (segundos) renueva la entrada para campos que dependen de la
+    hora. El resultado no debe modificarse: las vistas agregan los campos del
+    usuario sobre copias.
+    """
+    cache = _cache()
+    # Dentro de una transacción el resultado puede incluir cambios sin confirmar
+    coalesce = singleflight.enabled() and not connections[shards.current()].in_atomic_block
+    if cache is None and not coalesce:
+        return build()
+
+    # La clave lleva las versiones leídas por esta petición: quien acaba de
+    # escribir nunca se une a un cálculo anterior a su escritura
+    key = cache_key(request, name, collections, time_bucket)
+    if cache is None:
+        return singleflight.flights.do(key, build)
+    if coalesce:
+        return singleflight.flights.do(key, lambda: _from_cache(cache, key, build))
+    return _from_cache(cache, key, build)
+
+
+def _from_cache(cache, key, build):
+    payload = cache.get(key)
+    if payload is not None:
+        counters.increment('hits')
+        return payload
+
+    lock_key = f'{key}:lock'
+    token = uuid.uuid4().hex
+    timeout = _options().get('TIMEOUT', 300)
+    if not cache.add(lock_key, token, _options().get('LOCK_TIMEOUT', 5)):
+        counters.increment('lock_waits')
+        payload = _wait_for(cache, key, lock_key)
+        if payload is not None:
+            counters.increment('hits')
+            return payload
+        counters.increment('misses')
+        payload = build()
+        _store(cache, key, payload, timeout)
+        return payload
+
+    counters.increment('misses')
+    try:
+        payload = build()
+        _store(cache, key, payload, timeout)
+        return payload
+    finally:
+        # Sólo se libera el candado propio (pudo expirar y tomarlo otra petición)
+        if cache.get(lock_key) == token:
+            cache.delete(lock_key)
+
+
+def _store(cache, key, payload, timeout):
+    shards.on_commit(lambda: cache.set(key, payload, timeout))
+
+
+async def shared_payload_async(request, name, collections, build, time_bucket=None):
+    """shared_payload() para las vistas async: build es una función async.
+
+    Las versiones de las colecciones ya deben estar cargadas en la petición
+    (async_views.py las lee junto con el ETag). La caché se usa con su API async
+    y las esperas al candado o a otra petición idéntica no ocupan un hilo. Las
+    vistas async nunca corren dentro de una transacción (los lotes usan las
+    vistas síncronas), así que siempre se puede agrupar.
+    """
+    cache = _cache()
+    coalesce = singleflight.enabled()
+    if cache is None and not coalesce:
+        return await build()
+
+    key = cache_key(request, name, collections, time_bucket)
+    if cache is None:
+        return await singleflight.flights.do_async(key, build)
+    if coalesce:
+        return await singleflight.flights.do_async(key, lambda: _from_cache_async(cache, key, build))
+    return await _from_cache_async(cache, key, build)
+
+
+async def _wait_for_async(cache, key, lock_key):
+    deadline = time.monotonic() + _options().get('LOCK_WAIT', 2)
+    while time.monotonic() < deadline:
+        await asyncio.sleep(_POLL_SECONDS)
+        payload = await cache.aget(key)
+        if payload is not None:
+            return payload
+        if await cache.aget(lock_key) is None:
+            return await cache.aget(key)
+    counters.increment('lock_timeouts')
+    return None
+
+
+async def _from_cache_async(cache, key, build):
+    payload = await cache.aget(key)
+    if payload is not None:
+        counters.increment('hits')
+        return payload
+
+    lock_key = f'{key}:lock'
+    token = uuid.uuid4().hex
+    timeout = _options().get('TIMEOUT', 300)
+    if not await cache.aadd(lock_key, token, _options().get('LOCK_TIMEOUT', 5)):
+        counters.increment('lock_waits')
+        payload = await _wait_for_async(cache, key, lock_key)
+        if payload is not None:
+            counters.increment('hits')
+            return payload
+        counters.increment('misses')
+        payload = await build()
+        await cache.aset(key, payload, timeout)
+        return payload
+
+    counters.increment('misses')
+    try:
+        payload = await build()
+        await cache.aset(key, payload, timeout)
+        return payload
+    finally:
+        if await cache.aget(lock_key) == token:
+            await cache.adelete(lock_key)
@@ -0,0 +1,213 @@
+"""Réplicas de lectura con lectura de lo propio escrito (read-after-write).
+
+ReplicaRoutingMiddleware crea un estado de enrutamiento por petición en una
+ContextVar (sirve igual para hilos WSGI y para corrutinas ASGI). Las vistas GET
+marcadas con read_replica leen de una réplica de HOMI_READ_REPLICAS['ALIASES']
+elegida al azar para toda la petición; todo lo demás (escrituras, vistas sin
+marcar, comandos) usa 'default'.
+
+Cuando una petición escribe en el primario, el usuario queda fijado al primario
+durante HOMI_READ_REPLICAS['STICKY_SECONDS'] segundos: sus lecturas siguientes
+(y las de la misma petición o lote) ya no van a una réplica que podría no tener
+aún su escritura. La marca se guarda en la caché HOMI_READ_REPLICAS['CACHE_ALIAS'],
+que con varios procesos debe ser compartida.
+
+ShardRouter va antes en DATABASE_ROUTERS y envía los modelos de la casa al
+shard activo (shards.py); para el shard 'default' no decide y las réplicas
+siguen funcionando igual.
+"""
+import random
+import threading
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+
+from . import shards
+
+_route = ContextVar('homi_route', default=None)
+
+
+def _options():
+    return getattr(settings, 'HOMI_READ_REPLICAS', {})
+
+
+def replica_aliases():
+    return list(_options().get('ALIASES', ()))
+
+
+class RouteState:
+    """Enrutamiento de una petición: réplica elegida y si ya escribió"""
+
+    def __init__(self):
+        self.replica = None
+        self.wrote = False
+
+
+class Counters:
+    """Contadores del proceso: lecturas por base y peticiones GET por destino"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def increment(self, group, field):
+        with self._lock:
+            self._values[group][field] = self._values[group].get(field, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self._values = {'reads': {}, 'requests': {'replica': 0, 'pinned': 0}}
+
+    def snapshot(self):
+        with self._lock:
+            return {group: dict(values) for group, values in self._values.items()}
+
+
+counters = Counters()
+
+
+def stats():
+    values = counters.snapshot()
+    reads = values['reads']
+    total = sum(reads.values())
+    values['replica_read_ratio'] = (total - reads.get(DEFAULT_DB_ALIAS, 0)) / total if total else 0.0
+    return values
+
+
+def _pin_key(user_id):
+    return f'homi:primary-pin:{user_id}'
+
+
+def _cache():
+    return caches[_options().get('CACHE_ALIAS', 'default')]
+
+
+def pin_to_primary(user_id):
+    seconds = _options().get('STICKY_SECONDS', 5)
+    if seconds:
+        _cache().set(_pin_key(user_id), 1, seconds)
+
+
+def is_pinned(user_id):
+    return _cache().get(_pin_key(user_id)) is not None
+
+
+def use_replica(request):
+    """Elige una réplica para el resto de la petición; False si debe quedarse en el primario"""
+    state = _route.get()
+    aliases = replica_aliases()
+    if state is None or not aliases or state.wrote:
+        return False
+    if state.replica is None:
+        user_id = getattr(request.user, 'pk', None)
+        if user_id is not None and is_pinned(user_id):
+            counters.increment('requests', 'pinned')
+            return False
+        state.replica = random.choice(aliases)
+        counters.increment('requests', 'replica')
+    return True
+
+
+class ShardRouter:
+    def _shard(self, model, hints, follow_mirrors=False):
+        instance = hints.get('instance')
+        db = getattr(getattr(instance, '_state', None), 'db', None)
+        if instance is not None and db in shards.aliases() and shards.is_sharded(type(instance)):
+            # Relaciones de una fila ya cargada: a su shard (los usuarios a su copia)
+            alias = db if shards.is_sharded(model) or (follow_mirrors and shards.is_mirrored(model)) else None
+        elif shards.is_sharded(model):
+            alias = shards.current()
+        else:
+            alias = None
+        return None if alias == DEFAULT_DB_ALIAS else alias
+
+    def db_for_read(self, model, **hints):
+        return self._shard(model, hints, follow_mirrors=True)
+
+    def db_for_write(self, model, **hints):
+        return self._shard(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Un perfil global puede apuntar a una casa de cualquier shard
+        databases = {DEFAULT_DB_ALIAS, *shards.aliases(), *replica_aliases()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Todos los shards tienen el esquema completo; las tablas globales quedan
+        # vacías salvo la copia de los usuarios
+        return None
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _route.get()
+        alias = state.replica if state is not None and not state.wrote and state.replica else DEFAULT_DB_ALIAS
+        counters.increment('reads', alias)
+        return alias
+
+    def db_for_write(self, model, **hints):
+        state = _route.get()
+        if state is not None:
+            state.wrote = True
+        # Explícito: sin router Django escribiría en la base de la que se leyó la instancia
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *replica_aliases()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Las réplicas reciben el esquema por la replicación
+        if db in replica_aliases():
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """Abre el estado de enrutamiento de la petición y fija al primario a quien escribió"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = RouteState()
+        token = _route.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _route.reset(token)
+        self._pin(request, state)
+        return response
+
+    async def __acall__(self, request):
+        state = RouteState()
+        token = _route.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _route.reset(token)
+        self._pin(request, state)
+        return response
+
+    @staticmethod
+    def _pin(request, state):
+        if not state.wrote:
+            return
+        # DRF deja en request.user el usuario autenticado por token
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            pin_to_primary(user.pk)
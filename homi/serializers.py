@@ -19,7 +19,7 @@ class UserSerializer(serializers.ModelSerializer):
 
 class HouseholdSerializer(serializers.ModelSerializer):
     created_by_username = serializers.CharField(source='created_by.username', read_only=True)
-    members_count = serializers.IntegerField(source='members.count', read_only=True)
+    members_count = serializers.IntegerField(source='member_count', read_only=True)
     
     class Meta:
         model = Household
@@ -62,7 +62,7 @@ class ExpenseSerializer(serializers.ModelSerializer):
     created_by_username = serializers.CharField(source='created_by.username', read_only=True)
     is_fully_paid = serializers.BooleanField(read_only=True)
     payments = ExpensePaymentSerializer(many=True, read_only=True)
-    members_count = serializers.IntegerField(source='household.members.count', read_only=True)
+    members_count = serializers.IntegerField(source='household.member_count', read_only=True)
     user_has_paid = serializers.SerializerMethodField()
     
     class Meta:
@@ -75,6 +75,9 @@ class ExpenseSerializer(serializers.ModelSerializer):
                            'unit_cost', 'remaining_amount')
     
     def get_user_has_paid(self, obj):
+        # Anotado por Expense.get_household_expenses
+        if hasattr(obj, 'user_has_paid'):
+            return obj.user_has_paid
         request = self.context.get('request')
         if request and request.user:
             return obj.payments.filter(user=request.user).exists()
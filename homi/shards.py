@@ -0,0 +1,450 @@
+"""Particionado de los datos por casa (sharding) entre varias bases.
+
+Cada casa vive entera (noticias, tareas, gastos, pagos, gastos personales,
+acumulados, versiones y registro de cambios) en una de las bases de
+HOMI_SHARDS['ALIASES']. Los usuarios, tokens, perfiles y el directorio
+HouseholdShard (casa -> base) quedan en la base global 'default', que también
+puede ser uno de los shards. Cada shard guarda una copia mínima (sin
+contraseña) de los usuarios que aparecen en sus casas, para las claves
+foráneas y los JOIN con created_by, assigned_to y los miembros.
+
+El directorio asigna los ids de casa y resuelve los códigos de invitación. Las
+filas que los clientes guardan por id (noticias, gastos, pagos, tareas y gastos
+personales) también reciben ids únicos entre todas las bases, reservados en
+bloques de ShardIdSequence (allocate_ids). household_required activa la base de
+la casa en una ContextVar durante la vista y ShardRouter (routers.py) envía ahí
+las consultas de los modelos de la casa; sus transacciones usan
+atomic()/on_commit() de este módulo. Fuera de una petición (comandos, shell) se
+activa con using(alias).
+
+Las casas nuevas van al shard con menos casas. move_household mueve una casa
+a otro shard en línea: mientras se copia la casa sigue respondiendo lecturas
+desde la base de origen y rechaza las escrituras con 503; sus filas conservan
+los ids en el destino. Las entradas del directorio se guardan en la caché
+HOMI_SHARDS['CACHE_ALIAS'], que debe ser compartida entre procesos para mover
+casas; las escrituras no confían en esa caché y leen el directorio de la base.
+"""
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connections, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+_active = ContextVar('homi_shard', default=None)
+
+# Modelos de homi que viven en la base global
+GLOBAL_MODELS = {'userprofile', 'householdcodesequence', 'householdshard', 'shardidsequence', 'joblock'}
+
+# Campos de los usuarios copiados a los shards
+MIRRORED_USER_FIELDS = ('username', 'first_name', 'last_name', 'email', 'is_active', 'date_joined')
+
+Placement = namedtuple('Placement', 'alias moving moved_at')
+
+# Bloques de ids globales reservados por este proceso: tabla -> (siguiente, último)
+_id_blocks = {}
+_id_lock = threading.Lock()
+
+
+class ShardMoveError(Exception):
+    """La casa no se puede mover al shard indicado"""
+
+
+def _options():
+    return getattr(settings, 'HOMI_SHARDS', {})
+
+
+def aliases():
+    return list(_options().get('ALIASES', [DEFAULT_DB_ALIAS]))
+
+
+def is_sharded(model):
+    """True si las filas del modelo viven en el shard de su casa"""
+    opts = model._meta
+    return opts.app_label == 'homi' and opts.model_name not in GLOBAL_MODELS
+
+
+def is_mirrored(model):
+    """True para el modelo de usuario, copiado en cada shard"""
+    return model._meta.label_lower == settings.AUTH_USER_MODEL.lower()
+
+
+def current():
+    """Shard activo en este contexto; 'default' si no hay ninguno"""
+    return _active.get() or DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def using(alias):
+    """Activa el shard alias para las consultas de los modelos de la casa"""
+    token = _active.set(alias)
+    try:
+        yield alias
+    finally:
+        _active.reset(token)
+
+
+def atomic():
+    """transaction.atomic sobre el shard activo"""
+    return transaction.atomic(using=current())
+
+
+def on_commit(function):
+    """transaction.on_commit sobre el shard activo"""
+    transaction.on_commit(function, using=current())
+
+
+# Directorio casa -> shard
+def _cache():
+    return caches[_options().get('CACHE_ALIAS', 'default')]
+
+
+def _placement_key(household_id):
+    return f'homi:shard:{household_id}'
+
+
+def shared_cache():
+    """True si la caché del directorio la ven todos los procesos (no locmem ni dummy)"""
+    return not isinstance(_cache(), (LocMemCache, DummyCache))
+
+
+@checks.register()
+def check_directory_cache(app_configs, **kwargs):
+    if len(aliases()) < 2 or shared_cache():
+        return []
+    return [checks.Warning(
+        'HOMI_SHARDS["CACHE_ALIAS"] no es una caché compartida entre procesos',
+        hint='move_household no mueve casas con una caché local: los demás procesos no verían el cambio',
+        id='homi.W001',
+    )]
+
+
+def placement(household_id, fresh=False):
+    """Shard de la casa según el directorio; 'default' si no tiene entrada.
+
+    Con fresh se lee de la base aunque esté en caché: las escrituras no pueden
+    confiar en una entrada que otro proceso aún no vio cambiar.
+    """
+    from .models import HouseholdShard
+
+    key = _placement_key(household_id)
+    cached = None if fresh else _cache().get(key)
+    if cached is not None:
+        return Placement(*cached)
+    # Siempre del primario: una réplica atrasada no vería un movimiento reciente
+    row = HouseholdShard.objects.using(DEFAULT_DB_ALIAS).filter(pk=household_id).values_list(
+        'shard', 'moving', 'moved_at'
+    ).first()
+    result = Placement(*row) if row else Placement(DEFAULT_DB_ALIAS, False, None)
+    _cache().set(key, tuple(result), _options().get('DIRECTORY_TIMEOUT', 300))
+    return result
+
+
+def forget(household_id):
+    _cache().delete(_placement_key(household_id))
+
+
+def allocate_ids(model, count):
+    """count ids nuevos para model, únicos entre todos los shards.
+
+    Se reservan en ShardIdSequence (base global) en bloques de
+    HOMI_SHARDS['ID_BLOCK'], así que el proceso escribe ahí una vez por bloque.
+    Dentro de una transacción de 'default' se reservan sólo los ids pedidos: si
+    se revierte, la reserva también, y un bloque guardado en memoria podría
+    repetirse en otro proceso. Con un solo shard no hay a dónde mover una casa:
+    devuelve [None] * count y los ids los asigna la base.
+    """
+    from .models import ShardIdSequence
+
+    if not count:
+        return []
+    if len(aliases()) < 2:
+        return [None] * count
+    if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+        last = ShardIdSequence.reserve(model, count)
+        return list(range(last - count + 1, last + 1))
+
+    table = model._meta.db_table
+    ids = []
+    with _id_lock:
+        start, end = _id_blocks.get(table, (1, 0))
+        while len(ids) < count:
+            if start > end:
+                size = max(_options().get('ID_BLOCK', 100), count - len(ids))
+                end = ShardIdSequence.reserve(model, size)
+                start = end - size + 1
+            taken = min(end - start + 1, count - len(ids))
+            ids.extend(range(start, start + taken))
+            start += taken
+        _id_blocks[table] = (start, end)
+    return ids
+
+
+def choose_shard():
+    """Shard para una casa nueva: el que tiene menos casas en el directorio"""
+    from .models import HouseholdShard
+
+    counts = dict(
+        HouseholdShard.objects.using(DEFAULT_DB_ALIAS).values_list('shard').annotate(total=Count('*')).order_by()
+    )
+    return min(aliases(), key=lambda alias: counts.get(alias, 0))
+
+
+def _stored_in(instance, alias):
+    db = instance._state.db
+    if alias == DEFAULT_DB_ALIAS:
+        # Una réplica de lectura de 'default' también vale
+        return db == DEFAULT_DB_ALIAS or db not in aliases()
+    return db == alias
+
+
+def attach_household(profile, fresh=False):
+    """Deja en el perfil su casa actual cargada desde su shard y devuelve su Placement.
+
+    La autenticación la trae con un JOIN en la base global, que no encuentra las
+    casas de otros shards. Si la casa no aparece donde dice el directorio
+    cacheado (se movió), se vuelve a consultar el directorio una vez. Si no
+    existe, la casa cacheada en el perfil queda en None. fresh lee el directorio
+    de la base (ver placement).
+    """
+    from .models import Household
+
+    household_id = profile.current_household_id
+    where = placement(household_id, fresh=fresh)
+    household = profile._state.fields_cache.get('current_household')
+    if household is not None and _stored_in(household, where.alias) and 'created_by' in household._state.fields_cache:
+        return where
+
+    for attempt in range(2):
+        household = Household.objects.using(where.alias).select_related('created_by').filter(pk=household_id).first()
+        if household is not None or attempt:
+            break
+        forget(household_id)
+        where = placement(household_id)
+    profile._state.fields_cache['current_household'] = household
+    return where
+
+
+# Copia de los usuarios en los shards
+def mirror_users(alias, users):
+    """Crea o actualiza en el shard alias la copia de los usuarios indicados"""
+    if alias == DEFAULT_DB_ALIAS or not users:
+        return
+    User = get_user_model()
+    copies = [
+        User(pk=user.pk, password=make_password(None), **{field: getattr(user, field) for field in MIRRORED_USER_FIELDS})
+        for user in users
+    ]
+    User.objects.using(alias).bulk_create(
+        copies, update_conflicts=True, unique_fields=['id'], update_fields=list(MIRRORED_USER_FIELDS)
+    )
+
+
+def refresh_mirrors(user, update_fields=None):
+    """Propaga a los shards los cambios de un usuario de la base global"""
+    if update_fields is not None and not set(update_fields) & set(MIRRORED_USER_FIELDS):
+        return
+    values = {field: getattr(user, field) for field in MIRRORED_USER_FIELDS}
+    for alias in aliases():
+        if alias != DEFAULT_DB_ALIAS:
+            get_user_model().objects.using(alias).filter(pk=user.pk).update(**values)
+
+
+# Movimiento de casas entre shards
+def _household_querysets(household_id, alias):
+    """Filas de la casa en alias, por modelo, en orden de inserción"""
+    from .models import (
+        CollectionVersion, Expense, ExpensePayment, Household, HouseholdChange, News, PersonalExpense,
+        PersonalExpenseRollup, Task
+    )
+
+    return [
+        (Household, Household.objects.using(alias).filter(pk=household_id)),
+        (Household.members.through, Household.members.through.objects.using(alias).filter(household_id=household_id)),
+        (News, News.objects.using(alias).filter(household_id=household_id)),
+        (Expense, Expense.objects.using(alias).filter(household_id=household_id)),
+        (ExpensePayment, ExpensePayment.objects.using(alias).filter(expense__household_id=household_id)),
+        (Task, Task.objects.using(alias).filter(household_id=household_id)),
+        (PersonalExpense, PersonalExpense.objects.using(alias).filter(household_id=household_id)),
+        (PersonalExpenseRollup, PersonalExpenseRollup.objects.using(alias).filter(household_id=household_id)),
+        (CollectionVersion, CollectionVersion.objects.using(alias).filter(household_id=household_id)),
+        (HouseholdChange, HouseholdChange.objects.using(alias).filter(household_id=household_id)),
+    ]
+
+
+def _keeps_pk(model):
+    """True si el id de las filas del modelo es único entre todos los shards"""
+    from .models import Household, ShardedIdModel
+
+    return model is Household or issubclass(model, ShardedIdModel)
+
+
+def _copy_rows(model, rows, alias, new_ids, keep_pk=False):
+    """Inserta las filas en alias con las claves foráneas traducidas.
+
+    Con keep_pk conservan su id (único entre todos los shards); si no, reciben
+    uno nuevo de la secuencia del destino (miembros, acumulados y versiones,
+    que los clientes no guardan). new_ids guarda por modelo la traducción de los
+    ids. INSERT fila a fila: bulk_create pisaría las fechas auto_now_add.
+    """
+    connection = connections[alias]
+    pk = model._meta.pk
+    fields = [field for field in model._meta.concrete_fields if keep_pk or field is not pk]
+    table = connection.ops.quote_name(model._meta.db_table)
+    columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+    placeholders = ', '.join(['%s'] * len(fields))
+    translated = new_ids.setdefault(model, {})
+    with connection.cursor() as cursor:
+        for row in rows:
+            values = []
+            for field in fields:
+                value = getattr(row, field.attname)
+                if field.is_relation and value is not None and field.related_model in new_ids:
+                    value = new_ids[field.related_model][value]
+                values.append(field.get_db_prep_save(value, connection))
+            cursor.execute(f'INSERT INTO {table} ({columns}) VALUES ({placeholders})', values)
+            translated[row.pk] = row.pk if keep_pk else connection.ops.last_insert_id(cursor, model._meta.db_table, pk.column)
+
+
+def _written_after_copy(household_id, source, loaded):
+    """Modelos con filas creadas en el origen después de la copia"""
+    copied = {model: {row.pk for row in rows} for model, rows in loaded}
+    return [
+        model._meta.model_name
+        for model, queryset in _household_querysets(household_id, source) if model in copied
+        if set(queryset.values_list('pk', flat=True)) - copied[model]
+    ]
+
+
+def move_household(household_id, target, drain=None, log=None):
+    """Mueve una casa a otro shard en línea; devuelve las filas copiadas.
+
+    1. El directorio marca la casa como en movimiento: las peticiones nuevas
+       que escriben reciben 503 y se esperan drain segundos a las que ya
+       estaban escribiendo.
+    2. Se copian sus filas (y las copias de sus usuarios) al destino, leídas en
+       una transacción del origen para tener una foto consistente. Noticias,
+       gastos, pagos, tareas y gastos personales conservan sus ids; el registro
+       de cambios (ids por base) no se copia y se incrementan todas las
+       versiones (ETag y listados cacheados).
+    3. El directorio apunta al destino: las lecturas y escrituras siguientes van
+       ahí. Los cursores de sync/ anteriores al movimiento reciben reset y las
+       conexiones de events/ un evento resync.
+    4. Se borran las filas del origen sin señales (no son borrados reales). Si
+       alguna petición alcanzó a crear filas en el origen después de la copia,
+       no se borra nada y se informa con ShardMoveError.
+    """
+    from .authentication import auth_cache
+    from .events import RESYNC, broker
+    from .models import CollectionVersion, HouseholdChange, HouseholdShard
+    from .versions import bump
+
+    log = log or (lambda message: None)
+    drain = _options().get('MOVE_DRAIN_SECONDS', 2) if drain is None else drain
+    if target not in aliases():
+        raise ShardMoveError(f'"{target}" no está en HOMI_SHARDS["ALIASES"]')
+    if not shared_cache():
+        # forget() sólo limpiaría este proceso: los demás seguirían escribiendo en el origen
+        raise ShardMoveError('HOMI_SHARDS["CACHE_ALIAS"] debe ser una caché compartida entre procesos')
+    entry = HouseholdShard.objects.using(DEFAULT_DB_ALIAS).filter(pk=household_id).first()
+    if entry is None:
+        raise ShardMoveError(f'La casa {household_id} no está en el directorio')
+    if entry.moving:
+        raise ShardMoveError(f'La casa {household_id} ya se está moviendo')
+    source = entry.shard
+    if source == target:
+        raise ShardMoveError(f'La casa {household_id} ya está en {target}')
+
+    HouseholdShard.objects.using(DEFAULT_DB_ALIAS).filter(pk=household_id).update(moving=True)
+    forget(household_id)
+    try:
+        time.sleep(drain)
+        with transaction.atomic(using=source):
+            loaded = [
+                (model, list(queryset)) for model, queryset in _household_querysets(household_id, source)
+                if model is not HouseholdChange
+            ]
+        if not loaded[0][1]:
+            raise ShardMoveError(f'La casa {household_id} no existe en {source}')
+
+        User = get_user_model()
+        user_ids = {
+            getattr(row, field.attname)
+            for model, rows in loaded
+            for field in model._meta.concrete_fields if field.is_relation and is_mirrored(field.related_model)
+            for row in rows
+        }
+        # Las copias del origen bastan si es un shard; 'default' tiene los originales
+        users = User.objects.using(source).filter(pk__in=user_ids)
+        new_ids = {}
+        copied = 0
+        try:
+            with using(target), transaction.atomic(using=target):
+                mirror_users(target, users)
+                for model, rows in loaded:
+                    _copy_rows(model, rows, target, new_ids, keep_pk=_keeps_pk(model))
+                    copied += len(rows)
+                bump(household_id, *(collection for collection, _ in CollectionVersion.COLLECTION_CHOICES))
+        except IntegrityError as e:
+            # Filas creadas antes de los ids globales pueden repetir un id del destino
+            raise ShardMoveError(f'La casa {household_id} tiene ids que ya existen en {target}: {e}') from e
+        log(f'Casa {household_id}: {copied} filas copiadas de {source} a {target}')
+
+        HouseholdShard.objects.using(DEFAULT_DB_ALIAS).filter(pk=household_id).update(
+            shard=target, moving=False, moved_at=timezone.now()
+        )
+    except BaseException:
+        HouseholdShard.objects.using(DEFAULT_DB_ALIAS).filter(pk=household_id).update(moving=False)
+        forget(household_id)
+        raise
+    forget(household_id)
+    # Los perfiles cacheados traen la casa cargada desde el origen
+    auth_cache.invalidate(household_ids=[household_id])
+    broker.publish(household_id, RESYNC)
+
+    stray = _written_after_copy(household_id, source, loaded)
+    if stray:
+        raise ShardMoveError(
+            f'La casa {household_id} recibió escrituras en {source} durante el movimiento ({", ".join(stray)}); '
+            f'sus filas no se borraron de {source}'
+        )
+    with transaction.atomic(using=source):
+        for model, queryset in reversed(_household_querysets(household_id, source)):
+            queryset._raw_delete(source)
+    log(f'Casa {household_id}: filas borradas de {source}')
+    return copied
+
+
+def rebalance(max_moves=10, drain=None, log=None):
+    """Mueve casas del shard con más casas al que tiene menos hasta igualarlos"""
+    from .models import HouseholdShard
+
+    moves = []
+    while len(moves) < max_moves:
+        counts = dict.fromkeys(aliases(), 0)
+        counts.update(
+            HouseholdShard.objects.using(DEFAULT_DB_ALIAS).filter(shard__in=counts)
+            .values_list('shard').annotate(total=Count('*')).order_by()
+        )
+        fullest = max(counts, key=counts.get)
+        emptiest = min(counts, key=counts.get)
+        if counts[fullest] - counts[emptiest] <= 1:
+            break
+        household_id = HouseholdShard.objects.using(DEFAULT_DB_ALIAS).filter(
+            shard=fullest, moving=False
+        ).order_by('-pk').values_list('pk', flat=True).first()
+        if household_id is None:
+            break
+        move_household(household_id, emptiest, drain=drain, log=log)
+        moves.append((household_id, fullest, emptiest))
+    return moves
@@ -0,0 +1,294 @@
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from . import metrics, shards, versions
+from .authentication import auth_cache
+from .events import publish_on_commit
+from .models import (
+    CollectionVersion, Expense, ExpensePayment, Household, HouseholdChange, HouseholdShard, News, PersonalExpense,
+    Task, UserProfile
+)
+
+
+def _invalidate_auth_cache(using, **kwargs):
+    # Invalidar al confirmar la transacción para que una petición concurrente
+    # no vuelva a guardar en caché el estado anterior. using es la base de la
+    # señal: las casas y sus miembros pueden estar en otro shard
+    transaction.on_commit(lambda: auth_cache.invalidate(**kwargs), using=using)
+
+
+# Invalidación de la caché de autenticación
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def invalidate_token(sender, instance, **kwargs):
+    _invalidate_auth_cache(kwargs['using'], raw_keys=[instance.key], user_ids=[instance.user_id])
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user(sender, instance, **kwargs):
+    _invalidate_auth_cache(kwargs['using'], user_ids=[instance.pk])
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def invalidate_profile(sender, instance, **kwargs):
+    _invalidate_auth_cache(kwargs['using'], user_ids=[instance.user_id])
+
+
+@receiver(post_save, sender=Household)
+@receiver(pre_delete, sender=Household)
+@receiver(post_delete, sender=Household)
+def invalidate_household(sender, instance, **kwargs):
+    _invalidate_auth_cache(kwargs['using'], household_ids=[instance.pk])
+
+
+# Contador desnormalizado de miembros
+@receiver(m2m_changed, sender=Household.members.through)
+def update_member_count(sender, instance, action, reverse, pk_set, **kwargs):
+    # add/remove/clear se ejecutan dentro de una transacción: el contador se
+    # actualiza en la misma transacción que la relación
+    if reverse and action == 'pre_clear':
+        # user.households.clear() no informa qué casas se ven afectadas
+        instance._cleared_household_ids = set(instance.households.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        Household.recount_members([instance.pk])
+        instance.member_count = Household.objects.values_list('member_count', flat=True).get(pk=instance.pk)
+    elif action == 'post_clear':
+        Household.recount_members(instance._cleared_household_ids)
+    else:
+        Household.recount_members(pk_set)
+
+
+@receiver(m2m_changed, sender=Household.members.through)
+def invalidate_household_members(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if reverse:
+        # user.households.add(...): la instancia es el usuario
+        household_ids = pk_set if pk_set is not None else getattr(instance, '_cleared_household_ids', ())
+        _invalidate_auth_cache(kwargs['using'], user_ids=[instance.pk], household_ids=household_ids)
+    else:
+        _invalidate_auth_cache(kwargs['using'], user_ids=pk_set or (), household_ids=[instance.pk])
+
+
+# Versiones de las colecciones para los ETag de los listados (versions.py)
+def _creates_version(kwargs):
+    # Un borrado nunca crea la fila de versión: si lo provoca el borrado en
+    # cascada de la casa, crearla violaría la clave foránea al confirmar
+    return kwargs['signal'] is not post_delete
+
+
+@receiver(post_save, sender=News)
+@receiver(post_delete, sender=News)
+def bump_news_version(sender, instance, **kwargs):
+    versions.bump(instance.household_id, CollectionVersion.NEWS, create=_creates_version(kwargs))
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def bump_task_version(sender, instance, **kwargs):
+    versions.bump(instance.household_id, CollectionVersion.TASKS, create=_creates_version(kwargs))
+
+
+@receiver(post_save, sender=Expense)
+@receiver(post_delete, sender=Expense)
+def bump_expense_version(sender, instance, **kwargs):
+    versions.bump(instance.household_id, CollectionVersion.EXPENSES, create=_creates_version(kwargs))
+
+
+def _payment_household_id(payment):
+    expense = payment._state.fields_cache.get('expense')
+    if expense is not None:
+        return expense.household_id
+    return Expense.objects.filter(pk=payment.expense_id).values_list('household_id', flat=True).first()
+
+
+@receiver(post_save, sender=ExpensePayment)
+@receiver(post_delete, sender=ExpensePayment)
+def bump_payment_version(sender, instance, **kwargs):
+    household_id = _payment_household_id(instance)
+    if household_id is not None:
+        versions.bump(household_id, CollectionVersion.EXPENSES, create=_creates_version(kwargs))
+
+
+# Sin post_delete: PersonalExpense.delete() incrementa la versión él mismo, y un
+# receptor impediría el borrado rápido por lotes del archivado mensual, que la
+# incrementa por casa (archiving._delete_range)
+@receiver(post_save, sender=PersonalExpense)
+def bump_personal_expense_version(sender, instance, **kwargs):
+    versions.bump(instance.household_id, CollectionVersion.PERSONAL_EXPENSES)
+
+
+@receiver(m2m_changed, sender=Household.members.through)
+def bump_member_version(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        household_ids = [instance.pk]
+    elif pk_set is not None:
+        household_ids = pk_set
+    else:
+        household_ids = getattr(instance, '_cleared_household_ids', ())
+    for household_id in household_ids:
+        versions.bump(household_id, CollectionVersion.MEMBERS)
+
+
+# Eventos de cambios para las conexiones SSE de la casa (events.py)
+@receiver(post_save, sender=News)
+def publish_news_saved(sender, instance, created, **kwargs):
+    publish_on_commit(instance.household_id, 'news.created' if created else 'news.updated', news_id=instance.pk)
+
+
+@receiver(post_delete, sender=News)
+def publish_news_deleted(sender, instance, **kwargs):
+    publish_on_commit(instance.household_id, 'news.deleted', news_id=instance.pk)
+
+
+@receiver(post_save, sender=Task)
+def publish_task_saved(sender, instance, created, **kwargs):
+    if created:
+        event_type = 'task.created'
+    elif instance.is_completed:
+        event_type = 'task.completed'
+    else:
+        event_type = 'task.updated'
+    publish_on_commit(instance.household_id, event_type, task_id=instance.pk)
+
+
+@receiver(post_delete, sender=Task)
+def publish_task_deleted(sender, instance, **kwargs):
+    publish_on_commit(instance.household_id, 'task.deleted', task_id=instance.pk)
+
+
+@receiver(post_save, sender=Expense)
+def publish_expense_saved(sender, instance, created, **kwargs):
+    publish_on_commit(instance.household_id, 'expense.created' if created else 'expense.updated', expense_id=instance.pk)
+
+
+@receiver(post_delete, sender=Expense)
+def publish_expense_deleted(sender, instance, **kwargs):
+    publish_on_commit(instance.household_id, 'expense.deleted', expense_id=instance.pk)
+
+
+@receiver(post_save, sender=ExpensePayment)
+def publish_expense_paid(sender, instance, created, **kwargs):
+    if created:
+        household_id = _payment_household_id(instance)
+        publish_on_commit(household_id, 'expense.paid', expense_id=instance.expense_id, user_id=instance.user_id)
+
+
+@receiver(post_save, sender=PersonalExpense)
+def publish_personal_expense_saved(sender, instance, created, **kwargs):
+    event_type = 'personal_expense.created' if created else 'personal_expense.updated'
+    publish_on_commit(instance.household_id, event_type, personal_expense_id=instance.pk, user_id=instance.user_id)
+
+
+@receiver(post_delete, sender=Household)
+def publish_household_deleted(sender, instance, **kwargs):
+    publish_on_commit(instance.pk, 'household.deleted')
+
+
+@receiver(m2m_changed, sender=Household.members.through)
+def publish_member_changes(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    event_type = 'household.member_joined' if action == 'post_add' else 'household.member_left'
+    if not reverse:
+        for user_id in pk_set or ():
+            publish_on_commit(instance.pk, event_type, user_id=user_id)
+        return
+    household_ids = pk_set if pk_set is not None else getattr(instance, '_cleared_household_ids', ())
+    for household_id in household_ids:
+        publish_on_commit(household_id, event_type, user_id=instance.pk)
+
+
+# Registro de cambios para la sincronización incremental (sync.py)
+def _record_change(household_id, entity, object_id, kwargs):
+    HouseholdChange.record(household_id, entity, [object_id], deleted=kwargs['signal'] is post_delete)
+
+
+@receiver(post_save, sender=News)
+@receiver(post_delete, sender=News)
+def record_news_change(sender, instance, **kwargs):
+    _record_change(instance.household_id, CollectionVersion.NEWS, instance.pk, kwargs)
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def record_task_change(sender, instance, **kwargs):
+    _record_change(instance.household_id, CollectionVersion.TASKS, instance.pk, kwargs)
+
+
+@receiver(post_save, sender=Expense)
+@receiver(post_delete, sender=Expense)
+def record_expense_change(sender, instance, **kwargs):
+    _record_change(instance.household_id, CollectionVersion.EXPENSES, instance.pk, kwargs)
+
+
+@receiver(post_save, sender=ExpensePayment)
+@receiver(post_delete, sender=ExpensePayment)
+def record_payment_change(sender, instance, **kwargs):
+    # Un pago modifica su gasto (restante y lista de pagos)
+    household_id = _payment_household_id(instance)
+    if household_id is not None:
+        HouseholdChange.record(household_id, CollectionVersion.EXPENSES, [instance.expense_id])
+
+
+# Sin post_delete por el mismo motivo que la versión: PersonalExpense.delete()
+# y archiving._delete_range registran el borrado ellos mismos
+@receiver(post_save, sender=PersonalExpense)
+def record_personal_expense_change(sender, instance, **kwargs):
+    HouseholdChange.record(instance.household_id, CollectionVersion.PERSONAL_EXPENSES, [instance.pk])
+
+
+@receiver(m2m_changed, sender=Household.members.through)
+def record_member_changes(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and not reverse:
+        # household.members.clear() tampoco informa qué miembros salen
+        instance._cleared_member_ids = set(instance.members.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    deleted = action != 'post_add'
+    if not reverse:
+        user_ids = pk_set if pk_set is not None else getattr(instance, '_cleared_member_ids', ())
+        HouseholdChange.record(instance.pk, CollectionVersion.MEMBERS, user_ids, deleted=deleted)
+        return
+    household_ids = pk_set if pk_set is not None else getattr(instance, '_cleared_household_ids', ())
+    for household_id in household_ids:
+        HouseholdChange.record(household_id, CollectionVersion.MEMBERS, [instance.pk], deleted=deleted)
+
+
+@receiver(post_delete, sender=Household)
+def delete_household_changes(sender, instance, **kwargs):
+    # Se ejecuta después de los borrados en cascada que registraron cambios
+    HouseholdChange.objects.filter(household_id=instance.pk).delete()
+
+
+# Directorio de shards y copias de los usuarios (shards.py)
+@receiver(post_delete, sender=Household)
+def delete_household_shard(sender, instance, **kwargs):
+    HouseholdShard.objects.filter(pk=instance.pk).delete()
+    transaction.on_commit(lambda: shards.forget(instance.pk), using=kwargs['using'])
+
+
+@receiver(post_save, sender=User)
+def refresh_user_mirrors(sender, instance, created, update_fields=None, **kwargs):
+    # Los usuarios nuevos todavía no tienen copias
+    if not created and kwargs['using'] == DEFAULT_DB_ALIAS:
+        shards.refresh_mirrors(instance, update_fields)
+
+
+# Métricas de SQL por vista (metrics.py)
+@receiver(connection_created)
+def install_query_metrics(sender, connection, **kwargs):
+    metrics.install(connection)
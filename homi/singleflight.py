@@ -0,0 +1,127 @@
+"""Agrupación de lecturas idénticas simultáneas dentro del proceso (singleflight).
+
+Cuando varias peticiones necesitan a la vez el mismo resultado (misma casa,
+vista, parámetros y versiones de las colecciones) sólo la primera lo calcula;
+las demás esperan y reciben el mismo objeto, que por eso no debe modificarse.
+
+Cada cálculo en curso se representa con un concurrent.futures.Future: los hilos
+(servidor WSGI con hilos) esperan con result() y las corrutinas (vistas async
+bajo ASGI) con asyncio.wrap_future(), sin bloquear el event loop; la espera va
+protegida con asyncio.shield() porque cancelar el envoltorio cancelaría el
+Future compartido y el líder fallaría al publicar su resultado. Si quien
+calcula tarda más de HOMI_SINGLEFLIGHT['WAIT_TIMEOUT'] segundos, o se cancela
+(p. ej. el cliente cerró la conexión bajo ASGI), quien espera lo calcula por su
+cuenta.
+"""
+import asyncio
+import threading
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from django.conf import settings
+
+
+def _options():
+    return getattr(settings, 'HOMI_SINGLEFLIGHT', {})
+
+
+def enabled():
+    return _options().get('ENABLED', True)
+
+
+class LeaderCancelled(Exception):
+    """Quien calculaba se canceló antes de terminar; quien espera calcula por su cuenta"""
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._counts = {'leaders': 0, 'followers': 0, 'wait_timeouts': 0}
+
+    def _join(self, key):
+        """Devuelve (future, es_líder) del cálculo en curso para la clave"""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self._counts['followers'] += 1
+                return future, False
+            future = self._calls[key] = Future()
+            self._counts['leaders'] += 1
+            return future, True
+
+    def _finish(self, key, future, result=None, error=None):
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def _timed_out(self):
+        with self._lock:
+            self._counts['wait_timeouts'] += 1
+
+    def do(self, key, function):
+        """Ejecuta function() una sola vez para las llamadas simultáneas con la misma clave"""
+        future, leader = self._join(key)
+        if not leader:
+            try:
+                return future.result(timeout=_options().get('WAIT_TIMEOUT', 10))
+            except FutureTimeout:
+                self._timed_out()
+                return function()
+            except LeaderCancelled:
+                return function()
+        try:
+            result = function()
+        except Exception as e:
+            self._finish(key, future, error=e)
+            raise
+        except BaseException:
+            # Cancelación o interrupción: la clave nunca queda ocupada
+            self._finish(key, future, error=LeaderCancelled())
+            raise
+        self._finish(key, future, result)
+        return result
+
+    async def do_async(self, key, function):
+        """Como do() para corrutinas: function es una función async"""
+        future, leader = self._join(key)
+        if not leader:
+            try:
+                return await asyncio.wait_for(
+                    asyncio.shield(asyncio.wrap_future(future)), _options().get('WAIT_TIMEOUT', 10)
+                )
+            except asyncio.TimeoutError:
+                self._timed_out()
+                return await function()
+            except LeaderCancelled:
+                return await function()
+        try:
+            result = await function()
+        except Exception as e:
+            self._finish(key, future, error=e)
+            raise
+        except BaseException:
+            # CancelledError no es una Exception: la clave nunca queda ocupada
+            self._finish(key, future, error=LeaderCancelled())
+            raise
+        self._finish(key, future, result)
+        return result
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counts)
+
+    def reset_stats(self):
+        with self._lock:
+            self._counts = dict.fromkeys(self._counts, 0)
+
+
+flights = SingleFlight()
@@ -0,0 +1,204 @@
+"""Backend SQLite para producción (ENGINE 'homi.sqlite').
+
+Los pragmas (WAL, synchronous=NORMAL, mmap, cache_size), la espera de SQLite
+ante un candado ('timeout') y BEGIN IMMEDIATE se configuran con las OPTIONS
+estándar de Django en settings.DATABASES. Este backend agrega lo que esas
+opciones no cubren:
+
+- Reintenta con espera exponencial y jitter un "database is locked" al abrir
+  una transacción o en una sentencia fuera de transacción: en ambos casos no
+  se ejecutó nada y repetir es seguro. Dentro de una transacción no se
+  reintenta (con BEGIN IMMEDIATE el candado se toma al empezar). Cada intento
+  ya espera el 'timeout' de SQLite, así que HOMI_SQLITE['MAX_WAIT'] acota la
+  espera total y no sólo la de los reintentos.
+- Con HOMI_SQLITE['WRITER_QUEUE'] las escrituras del proceso esperan su turno
+  en una cola FIFO en lugar de competir por el candado de SQLite. Una
+  transacción conserva el turno hasta confirmarse o deshacerse. Hay una cola
+  por archivo de base: los shards (homi.shards) no se esperan entre sí.
+"""
+import random
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db.backends.sqlite3 import base as sqlite3_base
+
+Database = sqlite3_base.Database
+
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+def _options():
+    return getattr(settings, 'HOMI_SQLITE', {})
+
+
+class Counters:
+    """Contadores del proceso: reintentos y reintentos agotados"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def increment(self, field):
+        with self._lock:
+            self._values[field] += 1
+
+    def reset(self):
+        with self._lock:
+            self._values = {'lock_retries': 0, 'lock_failures': 0, 'queue_timeouts': 0}
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+
+counters = Counters()
+
+
+def backoff(attempt):
+    """Segundos de espera antes del reintento attempt (desde 0): exponencial con jitter completo"""
+    options = _options()
+    ceiling = min(options.get('BACKOFF_MAX', 0.5), options.get('BACKOFF_BASE', 0.01) * 2 ** attempt)
+    return random.uniform(0, ceiling)
+
+
+def _is_locked(error):
+    return 'locked' in str(error)
+
+
+class WriterQueue:
+    """Candado FIFO con espera acotada para las escrituras del proceso"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._busy = False
+        self._waiters = deque()
+
+    def acquire(self, timeout):
+        with self._lock:
+            if not self._busy:
+                self._busy = True
+                return True
+            turn = threading.Event()
+            self._waiters.append(turn)
+        if turn.wait(timeout):
+            return True
+        with self._lock:
+            try:
+                self._waiters.remove(turn)
+            except ValueError:
+                # El turno llegó justo al vencer la espera
+                return True
+            return False
+
+    def release(self):
+        with self._lock:
+            if self._waiters:
+                # El turno pasa directamente al siguiente en la cola
+                self._waiters.popleft().set()
+            else:
+                self._busy = False
+
+
+_queues_lock = threading.Lock()
+_queues = {}
+
+
+def writer_queue(name):
+    """Cola de escrituras del archivo de base name (una por archivo)"""
+    with _queues_lock:
+        queue = _queues.get(name)
+        if queue is None:
+            queue = _queues[name] = WriterQueue()
+        return queue
+
+
+class CursorWrapper(sqlite3_base.SQLiteCursorWrapper):
+    def execute(self, query, params=None):
+        return self._run(super().execute, query, params)
+
+    def executemany(self, query, param_list):
+        return self._run(super().executemany, query, param_list)
+
+    def _run(self, method, query, params):
+        if self.connection.in_transaction or self.connection.isolation_level is not None:
+            # Dentro de una transacción repetir una sentencia no es seguro
+            return method(query, params)
+
+        keyword = query.lstrip()[:7].upper()
+        begins = keyword.startswith('BEGIN')
+        took_turn = (begins or keyword.startswith(WRITE_STATEMENTS)) and self.database.wait_writer_turn()
+        try:
+            result = self._retry(method, query, params)
+        except BaseException:
+            if took_turn:
+                self.database.release_writer_turn()
+            raise
+        if took_turn and not begins:
+            self.database.release_writer_turn()
+        return result
+
+    def _retry(self, method, query, params):
+        options = _options()
+        retries = options.get('RETRIES', 5)
+        deadline = time.monotonic() + options.get('MAX_WAIT', 5)
+        attempt = 0
+        while True:
+            try:
+                return method(query, params)
+            except Database.OperationalError as e:
+                if not _is_locked(e):
+                    raise
+                delay = backoff(attempt)
+                if attempt >= retries or time.monotonic() + delay >= deadline:
+                    counters.increment('lock_failures')
+                    raise
+            counters.increment('lock_retries')
+            time.sleep(delay)
+            attempt += 1
+
+
+class DatabaseWrapper(sqlite3_base.DatabaseWrapper):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._writer_turn = False
+
+    def create_cursor(self, name=None):
+        cursor = self.connection.cursor(factory=CursorWrapper)
+        cursor.database = self
+        return cursor
+
+    def wait_writer_turn(self):
+        """Espera el turno de escritura; False si la cola está apagada o no llegó a tiempo"""
+        if not _options().get('WRITER_QUEUE', False) or self._writer_turn:
+            return False
+        queue = writer_queue(str(self.settings_dict['NAME']))
+        self._writer_turn = queue.acquire(_options().get('WRITER_QUEUE_TIMEOUT', 30))
+        if not self._writer_turn:
+            # Sigue sin turno: queda la espera de SQLite y los reintentos
+            counters.increment('queue_timeouts')
+        return self._writer_turn
+
+    def release_writer_turn(self):
+        if self._writer_turn:
+            self._writer_turn = False
+            writer_queue(str(self.settings_dict['NAME'])).release()
+
+    def _commit(self):
+        try:
+            return super()._commit()
+        finally:
+            self.release_writer_turn()
+
+    def _rollback(self):
+        try:
+            return super()._rollback()
+        finally:
+            self.release_writer_turn()
+
+    def _close(self):
+        try:
+            return super()._close()
+        finally:
+            self.release_writer_turn()
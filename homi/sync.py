@@ -0,0 +1,169 @@
+"""Sincronización incremental para clientes sin conexión (sync/).
+
+Cada escritura sobre noticias, tareas, gastos, pagos, gastos personales o
+miembros agrega una fila a HouseholdChange en la misma transacción (señales en
+signals.py y llamadas explícitas en los caminos masivos). sync/?since=<cursor>
+devuelve lo ocurrido desde el cursor en un solo sobre: por entidad, las filas
+creadas o modificadas con su estado actual y los ids eliminados (lápidas).
+
+Los cambios repetidos sobre una misma fila se entregan una sola vez con su
+estado final, y una fila registrada como modificada que ya no existe se
+entrega como eliminada. El cursor es opaco (JSON en base64) y guarda el último
+cambio entregado y su fecha: los cambios se conservan HOMI_SYNC['RETENTION_DAYS']
+días (prune_household_changes), así que un cursor más antiguo recibe reset y el
+cliente vuelve a descargar los listados. El cursor también guarda cuándo se
+movió la casa a otro shard por última vez (shards.py): los ids del registro y
+de las filas cambian con el movimiento, así que un cursor anterior recibe reset.
+"""
+import base64
+import binascii
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import CollectionVersion, Expense, HouseholdChange, News, PersonalExpense, Task
+from .serializers import (
+    ExpenseSerializer, HouseholdMemberSerializer, NewsSerializer, PersonalExpenseSerializer, TaskSerializer
+)
+
+
+class InvalidCursor(ValueError):
+    """since inválido"""
+
+
+def _options():
+    return getattr(settings, 'HOMI_SYNC', {})
+
+
+def retention():
+    return timedelta(days=_options().get('RETENTION_DAYS', 30))
+
+
+def encode_cursor(change_id, issued_at, moved=None):
+    payload = {'i': change_id, 't': int(issued_at.timestamp())}
+    if moved is not None:
+        payload['m'] = moved
+    payload = json.dumps(payload, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        change_id, issued = int(payload['i']), int(payload['t'])
+        moved = int(payload['m']) if payload.get('m') is not None else None
+    except (binascii.Error, ValueError, TypeError, KeyError, AttributeError):
+        raise InvalidCursor('Cursor inválido')
+    return change_id, issued, moved
+
+
+def _moved(request):
+    """Momento (ms) del último movimiento de la casa a otro shard, o None"""
+    moved_at = request.shard.moved_at if request.shard is not None else None
+    return int(moved_at.timestamp() * 1000) if moved_at is not None else None
+
+
+# Estado actual de las filas modificadas, una consulta por entidad. Sin ORDER BY:
+# el cliente aplica los cambios por id y el orden por defecto obligaría a ordenar
+def _load_news(request, ids):
+    rows = News.objects.filter(household=request.household, id__in=ids).select_related('created_by').order_by()
+    return NewsSerializer(rows, many=True).data
+
+
+def _load_tasks(request, ids):
+    rows = Task.objects.filter(household=request.household, id__in=ids).select_related(
+        'created_by', 'assigned_to'
+    ).order_by()
+    return TaskSerializer(rows, many=True, context={'request': request}).data
+
+
+def _load_expenses(request, ids):
+    rows = Expense.get_household_expenses(request.household, request.user).filter(id__in=ids).order_by()
+    return ExpenseSerializer(rows, many=True, context={'request': request}).data
+
+
+def _load_personal_expenses(request, ids):
+    rows = PersonalExpense.objects.filter(household=request.household, id__in=ids).select_related('user').order_by()
+    return PersonalExpenseSerializer(rows, many=True).data
+
+
+def _load_members(request, ids):
+    return HouseholdMemberSerializer(request.household.members.filter(id__in=ids).order_by(), many=True).data
+
+
+LOADERS = {
+    CollectionVersion.NEWS: _load_news,
+    CollectionVersion.TASKS: _load_tasks,
+    CollectionVersion.EXPENSES: _load_expenses,
+    CollectionVersion.PERSONAL_EXPENSES: _load_personal_expenses,
+    CollectionVersion.MEMBERS: _load_members,
+}
+
+
+def _reset(moved):
+    """Punto de partida para un cliente sin estado: descarga los listados y sigue desde aquí"""
+    last_id = HouseholdChange.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+    return {
+        'cursor': encode_cursor(last_id, timezone.now(), moved),
+        'reset': True,
+        'has_more': False,
+        'changes': {},
+    }
+
+
+def changes_since(request, cursor):
+    """Cambios de la casa posteriores al cursor, compactados por entidad"""
+    moved = _moved(request)
+    if not cursor:
+        return _reset(moved)
+    since, issued, cursor_moved = decode_cursor(cursor)
+    now = timezone.now()
+    if issued < (now - retention()).timestamp():
+        # Pudieron podarse cambios que el cliente no recibió
+        return _reset(moved)
+    if cursor_moved != moved:
+        # La casa cambió de shard después de emitir el cursor
+        return _reset(moved)
+
+    limit = _options().get('MAX_CHANGES', 500)
+    rows = list(
+        HouseholdChange.objects.filter(household=request.household, id__gt=since)
+        .order_by('id').values_list('id', 'entity', 'object_id', 'operation', 'created_at')[:limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    # Sólo cuenta la última operación de cada fila
+    latest = {}
+    for _, entity, object_id, operation, _ in rows:
+        latest[(entity, object_id)] = operation
+
+    upserted_ids, deleted_ids = {}, {}
+    for (entity, object_id), operation in latest.items():
+        target = deleted_ids if operation == HouseholdChange.DELETE else upserted_ids
+        target.setdefault(entity, []).append(object_id)
+
+    changes = {}
+    for entity, loader in LOADERS.items():
+        ids = upserted_ids.get(entity, [])
+        upserted = loader(request, ids) if ids else []
+        found = {row['id'] for row in upserted}
+        deleted = deleted_ids.get(entity, []) + [object_id for object_id in ids if object_id not in found]
+        if upserted or deleted:
+            changes[entity] = {'upserted': upserted, 'deleted': sorted(deleted)}
+
+    if has_more:
+        # Los cambios pendientes son posteriores al último entregado
+        next_cursor = encode_cursor(rows[-1][0], rows[-1][4], moved)
+    else:
+        next_cursor = encode_cursor(rows[-1][0] if rows else since, now, moved)
+    return {
+        'cursor': next_cursor,
+        'reset': False,
+        'has_more': has_more,
+        'changes': changes,
+    }
@@ -1,3 +1,1617 @@
-from django.test import TestCase
+import asyncio
+import base64
+import json
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.db.models import Count, Sum
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from . import metrics, routers, shards, versions
+from .archiving import JOB_LOCK, archive_month, archive_month_locked, previous_month, start_archive_job
+from .authentication import ACCESS_TOKEN_SALT, issue_access_token
+from .codes import CODE_ALPHABET, CODE_LENGTH, CODE_SPACE, code_for, permute
+from .events import broker
+from .models import (
+    CollectionVersion, Expense, ExpensePayment, Household, HouseholdChange, HouseholdCodeSequence, HouseholdShard,
+    JobLock, News, PersonalExpense, PersonalExpenseRollup, ShardIdSequence, Task, UserProfile,
+)
+from .pagination import NEWS_ORDERING, NEXT_CURSOR_HEADER
+from .serializers import ExpenseSerializer
+from .sqlite.base import counters as sqlite_counters
+from .sync import encode_cursor as encode_sync_cursor
+from .singleflight import SingleFlight
+
+
+class Abort(BaseException):
+    """Interrupción que no es una Exception, como CancelledError o KeyboardInterrupt"""
+
+
+@override_settings(HOMI_SINGLEFLIGHT={'ENABLED': True, 'WAIT_TIMEOUT': 5})
+class SingleFlightTests(SimpleTestCase):
+    def test_cancelled_async_leader_releases_key_and_wakes_followers(self):
+        flights = SingleFlight()
+
+        async def scenario():
+            started = asyncio.Event()
+
+            async def slow():
+                started.set()
+                await asyncio.sleep(60)
+                return 'lento'
+
+            async def fast():
+                return 'rápido'
+
+            leader = asyncio.create_task(flights.do_async('clave', slow))
+            await started.wait()
+            follower = asyncio.create_task(flights.do_async('clave', fast))
+            await asyncio.sleep(0)
+            leader.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await leader
+            # El que esperaba no espera WAIT_TIMEOUT: calcula en cuanto se cancela el líder
+            self.assertEqual(await asyncio.wait_for(follower, 1), 'rápido')
+            self.assertEqual(flights.in_flight(), 0)
+            self.assertEqual(await flights.do_async('clave', fast), 'rápido')
+
+        asyncio.run(scenario())
+        self.assertEqual(flights.stats()['wait_timeouts'], 0)
+
+    @override_settings(HOMI_SINGLEFLIGHT={'WAIT_TIMEOUT': 0.05})
+    def test_cancelled_or_timed_out_async_follower_does_not_break_leader(self):
+        flights = SingleFlight()
+
+        async def scenario():
+            started = asyncio.Event()
+            release = asyncio.Event()
+
+            async def slow():
+                started.set()
+                await release.wait()
+                return 'líder'
+
+            async def own():
+                return 'propio'
+
+            leader = asyncio.create_task(flights.do_async('clave', slow))
+            await started.wait()
+            cancelled = asyncio.create_task(flights.do_async('clave', own))
+            await asyncio.sleep(0)
+            cancelled.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await cancelled
+            # Agota WAIT_TIMEOUT mientras el líder sigue calculando
+            self.assertEqual(await flights.do_async('clave', own), 'propio')
+            waiting = asyncio.create_task(flights.do_async('clave', own))
+            await asyncio.sleep(0)
+            release.set()
+            self.assertEqual(await leader, 'líder')
+            self.assertEqual(await waiting, 'líder')
+            self.assertEqual(flights.in_flight(), 0)
+
+        asyncio.run(scenario())
+        self.assertEqual(flights.stats()['wait_timeouts'], 1)
+
+    def test_interrupted_sync_leader_releases_key_and_wakes_followers(self):
+        flights = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        results = {}
+
+        def interrupted():
+            started.set()
+            release.wait(5)
+            raise Abort()
+
+        def lead():
+            try:
+                flights.do('clave', interrupted)
+            except Abort:
+                results['leader'] = 'abortado'
+
+        def follow():
+            results['follower'] = flights.do('clave', lambda: 'propio')
+
+        leader = threading.Thread(target=lead)
+        leader.start()
+        started.wait(5)
+        follower = threading.Thread(target=follow)
+        follower.start()
+        release.set()
+        leader.join(5)
+        follower.join(1)
+
+        self.assertEqual(results, {'leader': 'abortado', 'follower': 'propio'})
+        self.assertEqual(flights.in_flight(), 0)
+        self.assertEqual(flights.stats()['wait_timeouts'], 0)
+
+
+class HouseholdFixture:
+    """Casa con miembros y un cliente de la API autenticado para cada uno"""
+
+    members = 2
+
+    def setUp(self):
+        self.users = [User.objects.create_user(f'miembro{index}', password='clave-123') for index in range(self.members)]
+        self.household = Household.objects.create(name='Casa', created_by=self.users[0])
+        self.household.members.add(*self.users)
+        for user in self.users:
+            user.profile.current_household = self.household
+            user.profile.save()
+        self.household.refresh_from_db()
+        self.clients = []
+        for user in self.users:
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.get(user=user).key}')
+            self.clients.append(client)
+
+    def seed(self, rows):
+        """rows noticias, tareas y gastos de la casa repartidos entre los miembros, cada gasto
+        pagado por su creador, y rows gastos personales del mes para cada miembro"""
+        now = timezone.now()
+        for index in range(rows):
+            user = self.users[index % len(self.users)]
+            News.objects.create(
+                title=f'Noticia {index}', content='...', household=self.household,
+                created_by=user, expiry_date=now + timedelta(days=7)
+            )
+            Task.objects.create(
+                title=f'Tarea {index}', description='...', household=self.household, created_by=user,
+                assigned_to=self.users[(index + 1) % len(self.users)], due_datetime=now + timedelta(days=index + 1)
+            )
+            expense = Expense.objects.create(
+                title=f'Gasto {index}', description='...', household=self.household,
+                created_by=user, total_cost=Decimal('100.00')
+            )
+            ExpensePayment.objects.create(expense=expense, user=user, amount_paid=expense.unit_cost)
+        for user in self.users:
+            for index in range(rows):
+                PersonalExpense.objects.create(
+                    title=f'Gasto personal {index}', description='...', cost=Decimal('10.00'),
+                    user=user, household=self.household
+                )
+
+
+class ApiTestCase(HouseholdFixture, TestCase):
+    pass
+
+
+class SignedTokenTests(ApiTestCase):
+    """Tokens de acceso firmados (token_mode=signed)"""
+
+    def login(self, **extra):
+        client = APIClient()
+        return client.post('/api/login/', {'username': 'miembro0', 'password': 'clave-123', **extra}, format='json')
+
+    def bearer(self, access_token):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {access_token}')
+        return client.get('/api/current-household-info/')
+
+    def test_login_issues_access_token_only_on_request(self):
+        self.assertNotIn('access_token', self.login().data)
+
+        data = self.login(token_mode='signed').data
+        self.assertEqual(data['refresh_token'], data['token'])
+        self.assertEqual(data['access_expires_in'], settings.HOMI_ACCESS_TOKEN_LIFETIME)
+        self.assertEqual(signing.loads(data['access_token'], salt=ACCESS_TOKEN_SALT), {'uid': self.users[0].pk})
+        response = self.bearer(data['access_token'])
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['is_creator'])
+
+    def test_refresh_issues_new_access_token(self):
+        refresh_token = Token.objects.get(user=self.users[1]).key
+        response = APIClient().post('/api/token/refresh/', {'refresh_token': refresh_token}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(self.bearer(response.data['access_token']).data['is_creator'])
+
+        response = APIClient().post('/api/token/refresh/', {'refresh_token': 'no-existe'}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_expired_access_token_is_rejected(self):
+        issued = time.time() - settings.HOMI_ACCESS_TOKEN_LIFETIME - 1
+        with mock.patch('django.core.signing.time.time', return_value=issued):
+            access_token = issue_access_token(self.users[0])
+        response = self.bearer(access_token)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.data['detail'], 'El token de acceso ha expirado')
+
+    def test_tampered_access_token_is_rejected(self):
+        access_token = issue_access_token(self.users[0])
+        payload, signature = access_token.rsplit(':', 1)
+        forged = signing.dumps({'uid': self.users[1].pk}, salt=ACCESS_TOKEN_SALT).rsplit(':', 1)[0]
+        for tampered in (payload + ':' + signature[::-1], forged + ':' + signature):
+            with self.subTest(tampered=tampered):
+                response = self.bearer(tampered)
+                self.assertEqual(response.status_code, 401)
+                self.assertEqual(response.data['detail'], 'Token de acceso inválido')
+
+
+class HouseholdMovingTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.expense = PersonalExpense.objects.create(
+            title='Café', description='...', cost=Decimal('2.50'), user=self.users[0], household=self.household
+        )
+        HouseholdShard.objects.filter(pk=self.household.pk).update(moving=True)
+
+    def test_household_shard_views_reject_writes_while_moving(self):
+        response = self.clients[0].delete(f'/api/delete-personal-expense/{self.expense.pk}/')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '5')
+        self.assertTrue(PersonalExpense.objects.filter(pk=self.expense.pk).exists())
+
+        response = self.clients[0].post('/api/batch/', {'requests': [
+            {'method': 'DELETE', 'path': f'/api/delete-personal-expense/{self.expense.pk}/'},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 503)
+        self.assertTrue(PersonalExpense.objects.filter(pk=self.expense.pk).exists())
+
+    def test_reads_still_served_while_moving(self):
+        self.assertEqual(self.clients[0].get('/api/personal-expenses/').status_code, 200)
+
+
+class StaleAuthCacheTests(ApiTestCase):
+    """Cambios hechos por otro proceso: update() no envía las señales que invalidan la caché local"""
+
+    members = 3
+
+    def test_removed_member_loses_access_despite_cached_profile(self):
+        self.assertEqual(self.clients[1].get('/api/household-news/').status_code, 200)
+        UserProfile.objects.filter(user=self.users[1]).update(current_household=None)
+        self.household.members.through.objects.filter(user=self.users[1]).delete()
+
+        response = self.clients[1].get('/api/household-news/')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'No tienes una casa asignada')
+
+    def test_expense_split_uses_current_member_count(self):
+        self.assertEqual(self.clients[0].get('/api/household-expenses/').status_code, 200)
+        Household.objects.filter(pk=self.household.pk).update(member_count=2)
+
+        response = self.clients[0].post('/api/create-expense/', {
+            'title': 'Luz', 'description': '...', 'total_cost': '90.00'
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Expense.objects.get(title='Luz').unit_cost, Decimal('45.00'))
+
+
+@override_settings(HOMI_RESPONSE_CACHE={'ENABLED': False})
+class HouseholdContextQueryTests(ApiTestCase):
+    """Consultas por petición con la caché de autenticación caliente, sin la de respuestas"""
+
+    members = 3
+
+    # Perfil, casa y creador en un select_related (household_required) más lo de cada vista
+    EXPECTED_QUERIES = {
+        '/api/current-household-info/': 2,
+        '/api/household-members/': 2,
+        '/api/household-news/': 3,
+        '/api/household-tasks/': 3,
+        '/api/household-expenses/': 4,
+        '/api/personal-expenses/': 5,
+        '/api/dashboard/': 5,
+    }
+
+    def assert_query_counts(self):
+        client = self.clients[1]
+        for url, expected in self.EXPECTED_QUERIES.items():
+            with self.subTest(url=url):
+                client.get(url)  # calentar la caché de autenticación
+                with self.assertNumQueries(expected):
+                    self.assertEqual(client.get(url).status_code, 200)
+
+    def test_query_counts_per_endpoint(self):
+        self.seed(3)
+        self.assert_query_counts()
+
+    def test_query_counts_do_not_grow_with_rows(self):
+        self.seed(30)
+        self.assert_query_counts()
+
+
+class MemberCountTests(TestCase):
+    """member_count sigue a household.members y a user.households en add/remove/clear"""
+
+    def setUp(self):
+        self.users = [User.objects.create_user(f'miembro{index}') for index in range(3)]
+        self.houses = [Household.objects.create(name=f'Casa {index}', created_by=self.users[0]) for index in range(2)]
+
+    def assert_counts(self, *expected):
+        stored = dict(Household.objects.values_list('pk', 'member_count'))
+        actual = {house.pk: house.members.count() for house in self.houses}
+        self.assertEqual(stored, actual)
+        self.assertEqual([stored[house.pk] for house in self.houses], list(expected))
+
+    def test_forward(self):
+        house = self.houses[0]
+        house.members.add(*self.users)
+        self.assertEqual(house.member_count, 3)
+        self.assert_counts(3, 0)
+        house.members.remove(self.users[0])
+        self.assertEqual(house.member_count, 2)
+        self.assert_counts(2, 0)
+        house.members.clear()
+        self.assertEqual(house.member_count, 0)
+        self.assert_counts(0, 0)
+
+    def test_reverse(self):
+        user = self.users[0]
+        user.households.add(*self.houses)
+        self.assert_counts(1, 1)
+        self.users[1].households.add(self.houses[1])
+        self.assert_counts(1, 2)
+        user.households.remove(self.houses[1])
+        self.assert_counts(1, 1)
+        self.users[1].households.clear()
+        self.assert_counts(1, 0)
+        user.households.clear()
+        self.assert_counts(0, 0)
+
+
+class DashboardTests(ApiTestCase):
+    """dashboard/: contadores del usuario en un número fijo de consultas"""
+
+    def test_counts_and_totals(self):
+        now = timezone.now()
+        me, other = self.users
+        for priority, expiry in (('urgent', 1), ('urgent', -1), ('normal', 1)):
+            News.objects.create(
+                title='Aviso', content='...', household=self.household, created_by=other,
+                priority=priority, expiry_date=now + timedelta(days=expiry)
+            )
+        tasks = {}
+        for name, assigned_to, due, completed in (
+            ('Mañana', me, 1, False), ('Ayer', me, -1, False), ('Hecha', me, -2, True), ('Ajena', other, 1, False)
+        ):
+            tasks[name] = Task.objects.create(
+                title=name, description='...', household=self.household, created_by=other,
+                assigned_to=assigned_to, due_datetime=now + timedelta(days=due), is_completed=completed
+            )
+        for total, paid_by_me in ((Decimal('60.00'), False), (Decimal('25.00'), False), (Decimal('40.00'), True)):
+            expense = Expense.objects.create(
+                title='Gasto', description='...', household=self.household, created_by=other, total_cost=total
+            )
+            if paid_by_me:
+                ExpensePayment.objects.create(expense=expense, user=me, amount_paid=expense.unit_cost)
+        for user, cost in ((me, Decimal('10.00')), (me, Decimal('5.50')), (other, Decimal('99.00'))):
+            PersonalExpense.objects.create(
+                title='Café', description='...', cost=cost, user=user, household=self.household
+            )
+
+        client = self.clients[0]
+        client.get('/api/user-profile/')  # calentar la caché de autenticación
+        # Perfil y casa, versiones para el ETag, contadores, miembros y próximas tareas
+        with self.assertNumQueries(5):
+            response = client.get('/api/dashboard/')
+        self.assertEqual(response.status_code, 200)
+        data = response.data
+
+        self.assertTrue(data['household']['is_creator'])
+        self.assertEqual(data['household']['creator_username'], 'miembro0')
+        self.assertEqual(
+            sorted((member['username'], member['is_current_user']) for member in data['members']),
+            [('miembro0', True), ('miembro1', False)]
+        )
+        self.assertEqual(data['news'], {'urgent_count': 1})
+        self.assertEqual((data['tasks']['open_count'], data['tasks']['overdue_count']), (2, 1))
+        self.assertEqual(
+            [(task['id'], task['is_overdue']) for task in data['tasks']['upcoming']],
+            [(tasks['Ayer'].pk, True), (tasks['Mañana'].pk, False)]
+        )
+        self.assertEqual(data['expenses'], {'owed_count': 2, 'owed_total': Decimal('42.50')})
+        self.assertEqual(data['personal_expenses'], {
+            'month': now.month, 'year': now.year, 'monthly_total': Decimal('15.50'), 'expense_count': 2
+        })
+
+
+class HouseholdCodeTests(SimpleTestCase):
+    def test_codes_are_unique_and_use_the_alphabet(self):
+        codes = {code_for(value) for value in range(1, 100001)}
+        self.assertEqual(len(codes), 100000)
+        for code in list(codes)[:1000]:
+            self.assertEqual(len(code), CODE_LENGTH)
+            self.assertTrue(set(code) <= set(CODE_ALPHABET))
+
+    def test_permutation_is_bounded(self):
+        self.assertLess(permute(CODE_SPACE - 1), CODE_SPACE)
+        with self.assertRaises(ValueError):
+            permute(CODE_SPACE)
+
+
+class HouseholdCodeAllocationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('creador', password='clave-123')
+
+    def test_allocation_runs_no_existence_queries(self):
+        Household.objects.create(name='Primera', created_by=self.user)
+        with CaptureQueriesContext(connection) as first:
+            Household.objects.create(name='Casa 0', created_by=self.user)
+        for index in range(1, 200):
+            with CaptureQueriesContext(connection) as queries:
+                Household.objects.create(name=f'Casa {index}', created_by=self.user)
+            # Costo constante: no crece con las casas que ya existen
+            self.assertEqual(len(queries), len(first))
+        for query in first.captured_queries:
+            self.assertNotIn('"code" =', query['sql'])
+        self.assertEqual(Household.objects.values('code').distinct().count(), 201)
+
+    def test_skips_code_taken_before_the_sequence(self):
+        # Un código aleatorio de antes del contador que coincide con el siguiente
+        taken = code_for(HouseholdCodeSequence.next_value() + 1)
+        Household.objects.create(name='Antigua', created_by=self.user, code=taken)
+        household = Household.objects.create(name='Nueva', created_by=self.user)
+        self.assertNotEqual(household.code, taken)
+
+
+@override_settings(HOMI_RESPONSE_CACHE={'ENABLED': False})
+class ExpenseListingQueryTests(ApiTestCase):
+    """El listado de gastos no hace consultas por gasto, por pago ni por usuario"""
+
+    members = 3
+
+    def seed_expenses(self, count):
+        expenses = Expense.objects.bulk_create([
+            Expense(
+                title=f'Gasto {index}', description='...', household=self.household,
+                created_by=self.users[index % len(self.users)], total_cost=Decimal('90.00'),
+                unit_cost=Decimal('30.00'), remaining_amount=Decimal('60.00')
+            )
+            for index in range(count)
+        ])
+        ExpensePayment.objects.bulk_create([
+            ExpensePayment(expense=expense, user=self.users[0], amount_paid=Decimal('30.00'))
+            for expense in expenses
+        ])
+
+    def test_constant_queries_at_any_size(self):
+        for count in (10, 100, 1000):
+            with self.subTest(count=count):
+                Expense.objects.all().delete()
+                self.seed_expenses(count)
+                # Gastos con creador y casa, y los pagos con sus usuarios
+                with self.assertNumQueries(2):
+                    data = ExpenseSerializer(
+                        Expense.get_household_expenses(self.household, self.users[1]), many=True
+                    ).data
+                self.assertEqual(len(data), count)
+                self.assertEqual(len(data[0]['payments']), 1)
+                self.assertFalse(data[0]['user_has_paid'])
+
+                self.clients[0].get('/api/user-profile/')
+                with self.assertNumQueries(4):
+                    response = self.clients[0].get('/api/household-expenses/?limit=200')
+                self.assertEqual(len(response.data['results']), min(count, 200))
+                self.assertTrue(response.data['results'][0]['user_has_paid'])
+
+
+@override_settings(
+    HOMI_RESPONSE_CACHE={'ENABLED': False},
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+)
+class PersonalExpenseSummaryQueryTests(ApiTestCase):
+    """El resumen mensual de gastos personales no hace consultas por miembro"""
+
+    def add_members(self, total):
+        for index in range(len(self.users), total):
+            user = User.objects.create_user(f'miembro{index}', password='clave-123')
+            self.household.members.add(user)
+            self.users.append(user)
+            PersonalExpense.objects.create(
+                title='Café', description='...', cost=Decimal('2.50'), user=user, household=self.household
+            )
+
+    def test_constant_queries_for_any_household_size(self):
+        for total in (2, 20, 200):
+            with self.subTest(members=total):
+                self.add_members(total)
+                self.clients[0].get('/api/user-profile/')
+                # Contexto, versiones, miembros, acumulados y la página del mes
+                with self.assertNumQueries(5):
+                    response = self.clients[0].get('/api/personal-expenses/')
+                summary = response.data['members_summary']
+                self.assertEqual(len(summary), total)
+                # Los dos primeros miembros no tienen gastos
+                self.assertEqual(response.data['household_total'], Decimal('2.50') * (total - 2))
+                self.assertEqual(sum(member['expense_count'] for member in summary), total - 2)
+
+
+@override_settings(HOMI_RESPONSE_CACHE={'ENABLED': False})
+class QueryPlanTests(ApiTestCase):
+    """Las consultas calientes usan índices: ni SCAN de una tabla ni B-tree temporal para ordenar"""
+
+    members = 3
+    LIST_URLS = [
+        '/api/household-news/',
+        '/api/household-tasks/',
+        '/api/household-expenses/',
+        '/api/personal-expenses/',
+    ]
+    OTHER_URLS = [
+        '/api/household-members/',
+        '/api/current-household-info/',
+        '/api/dashboard/',
+        '/api/sync/',
+    ]
+
+    def setUp(self):
+        super().setUp()
+        self.seed(20)
+        # Vencimientos repetidos para que el cursor de tareas use las columnas de desempate
+        for index, task in enumerate(Task.objects.all()):
+            Task.objects.filter(pk=task.pk).update(due_datetime=task.due_datetime + timedelta(hours=index % 3))
+        self.clients[0].get('/api/user-profile/')
+
+    def bad_steps(self, job):
+        """Pasos de los planes de las sentencias que ejecuta job con SCAN o B-tree temporal"""
+        statements = []
+
+        def record(execute, sql, params, many, context):
+            statements.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(record):
+            job()
+        bad = []
+        for sql, params in statements:
+            if sql.lstrip().split(None, 1)[0].upper() not in ('SELECT', 'UPDATE', 'DELETE'):
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+                for row in cursor.fetchall():
+                    step = row[-1]
+                    if (step.startswith('SCAN ') and step != 'SCAN CONSTANT ROW') or 'TEMP B-TREE' in step:
+                        bad.append(f'{step}: {sql}')
+        return bad
+
+    def test_list_pages_use_indexes(self):
+        client = self.clients[0]
+        for url in self.LIST_URLS:
+            with self.subTest(url=url):
+                self.assertEqual(self.bad_steps(lambda: client.get(url, {'limit': 5})), [])
+                cursor = client.get(url, {'limit': 5}).data['next_cursor']
+                self.assertEqual(self.bad_steps(lambda: client.get(url, {'limit': 5, 'cursor': cursor})), [])
+
+    def test_other_reads_use_indexes(self):
+        for url in self.OTHER_URLS:
+            with self.subTest(url=url):
+                self.assertEqual(self.bad_steps(lambda: self.clients[0].get(url)), [])
+
+    def test_month_archive_uses_indexes(self):
+        year, month = previous_month()
+        for index in range(20):
+            PersonalExpense.objects.create(
+                title=f'Mes anterior {index}', description='...', cost=Decimal('5.00'),
+                user=self.users[index % len(self.users)], household=self.household, year=year, month=month
+            )
+        with tempfile.TemporaryDirectory(prefix='homi-plans-') as directory:
+            bad = self.bad_steps(lambda: archive_month(year, month, base_dir=directory, batch_size=5))
+        self.assertEqual(bad, [])
+        self.assertFalse(PersonalExpense.objects.filter(year=year, month=month).exists())
+
+
+class PayExpenseTests(ApiTestCase):
+    members = 3
+
+    def setUp(self):
+        super().setUp()
+        self.expense = Expense.objects.create(
+            title='Internet', description='...', household=self.household, created_by=self.users[0],
+            total_cost=Decimal('90.00'), expense_type='permanent'
+        )
+
+    def pay(self, member):
+        return self.clients[member].post(f'/api/pay-expense/{self.expense.pk}/')
+
+    def test_already_paid_comes_before_fully_paid(self):
+        for member in range(self.members):
+            self.assertEqual(self.pay(member).status_code, 200)
+        self.expense.refresh_from_db()
+        self.assertTrue(self.expense.is_fully_paid())
+
+        response = self.pay(0)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'Ya has pagado este gasto')
+
+    def test_fully_paid_for_member_who_has_not_paid(self):
+        self.assertEqual(self.pay(0).status_code, 200)
+        Expense.objects.filter(pk=self.expense.pk).update(remaining_amount=0)
+
+        response = self.pay(1)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'Este gasto ya está completamente pagado')
+        self.assertFalse(ExpensePayment.objects.filter(expense=self.expense, user=self.users[1]).exists())
+
+    def test_expense_of_another_household_is_not_found(self):
+        other = Household.objects.create(name='Otra', created_by=self.users[0])
+        Expense.objects.filter(pk=self.expense.pk).update(household=other)
+        self.assertEqual(self.pay(1).status_code, 404)
+
+
+class PayExpensesTests(ApiTestCase):
+    """Pago de varios gastos en una sola llamada (pay-expenses/)"""
+
+    def expense(self, title, expense_type='unique', household=None):
+        return Expense.objects.create(
+            title=title, description='...', household=household or self.household, created_by=self.users[0],
+            total_cost=Decimal('60.00'), expense_type=expense_type
+        )
+
+    def pay(self, member, expense_ids):
+        return self.clients[member].post('/api/pay-expenses/', {'expense_ids': expense_ids}, format='json')
+
+    def test_rejects_ids_that_are_not_integers(self):
+        expense = self.expense('Luz')
+        for expense_ids in ([True], [expense.pk, False], [float(expense.pk)], [str(expense.pk)], [None], [], 'x', None):
+            with self.subTest(expense_ids=expense_ids):
+                response = self.pay(0, expense_ids)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('expense_ids', response.data['error'])
+        self.assertEqual(self.pay(0, list(range(1, 202))).status_code, 400)
+        self.assertFalse(ExpensePayment.objects.exists())
+
+    def test_partial_results(self):
+        unique = self.expense('Luz')
+        permanent = self.expense('Internet', 'permanent')
+        already_paid = self.expense('Agua')
+        ExpensePayment.objects.create(expense=already_paid, user=self.users[0], amount_paid=Decimal('30.00'))
+        fully_paid = self.expense('Gas', 'permanent')
+        Expense.objects.filter(pk=fully_paid.pk).update(remaining_amount=0)
+        other = Household.objects.create(name='Otra', created_by=self.users[1])
+        other.members.add(self.users[1])
+        other.refresh_from_db()
+        foreign = self.expense('Ajena', household=other)
+
+        ids = [unique.pk, permanent.pk, already_paid.pk, fully_paid.pk, foreign.pk, 999999, unique.pk]
+        response = self.pay(0, ids)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], {
+            unique.pk: 'paid', permanent.pk: 'paid', already_paid.pk: 'already_paid',
+            fully_paid.pk: 'fully_paid', foreign.pk: 'not_found', 999999: 'not_found',
+        })
+        unique.refresh_from_db()
+        self.assertEqual(unique.remaining_amount, Decimal('30.00'))
+        self.assertEqual(ExpensePayment.objects.filter(user=self.users[0]).count(), 3)
+
+    def test_updates_personal_expenses_and_rollup(self):
+        expenses = [self.expense('Luz'), self.expense('Internet', 'permanent')]
+        self.pay(0, [expense.pk for expense in expenses])
+
+        personal = PersonalExpense.objects.filter(user=self.users[0], shared_payment__isnull=False)
+        self.assertEqual(personal.count(), 2)
+        now = timezone.now()
+        rollup = PersonalExpenseRollup.objects.get(
+            household=self.household, user=self.users[0], year=now.year, month=now.month
+        )
+        self.assertEqual((rollup.total, rollup.expense_count), (Decimal('60.00'), 2))
+
+    def test_deletes_unique_expenses_once_fully_paid(self):
+        unique = self.expense('Luz')
+        permanent = self.expense('Internet', 'permanent')
+        self.assertEqual(self.pay(1, [unique.pk, permanent.pk]).data['results'], {
+            unique.pk: 'paid', permanent.pk: 'paid'
+        })
+        self.assertEqual(self.pay(0, [unique.pk, permanent.pk]).data['results'], {
+            unique.pk: 'completed', permanent.pk: 'paid'
+        })
+        self.assertFalse(Expense.objects.filter(pk=unique.pk).exists())
+        permanent.refresh_from_db()
+        self.assertTrue(permanent.is_fully_paid())
+
+    def test_conflicts_with_existing_payments(self):
+        expense = self.expense('Internet', 'permanent')
+        self.assertEqual(self.clients[0].post(f'/api/pay-expense/{expense.pk}/').status_code, 200)
+        self.assertEqual(self.pay(0, [expense.pk]).data['results'], {expense.pk: 'already_paid'})
+
+        other = self.expense('Luz', 'permanent')
+        self.assertEqual(self.pay(0, [other.pk]).data['results'], {other.pk: 'paid'})
+        response = self.clients[0].post(f'/api/pay-expense/{other.pk}/')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'Ya has pagado este gasto')
+        self.assertEqual(ExpensePayment.objects.filter(user=self.users[0]).count(), 2)
+
+
+class PersonalExpenseRollupTests(ApiTestCase):
+    """Los acumulados mensuales coinciden con SUM/COUNT de los gastos personales"""
+
+    def assert_rollups_match(self):
+        expected = {
+            (row['household_id'], row['user_id'], row['year'], row['month']): (row['total'], row['count'])
+            for row in PersonalExpense.objects.order_by().values('household_id', 'user_id', 'year', 'month').annotate(
+                total=Sum('cost'), count=Count('*')
+            )
+        }
+        rollups = {
+            (rollup.household_id, rollup.user_id, rollup.year, rollup.month): (rollup.total, rollup.expense_count)
+            for rollup in PersonalExpenseRollup.objects.all()
+        }
+        # Un mes que se quedó sin gastos conserva su fila en cero
+        self.assertEqual({key: value for key, value in rollups.items() if value != (0, 0)}, expected)
+
+    def test_rollup_follows_every_write(self):
+        client = self.clients[0]
+        created = [
+            client.post('/api/create-personal-expense/', {
+                'title': title, 'description': '...', 'cost': cost
+            }, format='json').data['id']
+            for title, cost in (('Café', '2.50'), ('Libro', '18.00'), ('Cine', '7.25'))
+        ]
+        self.assert_rollups_match()
+
+        expense = PersonalExpense.objects.get(pk=created[1])
+        expense.cost = Decimal('20.00')
+        expense.save()
+        self.assert_rollups_match()
+        year, month = previous_month()
+        expense.year, expense.month = year, month
+        expense.save()
+        self.assert_rollups_match()
+
+        self.assertEqual(client.delete(f'/api/delete-personal-expense/{created[0]}/').status_code, 200)
+        self.assert_rollups_match()
+
+        for total_cost, expense_type in (('60.00', 'unique'), ('45.00', 'permanent')):
+            shared = Expense.objects.create(
+                title='Luz', description='...', household=self.household, created_by=self.users[1],
+                total_cost=Decimal(total_cost), expense_type=expense_type
+            )
+            for member in (1, 0):
+                self.assertEqual(self.clients[member].post(f'/api/pay-expense/{shared.pk}/').status_code, 200)
+                self.assert_rollups_match()
+        self.assertEqual(PersonalExpenseRollup.objects.get(
+            user=self.users[0], year=timezone.now().year, month=timezone.now().month
+        ).expense_count, 3)
+
+
+class ConcurrentPaymentTests(HouseholdFixture, TransactionTestCase):
+    """Pagos simultáneos de todos los miembros contra un mismo gasto, con commits reales"""
+
+    members = 6
+
+    def test_concurrent_payments_keep_the_balance(self):
+        expense = Expense.objects.create(
+            title='Alquiler', description='...', household=self.household, created_by=self.users[0],
+            total_cost=Decimal('600.00'), expense_type='permanent'
+        )
+        barrier = threading.Barrier(self.members * 2)
+        statuses = []
+
+        def pay(client):
+            try:
+                barrier.wait(5)
+                # Cada miembro intenta pagar dos veces a la vez
+                statuses.append(client.post(f'/api/pay-expense/{expense.pk}/').status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=pay, args=(client,)) for client in self.clients * 2]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(30)
+
+        self.assertEqual(sorted(statuses).count(200), self.members)
+        self.assertTrue(all(code in (200, 400, 409) for code in statuses), statuses)
+        expense.refresh_from_db()
+        self.assertEqual(expense.remaining_amount, Decimal('0.00'))
+        self.assertEqual(ExpensePayment.objects.filter(expense=expense).count(), self.members)
+        self.assertEqual(
+            PersonalExpense.objects.filter(shared_payment__expense=expense).count(), self.members
+        )
+
+
+class ArchiveJobLockTests(ApiTestCase):
+    """Un solo archivado a la vez aunque lo pidan procesos distintos"""
+
+    def hold_lock(self, expires_at):
+        # Como lo dejaría otro proceso
+        JobLock.objects.create(name=JOB_LOCK, owner='otro-proceso', expires_at=expires_at)
+
+    def test_rejects_while_another_process_archives(self):
+        self.hold_lock(timezone.now() + timedelta(minutes=5))
+        year, month = previous_month()
+
+        self.assertFalse(start_archive_job(year, month))
+        self.assertIsNone(archive_month_locked(year, month))
+        response = self.clients[0].post('/api/cleanup-monthly-expenses/')
+        self.assertEqual(response.status_code, 409)
+
+    def test_takes_expired_lock_and_releases_it(self):
+        self.hold_lock(timezone.now() - timedelta(seconds=1))
+        year, month = previous_month()
+        PersonalExpense.objects.create(
+            title='Mes anterior', description='...', cost=Decimal('5.00'),
+            user=self.users[0], household=self.household, year=year, month=month
+        )
+        with tempfile.TemporaryDirectory(prefix='homi-archive-') as directory:
+            stats = archive_month_locked(year, month, base_dir=directory)
+        self.assertEqual(stats['deleted_rows'], 1)
+        self.assertFalse(JobLock.objects.exists())
+
+
+class ArchiveChangesTests(ApiTestCase):
+    """El borrado por lotes avisa a los ETag y a la sincronización como PersonalExpense.delete()"""
+
+    def test_delete_bumps_versions_and_records_tombstones(self):
+        other = Household.objects.create(name='Otra', created_by=self.users[1])
+        year, month = previous_month()
+        expenses = [
+            PersonalExpense.objects.create(
+                title='Mes anterior', description='...', cost=Decimal('5.00'),
+                user=self.users[0], household=household, year=year, month=month
+            )
+            for household in (self.household, self.household, other)
+        ]
+        before = {
+            household.pk: versions.get_versions(household.pk, [CollectionVersion.PERSONAL_EXPENSES])
+            for household in (self.household, other)
+        }
+
+        with tempfile.TemporaryDirectory(prefix='homi-archive-') as directory:
+            archive_month(year, month, base_dir=directory)
+
+        for household in (self.household, other):
+            after = versions.get_versions(household.pk, [CollectionVersion.PERSONAL_EXPENSES])
+            self.assertEqual(
+                after[CollectionVersion.PERSONAL_EXPENSES], before[household.pk][CollectionVersion.PERSONAL_EXPENSES] + 1
+            )
+        tombstones = HouseholdChange.objects.filter(
+            entity=CollectionVersion.PERSONAL_EXPENSES, operation=HouseholdChange.DELETE
+        )
+        self.assertEqual(
+            sorted(tombstones.values_list('household_id', 'object_id')),
+            sorted((expense.household_id, expense.pk) for expense in expenses)
+        )
+
+
+class CursorValidationTests(ApiTestCase):
+    def test_cursor_values_must_be_a_list(self):
+        ordering = list(NEWS_ORDERING)
+        for values in (5, 'ab', {'a': 1, 'b': 2}, None):
+            with self.subTest(values=values):
+                payload = json.dumps({'o': ordering, 'v': values}).encode()
+                cursor = base64.urlsafe_b64encode(payload).decode().rstrip('=')
+                response = self.clients[0].get('/api/household-news/', {'cursor': cursor})
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.data['error'], 'Cursor inválido')
+
+    def test_valid_cursor_returns_next_page(self):
+        self.seed(3)
+        cursor = self.clients[0].get('/api/household-news/', {'limit': 2}).data['next_cursor']
+        response = self.clients[0].get('/api/household-news/', {'limit': 2, 'cursor': cursor})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 1)
+
+
+@override_settings(HOMI_COLLECTION_VERSIONS={'CACHE_ALIAS': 'default', 'TIMEOUT': 300})
+class CachedVersionTests(ApiTestCase):
+    """Versiones en una caché compartida: sólo avanzan, nunca se borran ni se copian de la base"""
+
+    def setUp(self):
+        super().setUp()
+        caches['default'].clear()
+
+    def news_version(self):
+        return versions.get_versions(self.household.pk, [CollectionVersion.NEWS])[CollectionVersion.NEWS]
+
+    def bump_news(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            versions.bump(self.household.pk, CollectionVersion.NEWS)
+
+    def test_commit_advances_the_cached_version(self):
+        before = self.news_version()
+        self.bump_news()
+        self.assertEqual(self.news_version(), before + 1)
+
+    def test_evicted_version_does_not_repeat(self):
+        seen = {self.news_version()}
+        self.bump_news()
+        seen.add(self.news_version())
+        # Desalojada justo cuando una escritura confirma: incr no la encuentra
+        caches['default'].delete(f'homi:version:{self.household.pk}:{CollectionVersion.NEWS}')
+        self.bump_news()
+        self.assertNotIn(self.news_version(), seen)
+
+    def test_write_by_another_member_invalidates_etag(self):
+        etag = self.clients[0].get('/api/household-news/')['ETag']
+        self.assertEqual(self.clients[0].get('/api/household-news/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.clients[1].post('/api/create-news/', {
+                'title': 'Hola', 'content': '...', 'expiry_date': (timezone.now() + timedelta(days=1)).isoformat()
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        response = self.clients[0].get('/api/household-news/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 1)
+
+
+class RolledBackBatchCacheTests(HouseholdFixture, TransactionTestCase):
+    """Un lote atómico deshecho no deja respuestas ni ETags con versiones sin confirmar"""
+
+    def setUp(self):
+        super().setUp()
+        caches['default'].clear()
+
+    def news(self, title):
+        return {'title': title, 'content': '...', 'expiry_date': (timezone.now() + timedelta(days=1)).isoformat()}
+
+    def test_rolled_back_batch_then_real_write(self):
+        self.clients[0].get('/api/household-news/')
+        response = self.clients[0].post('/api/batch/', {'atomic': True, 'requests': [
+            {'method': 'POST', 'path': '/api/create-news/', 'body': self.news('Fantasma')},
+            {'method': 'GET', 'path': '/api/household-news/'},
+            {'method': 'DELETE', 'path': '/api/delete-news/999999/'},
+        ]}, format='json')
+        results = response.data['responses']
+        self.assertFalse(response.data['committed'])
+        self.assertEqual([result['status'] for result in results], [201, 200, 404])
+        self.assertEqual([news['title'] for news in results[1]['body']], ['Fantasma'])
+        self.assertNotIn('headers', results[1])
+        self.assertFalse(News.objects.exists())
+
+        # La escritura real alcanza la misma versión que tuvo el lote deshecho
+        self.assertEqual(self.clients[1].post('/api/create-news/', self.news('Real'), format='json').status_code, 201)
+        response = self.clients[0].get('/api/household-news/')
+        self.assertEqual([news['title'] for news in response.data], ['Real'])
+        etag = response['ETag']
+        self.assertEqual(self.clients[0].get('/api/household-news/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+
+@override_settings(HOMI_SQLITE={'RETRIES': 50, 'MAX_WAIT': 5, 'BACKOFF_BASE': 0.01, 'BACKOFF_MAX': 0.02})
+class SqliteRetryTests(TransactionTestCase):
+    """Reintentos de homi.sqlite ante "database is locked" y pragmas de la conexión"""
+
+    def setUp(self):
+        sqlite_counters.reset()
+        connection.ensure_connection()
+
+    def locked_after(self, failures):
+        calls = []
+
+        def method(query, params):
+            calls.append(query)
+            if len(calls) <= failures:
+                raise sqlite3.OperationalError('database is locked')
+            return 'ok'
+        return method, calls
+
+    def run_statement(self, method):
+        with connection.cursor() as cursor:
+            return cursor.cursor._run(method, 'UPDATE homi_joblock SET owner = owner', ())
+
+    def test_retries_outside_transaction(self):
+        method, calls = self.locked_after(2)
+        self.assertEqual(self.run_statement(method), 'ok')
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(sqlite_counters.snapshot()['lock_retries'], 2)
+
+    def test_no_retry_inside_transaction(self):
+        method, calls = self.locked_after(1)
+        with transaction.atomic():
+            with self.assertRaises(sqlite3.OperationalError):
+                self.run_statement(method)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sqlite_counters.snapshot()['lock_retries'], 0)
+
+    @override_settings(HOMI_SQLITE={'RETRIES': 1000, 'MAX_WAIT': 0.2, 'BACKOFF_BASE': 0.01, 'BACKOFF_MAX': 0.02})
+    def test_total_wait_is_capped(self):
+        method, calls = self.locked_after(10 ** 6)
+        started = time.monotonic()
+        with self.assertRaises(sqlite3.OperationalError):
+            self.run_statement(method)
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual(sqlite_counters.snapshot()['lock_failures'], 1)
+
+    def test_contended_begin_waits_for_the_other_writer(self):
+        blocker = sqlite3.connect(
+            connection.settings_dict['NAME'], isolation_level=None, check_same_thread=False
+        )
+        blocker.execute('BEGIN IMMEDIATE')
+        release = threading.Timer(0.2, blocker.rollback)
+        with connection.cursor() as cursor:
+            # Sin la espera de SQLite el candado ocupado se ve como error y se reintenta
+            cursor.execute('PRAGMA busy_timeout = 0')
+        try:
+            release.start()
+            with transaction.atomic():
+                JobLock.objects.create(name='prueba', owner='yo', expires_at=timezone.now())
+        finally:
+            release.join()
+            blocker.close()
+            connection.close()
+        self.assertTrue(JobLock.objects.filter(name='prueba').exists())
+        self.assertGreater(sqlite_counters.snapshot()['lock_retries'], 0)
+        self.assertEqual(sqlite_counters.snapshot()['lock_failures'], 0)
+
+    def test_wal_pragmas(self):
+        with connection.cursor() as cursor:
+            pragmas = {}
+            for name in ('journal_mode', 'synchronous', 'temp_store', 'busy_timeout'):
+                cursor.execute(f'PRAGMA {name}')
+                pragmas[name] = cursor.fetchone()[0]
+        self.assertEqual(pragmas, {'journal_mode': 'wal', 'synchronous': 1, 'temp_store': 2, 'busy_timeout': 1000})
+
+
+class SyncTests(ApiTestCase):
+    """sync/: continuidad del cursor, lápidas y cursores viejos o inválidos"""
+
+    def sync(self, since=None):
+        response = self.clients[0].get('/api/sync/', {'since': since} if since else {})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def news(self, title):
+        return News.objects.create(
+            title=title, content='...', household=self.household, created_by=self.users[0],
+            expiry_date=timezone.now() + timedelta(days=1)
+        )
+
+    def test_cursor_continues_where_the_last_sync_stopped(self):
+        first = self.sync()
+        self.assertTrue(first['reset'])
+        self.assertEqual(first['changes'], {})
+
+        news = self.news('Primera')
+        second = self.sync(first['cursor'])
+        self.assertFalse(second['reset'])
+        self.assertEqual([row['id'] for row in second['changes']['news']['upserted']], [news.pk])
+
+        task = Task.objects.create(
+            title='Barrer', description='...', household=self.household, created_by=self.users[0],
+            assigned_to=self.users[1], due_datetime=timezone.now() + timedelta(days=1)
+        )
+        third = self.sync(second['cursor'])
+        self.assertEqual(list(third['changes']), ['tasks'])
+        self.assertEqual([row['id'] for row in third['changes']['tasks']['upserted']], [task.pk])
+        self.assertEqual(self.sync(third['cursor'])['changes'], {})
+
+    @override_settings(HOMI_SYNC={'RETENTION_DAYS': 30, 'MAX_CHANGES': 2})
+    def test_pages_through_pending_changes(self):
+        cursor = self.sync()['cursor']
+        created = [self.news(f'Noticia {index}').pk for index in range(3)]
+
+        page = self.sync(cursor)
+        self.assertTrue(page['has_more'])
+        received = [row['id'] for row in page['changes']['news']['upserted']]
+        page = self.sync(page['cursor'])
+        self.assertFalse(page['has_more'])
+        received += [row['id'] for row in page['changes']['news']['upserted']]
+        self.assertEqual(sorted(received), created)
+
+    def test_deletes_are_tombstones(self):
+        kept, removed = self.news('Queda'), self.news('Se borra')
+        cursor = self.sync()['cursor']
+        removed_id = removed.pk
+        removed.delete()
+        kept.title = 'Editada'
+        kept.save()
+        # Creada y borrada entre dos sincronizaciones: sólo la lápida
+        short_lived = self.news('Efímera')
+        short_lived_id = short_lived.pk
+        short_lived.delete()
+
+        news = self.sync(cursor)['changes']['news']
+        self.assertEqual(news['deleted'], sorted([removed_id, short_lived_id]))
+        self.assertEqual([(row['id'], row['title']) for row in news['upserted']], [(kept.pk, 'Editada')])
+
+    def test_stale_cursor_resets(self):
+        self.news('Vieja')
+        stale = encode_sync_cursor(0, timezone.now() - timedelta(days=31))
+        data = self.sync(stale)
+        self.assertTrue(data['reset'])
+        self.assertEqual(data['changes'], {})
+
+    def test_invalid_cursor_is_rejected(self):
+        truncated = encode_sync_cursor(0, timezone.now())[:-3]
+        for cursor in ('no-es-base64!', base64.urlsafe_b64encode(b'[1, 2]').decode(), truncated):
+            with self.subTest(cursor=cursor):
+                response = self.clients[0].get('/api/sync/', {'since': cursor})
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.data['error'], 'Cursor inválido')
+
+
+class BatchTests(ApiTestCase):
+    """batch/: estado por operación, fallos parciales, rollback y límite de operaciones"""
+
+    def news(self, title):
+        return {'title': title, 'content': '...', 'expiry_date': (timezone.now() + timedelta(days=1)).isoformat()}
+
+    def batch(self, requests, **extra):
+        return self.clients[0].post('/api/batch/', {'requests': requests, **extra}, format='json')
+
+    def test_partial_failure_keeps_the_other_operations(self):
+        response = self.batch([
+            {'id': 'nueva', 'method': 'POST', 'path': '/api/create-news/', 'body': self.news('Queda')},
+            {'id': 'falta', 'method': 'DELETE', 'path': '/api/delete-news/999999/'},
+            {'id': 'invalida', 'method': 'POST', 'path': '/api/create-news/', 'body': {'title': ''}},
+            {'id': 'ruta', 'method': 'GET', 'path': '/api/no-existe/'},
+            {'id': 'lista', 'method': 'GET', 'path': '/api/household-news/'},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('committed', response.data)
+        statuses = {result['id']: result['status'] for result in response.data['responses']}
+        self.assertEqual(statuses, {'nueva': 201, 'falta': 404, 'invalida': 400, 'ruta': 404, 'lista': 200})
+        self.assertEqual(list(News.objects.values_list('title', flat=True)), ['Queda'])
+        self.assertEqual([news['title'] for news in response.data['responses'][4]['body']], ['Queda'])
+        self.assertIn('ETag', response.data['responses'][4]['headers'])
+
+    def test_atomic_failure_rolls_back_everything(self):
+        task = Task.objects.create(
+            title='Barrer', description='...', household=self.household, created_by=self.users[0],
+            assigned_to=self.users[0], due_datetime=timezone.now() + timedelta(days=1)
+        )
+        response = self.batch([
+            {'method': 'POST', 'path': '/api/create-news/', 'body': self.news('Deshecha')},
+            {'method': 'POST', 'path': f'/api/complete-task/{task.pk}/'},
+            {'method': 'DELETE', 'path': '/api/delete-news/999999/'},
+            {'method': 'GET', 'path': '/api/household-news/'},
+        ], atomic=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.data['committed'])
+        self.assertEqual([result['status'] for result in response.data['responses']], [201, 200, 404, 424])
+        self.assertFalse(News.objects.exists())
+        task.refresh_from_db()
+        self.assertFalse(task.is_completed)
+
+    def test_atomic_success_commits(self):
+        response = self.batch([
+            {'method': 'POST', 'path': '/api/create-news/', 'body': self.news('Una')},
+            {'method': 'POST', 'path': '/api/create-news/', 'body': self.news('Otra')},
+        ], atomic=True)
+        self.assertTrue(response.data['committed'])
+        self.assertEqual([result['status'] for result in response.data['responses']], [201, 201])
+        self.assertEqual(News.objects.count(), 2)
+
+    def test_rejects_excluded_views(self):
+        response = self.batch([{'method': 'POST', 'path': '/api/batch/', 'body': {'requests': []}}])
+        self.assertEqual(response.data['responses'][0], {
+            'id': 0, 'status': 400, 'body': {'error': 'Esta ruta no se puede usar en un lote'}
+        })
+
+    @override_settings(HOMI_BATCH={'MAX_REQUESTS': 3})
+    def test_max_requests(self):
+        read = {'method': 'GET', 'path': '/api/household-news/'}
+        self.assertEqual(self.batch([read] * 3).status_code, 200)
+        response = self.batch([read] * 4)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'Un lote admite hasta 3 operaciones')
+        self.assertEqual(self.batch([]).status_code, 400)
+
+
+class HouseholdEventsTests(ApiTestCase):
+    """Broker y stream SSE: publicación al confirmar, aislamiento por casa y desconexión"""
+
+    def setUp(self):
+        super().setUp()
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    def subscribe(self, household_id):
+        async def subscribe():
+            return broker.subscribe(household_id)
+        subscription = self.loop.run_until_complete(subscribe())
+        self.addCleanup(broker.unsubscribe, subscription)
+        return subscription
+
+    def received(self, subscription):
+        # Ejecuta las entregas pendientes (call_soon_threadsafe) y vacía la cola
+        self.loop.run_until_complete(asyncio.sleep(0))
+        messages = []
+        while not subscription.queue.empty():
+            messages.append(subscription.queue.get_nowait())
+        return [(message['type'], message.get('news_id')) for message in messages]
+
+    def news(self):
+        return News.objects.create(
+            title='Aviso', content='...', household=self.household, created_by=self.users[0],
+            expiry_date=timezone.now() + timedelta(days=1)
+        )
+
+    def test_publishes_only_after_commit(self):
+        subscription = self.subscribe(self.household.pk)
+        with self.captureOnCommitCallbacks() as callbacks:
+            news = self.news()
+        self.assertEqual(self.received(subscription), [])
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.received(subscription), [('news.created', news.pk)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.news()
+                transaction.set_rollback(True)
+        self.assertEqual(self.received(subscription), [])
+
+    def test_events_stay_in_their_household(self):
+        mine = self.subscribe(self.household.pk)
+        other = self.subscribe(self.household.pk + 1000)
+        with self.captureOnCommitCallbacks(execute=True):
+            news = self.news()
+        self.assertEqual(self.received(mine), [('news.created', news.pk)])
+        self.assertEqual(self.received(other), [])
+
+    async def test_stream_unsubscribes_on_disconnect_and_end(self):
+        key = await Token.objects.filter(user=self.users[0]).values_list('key', flat=True).aget()
+        self.assertEqual(broker.connection_count(), 0)
+
+        response = await self.async_client.get('/api/events/', headers={'Authorization': f'Token {key}'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = aiter(response.streaming_content)
+        self.assertEqual(await anext(chunks), b'retry: 5000\n\n')
+        self.assertEqual(broker.connection_count(), 1)
+        broker.publish(self.household.pk, 'news.created', news_id=7)
+        self.assertIn(b'event: news.created\n', await anext(chunks))
+
+        # El cliente se desconecta: el servidor cancela la tarea que transmite
+        reader = asyncio.create_task(anext(chunks))
+        await asyncio.sleep(0)
+        reader.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await reader
+        self.assertEqual(broker.connection_count(), 0)
+
+        response = await self.async_client.get('/api/events/', headers={'Authorization': f'Token {key}'})
+        chunks = [chunk async for chunk in self.stream_until_deleted(response)]
+        self.assertIn(b'event: household.deleted\n', chunks[-1])
+        self.assertEqual(broker.connection_count(), 0)
+
+    async def stream_until_deleted(self, response):
+        chunks = aiter(response.streaming_content)
+        yield await anext(chunks)
+        broker.publish(self.household.pk, 'household.deleted')
+        async for chunk in chunks:
+            yield chunk
+
+
+@override_settings(
+    HOMI_READ_REPLICAS={'ALIASES': ['replica'], 'STICKY_SECONDS': 5, 'CACHE_ALIAS': 'default'},
+    HOMI_RESPONSE_CACHE={'ENABLED': False},
+)
+class ReplicaRoutingTests(HouseholdFixture, TransactionTestCase):
+    """Lecturas GET en la réplica, lectura de lo propio escrito y vuelta al primario"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Réplica que lee el mismo archivo que la base de pruebas (TEST MIRROR: no se
+        # vacía aparte). Se agrega después de que el runner preparara las bases
+        replica = dict(connections['default'].settings_dict)
+        replica['TEST'] = {**replica['TEST'], 'MIRROR': 'default'}
+        connections.settings['replica'] = replica
+        cls.databases = {*cls.databases, 'replica'}
+
+    @classmethod
+    def tearDownClass(cls):
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+        cls.databases = cls.databases - {'replica'}
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        caches['default'].clear()
+        routers.counters.reset()
+        News.objects.create(
+            title='Aviso', content='...', household=self.household, created_by=self.users[0],
+            expiry_date=timezone.now() + timedelta(days=1)
+        )
+
+    def replica_queries(self, request):
+        with CaptureQueriesContext(connections['replica']) as queries:
+            response = request()
+        self.assertLess(response.status_code, 300)
+        return response, len(queries)
+
+    def test_reads_go_to_the_replica(self):
+        response, queries = self.replica_queries(lambda: self.clients[0].get('/api/household-news/'))
+        self.assertEqual([news['title'] for news in response.data], ['Aviso'])
+        self.assertGreater(queries, 0)
+        self.assertEqual(routers.counters.snapshot()['requests'], {'replica': 1, 'pinned': 0})
+
+    def test_writer_reads_from_the_primary(self):
+        _, queries = self.replica_queries(lambda: self.clients[0].post('/api/create-news/', {
+            'title': 'Nueva', 'content': '...', 'expiry_date': (timezone.now() + timedelta(days=1)).isoformat()
+        }, format='json'))
+        self.assertEqual(queries, 0)
+
+        response, queries = self.replica_queries(lambda: self.clients[0].get('/api/household-news/'))
+        self.assertEqual(queries, 0)
+        self.assertEqual(len(response.data), 2)
+        self.assertEqual(routers.counters.snapshot()['requests'], {'replica': 0, 'pinned': 1})
+
+        # Los demás miembros siguen leyendo de la réplica
+        _, queries = self.replica_queries(lambda: self.clients[1].get('/api/household-news/'))
+        self.assertGreater(queries, 0)
+
+        caches['default'].delete(routers._pin_key(self.users[0].pk))
+        _, queries = self.replica_queries(lambda: self.clients[0].get('/api/household-news/'))
+        self.assertGreater(queries, 0)
+
+    def test_reads_after_a_write_in_the_same_request_use_the_primary(self):
+        response, queries = self.replica_queries(lambda: self.clients[0].post('/api/batch/', {'requests': [
+            {'method': 'DELETE', 'path': f'/api/delete-news/{News.objects.get().pk}/'},
+            {'method': 'GET', 'path': '/api/household-news/'},
+        ]}, format='json'))
+        self.assertEqual(queries, 0)
+        self.assertEqual(response.data['responses'][1]['body'], [])
+
+    @override_settings(HOMI_READ_REPLICAS={'ALIASES': [], 'STICKY_SECONDS': 5, 'CACHE_ALIAS': 'default'})
+    def test_without_replicas_everything_uses_the_primary(self):
+        response, queries = self.replica_queries(lambda: self.clients[0].get('/api/household-news/'))
+        self.assertEqual(queries, 0)
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(routers.counters.snapshot()['requests'], {'replica': 0, 'pinned': 0})
+
+
+@override_settings(HOMI_RESPONSE_CACHE={'ENABLED': False})
+class AsyncViewParityTests(HouseholdFixture, TransactionTestCase):
+    """Con ASGI las versiones async de los listados responden lo mismo que las síncronas"""
+
+    URLS = [
+        '/api/household-news/',
+        '/api/household-news/?limit=2',
+        '/api/household-tasks/',
+        '/api/household-expenses/',
+        '/api/personal-expenses/',
+        '/api/current-household-info/',
+    ]
+
+    def setUp(self):
+        super().setUp()
+        self.seed(3)
+        self.keys = [Token.objects.get(user=user).key for user in self.users]
+
+    def get_async(self, url, member=0, **headers):
+        if member is not None:
+            headers['Authorization'] = f'Token {self.keys[member]}'
+        return async_to_sync(self.async_client.get)(url, headers=headers)
+
+    def assert_same(self, sync_response, async_response):
+        # La versión async devuelve un HttpResponse ya renderizado, sin .data de DRF
+        self.assertFalse(hasattr(async_response, 'data'))
+        self.assertEqual(async_response.status_code, sync_response.status_code)
+        self.assertEqual(
+            json.loads(async_response.content) if async_response.content else None,
+            json.loads(sync_response.content) if sync_response.content else None,
+        )
+        for header in ('ETag', NEXT_CURSOR_HEADER, 'Content-Type'):
+            self.assertEqual(async_response.get(header), sync_response.get(header), header)
+
+    def test_same_payloads_and_status_codes(self):
+        for url in self.URLS:
+            with self.subTest(url=url):
+                sync_response = self.clients[0].get(url)
+                self.assertEqual(sync_response.status_code, 200)
+                self.assert_same(sync_response, self.get_async(url))
+
+                etag = sync_response.get('ETag')
+                if etag is not None:
+                    not_modified = self.get_async(url, **{'If-None-Match': etag})
+                    self.assertEqual(not_modified.status_code, 304)
+                    self.assert_same(self.clients[0].get(url, HTTP_IF_NONE_MATCH=etag), not_modified)
+
+    def test_same_errors(self):
+        invalid_cursor = '/api/household-news/?cursor=no-es-un-cursor'
+        self.assert_same(self.clients[0].get(invalid_cursor), self.get_async(invalid_cursor))
+
+        self.assert_same(APIClient().get('/api/household-tasks/'), self.get_async('/api/household-tasks/', member=None))
+
+        self.household.members.remove(self.users[1])
+        UserProfile.objects.filter(user=self.users[1]).update(current_household=None)
+        self.assert_same(self.clients[1].get('/api/household-news/'), self.get_async('/api/household-news/', member=1))
+
+
+PROMETHEUS_SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)\{(.*)\} (\S+)$')
+PROMETHEUS_LABEL = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"(?:,|$)')
+
+
+def parse_prometheus(text):
+    """Familias {nombre: (tipo, [(etiquetas, valor)])} de una exposición de texto 0.0.4"""
+    families = {}
+    current = None
+    for line in text.splitlines():
+        if line.startswith('# HELP '):
+            current = line.split(' ', 3)[2]
+            families[current] = [None, []]
+        elif line.startswith('# TYPE '):
+            name, kind = line.split(' ')[2:4]
+            assert name == current, f'TYPE de {name} sin su HELP'
+            families[name][0] = kind
+        else:
+            name, labels, value = PROMETHEUS_SAMPLE.match(line).groups()
+            family = name
+            if families.get(current, [None])[0] == 'histogram':
+                family = re.sub(r'_(bucket|sum|count)$', '', name)
+            assert family == current, f'{name} fuera de su familia {current}'
+            parsed = dict(PROMETHEUS_LABEL.findall(labels))
+            assert ','.join(f'{key}="{val}"' for key, val in parsed.items()) == labels, line
+            families[current][1].append((name, parsed, float(value)))
+    return {name: (kind, samples) for name, (kind, samples) in families.items()}
+
+
+@override_settings(HOMI_METRICS={'ENABLED': True, 'BUCKETS': (0.1, 1, 10)}, HOMI_RESPONSE_CACHE={'ENABLED': False})
+class MetricsExpositionTests(ApiTestCase):
+    """metrics/ en formato de texto de Prometheus con etiquetas por vista y contadores de SQL"""
+
+    def setUp(self):
+        super().setUp()
+        metrics.registry.reset()
+        # La conexión de la prueba ya estaba abierta cuando se activaron las métricas
+        metrics.install(connection)
+        self.addCleanup(connection.execute_wrappers.remove, metrics.record_query)
+        User.objects.filter(pk=self.users[0].pk).update(is_staff=True)
+
+    def scrape(self):
+        response = self.clients[0].get('/api/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        return parse_prometheus(response.content.decode())
+
+    def value(self, families, name, family=None, **labels):
+        kind, samples = families[family or name]
+        return next(value for sample, sample_labels, value in samples if sample == name and sample_labels == labels)
+
+    def test_exposition_format_and_labels(self):
+        self.seed(2)
+        self.clients[1].get('/api/household-tasks/')  # calentar la caché de autenticación
+        metrics.registry.reset()
+        # request_started vacía connection.queries, así que se cuentan con un envoltorio propio
+        queries = []
+        with connection.execute_wrapper(lambda execute, sql, *args: queries.append(sql) or execute(sql, *args)):
+            for _ in range(2):
+                self.assertEqual(self.clients[1].get('/api/household-news/').status_code, 200)
+        self.clients[1].get('/api/household-tasks/')
+        self.clients[1].get('/api/no-existe/')
+        families = self.scrape()
+
+        self.assertEqual(families['homi_http_requests_total'][0], 'counter')
+        self.assertEqual(families['homi_http_request_duration_seconds'][0], 'histogram')
+        self.assertEqual(self.value(families, 'homi_http_requests_total', view='household_news'), 2)
+        self.assertEqual(self.value(families, 'homi_http_requests_total', view='household_tasks'), 1)
+        self.assertEqual(self.value(families, 'homi_http_requests_total', view='other'), 1)
+        # metrics/ se anota al terminar: todavía no aparece en su propia respuesta
+        self.assertNotIn('metrics', {labels['view'] for _, labels, _ in families['homi_http_requests_total'][1]})
+
+        self.assertEqual(self.value(families, 'homi_db_queries_total', view='household_news'), len(queries))
+        self.assertGreater(self.value(families, 'homi_db_query_seconds_total', view='household_news'), 0)
+        self.assertGreater(self.value(families, 'homi_http_response_bytes_total', view='household_news'), 0)
+
+        buckets = [
+            (labels['le'], value) for name, labels, value in families['homi_http_request_duration_seconds'][1]
+            if name.endswith('_bucket') and labels['view'] == 'household_news'
+        ]
+        self.assertEqual([le for le, _ in buckets], ['0.1', '1', '10', '+Inf'])
+        self.assertEqual([value for _, value in buckets], sorted(value for _, value in buckets))
+        self.assertEqual(buckets[-1][1], self.value(
+            families, 'homi_http_request_duration_seconds_count', 'homi_http_request_duration_seconds',
+            view='household_news',
+        ))
+        self.assertIn('homi_sqlite_lock_events_total', families)
+
+    def test_requires_admin_and_enabled_setting(self):
+        self.assertEqual(self.clients[1].get('/api/metrics/').status_code, 403)
+        with override_settings(HOMI_METRICS={'ENABLED': False}):
+            self.assertEqual(self.clients[0].get('/api/metrics/').status_code, 404)
+
+
+@override_settings(HOMI_SHARDS={'ALIASES': ['default', 'shard2'], 'CACHE_ALIAS': 'default', 'ID_BLOCK': 10})
+class ShardRoutingTests(HouseholdFixture, TransactionTestCase):
+    """Casas en un segundo shard: enrutamiento, ids globales y relaciones de filas cargadas"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Segundo shard en un archivo temporal con su propio esquema
+        cls.shard_dir = tempfile.TemporaryDirectory()
+        shard = dict(connections['default'].settings_dict)
+        shard['NAME'] = f'{cls.shard_dir.name}/shard2.sqlite3'
+        shard['TEST'] = {**shard['TEST'], 'NAME': shard['NAME']}
+        connections.settings['shard2'] = shard
+        cls.databases = {*cls.databases, 'shard2'}
+        call_command('migrate', database='shard2', verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        connections['shard2'].close()
+        del connections['shard2']
+        del connections.settings['shard2']
+        cls.databases = cls.databases - {'shard2'}
+        cls.shard_dir.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        caches['default'].clear()
+        shards._id_blocks.clear()
+        self.addCleanup(shards._id_blocks.clear)
+        # Casa nueva de otro usuario: 'default' ya tiene la del fixture
+        self.owner = User.objects.create_user('dueño', password='clave-123')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.get(user=self.owner).key}')
+        response = self.client.post('/api/create-household/', {'name': 'Otra'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.other_id = response.data['id']
+
+    def test_household_reads_and_writes_go_to_its_shard(self):
+        self.assertEqual(HouseholdShard.objects.get(pk=self.other_id).shard, 'shard2')
+        self.assertFalse(Household.objects.using('default').filter(pk=self.other_id).exists())
+        self.assertTrue(Household.objects.using('shard2').filter(pk=self.other_id, members=self.owner).exists())
+
+        expiry = (timezone.now() + timedelta(days=1)).isoformat()
+        response = self.client.post('/api/create-news/', {'title': 'En shard2', 'content': '...', 'expiry_date': expiry}, format='json')
+        self.assertEqual(response.status_code, 201)
+        response = self.clients[0].post('/api/create-news/', {'title': 'En default', 'content': '...', 'expiry_date': expiry}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        self.assertEqual(list(News.objects.using('shard2').values_list('title', flat=True)), ['En shard2'])
+        self.assertEqual(list(News.objects.using('default').values_list('title', flat=True)), ['En default'])
+        self.assertEqual([news['title'] for news in self.client.get('/api/household-news/').data], ['En shard2'])
+        self.assertEqual([news['title'] for news in self.clients[0].get('/api/household-news/').data], ['En default'])
+
+        # Fuera de una petición las consultas van al shard activado con using()
+        self.assertFalse(News.objects.filter(title='En shard2').exists())
+        with shards.using('shard2'):
+            self.assertTrue(News.objects.filter(title='En shard2').exists())
+
+    def test_sharded_ids_are_global(self):
+        with shards.using('shard2'):
+            first = News.objects.create(
+                title='A', content='...', household_id=self.other_id, created_by=self.owner,
+                expiry_date=timezone.now() + timedelta(days=1),
+            )
+        second = News.objects.create(
+            title='B', content='...', household=self.household, created_by=self.users[0],
+            expiry_date=timezone.now() + timedelta(days=1),
+        )
+        self.assertEqual(second.pk, first.pk + 1)
+        # Un bloque de ID_BLOCK reservado de una vez en la base global
+        self.assertEqual(ShardIdSequence.objects.get(table=News._meta.db_table).value, first.pk + 9)
+
+        ids = shards.allocate_ids(News, 12)
+        self.assertEqual(ids, list(range(second.pk + 1, second.pk + 13)))
+        reserved = ShardIdSequence.objects.get(table=News._meta.db_table).value
+        self.assertEqual(reserved, first.pk + 19)
+        # Dentro de una transacción de 'default' sólo se reservan los ids pedidos,
+        # después del bloque que el proceso tiene en memoria
+        with transaction.atomic():
+            self.assertEqual(shards.allocate_ids(News, 2), [reserved + 1, reserved + 2])
+        self.assertEqual(ShardIdSequence.objects.get(table=News._meta.db_table).value, reserved + 2)
+
+    def test_loaded_rows_follow_their_database(self):
+        with shards.using('shard2'):
+            News.objects.create(
+                title='A', content='...', household_id=self.other_id, created_by=self.owner,
+                expiry_date=timezone.now() + timedelta(days=1),
+            )
+        # Sin shard activo: las relaciones de la fila siguen a instance._state.db
+        news = News.objects.using('shard2').get(title='A')
+        self.assertEqual(news.household._state.db, 'shard2')
+        self.assertEqual(news.created_by._state.db, 'shard2')
+        self.assertEqual(news.household.created_by, self.owner)
+        self.assertEqual([member._state.db for member in news.household.members.all()], ['shard2'])
+        self.assertEqual([item.title for item in news.household.news.all()], ['A'])
+
+        news.title = 'Editada'
+        news.save()
+        self.assertEqual(News.objects.using('shard2').get(pk=news.pk).title, 'Editada')
+        self.assertFalse(News.objects.using('default').filter(pk=news.pk).exists())
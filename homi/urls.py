@@ -5,6 +5,19 @@ urlpatterns = [
     # Registro y login de usuarios
     path('register/', views.register, name='register'),
     path('login/', views.login, name='login'),
+    path('token/refresh/', views.refresh_access_token, name='token_refresh'),
+    
+    # Eventos de cambios de la casa (SSE, servido por backend/asgi.py)
+    path('events/', views.household_events, name='household_events'),
+    
+    # Sincronización incremental para clientes sin conexión
+    path('sync/', views.sync_household, name='sync_household'),
+    
+    # Métricas del proceso en formato Prometheus (sólo staff, HOMI_METRICS)
+    path('metrics/', views.get_metrics, name='metrics'),
+    
+    # Varias operaciones en una sola petición
+    path('batch/', views.batch_requests, name='batch_requests'),
     
     # Crear y unirse a casas
     path('create-household/', views.create_household, name='create_household'),
@@ -15,6 +28,7 @@ urlpatterns = [
     
     # Gestión de casas
     path('current-household-info/', views.get_current_household_info, name='current_household_info'),
+    path('dashboard/', views.get_dashboard, name='dashboard'),
     path('leave-household/', views.leave_household, name='leave_household'),
     path('delete-household/', views.delete_household, name='delete_household'),
     
@@ -27,6 +41,7 @@ urlpatterns = [
     path('household-expenses/', views.get_household_expenses, name='household_expenses'),
     path('create-expense/', views.create_expense, name='create_expense'),
     path('pay-expense/<int:expense_id>/', views.pay_expense, name='pay_expense'),
+    path('pay-expenses/', views.pay_expenses, name='pay_expenses'),
     path('update-expense/<int:expense_id>/', views.update_expense, name='update_expense'),
     path('delete-expense/<int:expense_id>/', views.delete_expense, name='delete_expense'),
     
@@ -0,0 +1,115 @@
+"""Versiones por casa y colección para responder peticiones condicionales.
+
+Cada escritura sobre noticias, tareas, gastos, pagos o gastos personales
+incrementa la versión de su colección (señales en signals.py y llamadas
+explícitas en los caminos masivos). Los listados calculan su ETag a partir de
+esas versiones, así que un If-None-Match que coincide se responde con 304 sin
+consultar las tablas principales.
+
+Sin HOMI_COLLECTION_VERSIONS['CACHE_ALIAS'] las versiones se leen con una sola
+consulta indexada. Con un alias de caché compartida la versión es un contador
+propio de la caché: quien no la encuentra la crea con add() desde un valor
+aleatorio de 62 bits y cada escritura la incrementa con incr() al confirmar.
+Nunca se borra ni se copia desde la base, así que una lectura que cargó la
+versión antes de un commit no puede volver a guardarla vieja después; si la
+entrada vence o se desaloja, el contador nuevo empieza en otro valor y no
+repite un ETag anterior.
+"""
+import hashlib
+import secrets
+
+from django.conf import settings
+from django.core.cache import caches
+from . import shards
+from .models import CollectionVersion
+
+# Cambiarlo invalida todos los ETag emitidos (p. ej. si cambia un serializer)
+ETAG_FORMAT = 1
+
+
+def _options():
+    return getattr(settings, 'HOMI_COLLECTION_VERSIONS', {})
+
+
+def _cache():
+    alias = _options().get('CACHE_ALIAS')
+    return caches[alias] if alias else None
+
+
+def _cache_key(household_id, collection):
+    return f'homi:version:{household_id}:{collection}'
+
+
+def bump(household_id, *collections, create=True):
+    """Incrementa las versiones en la transacción actual y las de la caché al confirmar"""
+    CollectionVersion.bump(household_id, *collections, create=create)
+    cache = _cache()
+    if cache is not None:
+        keys = [_cache_key(household_id, collection) for collection in collections]
+        shards.on_commit(lambda: _advance(cache, keys))
+
+
+def bump_households(household_ids, collection):
+    """bump() de una colección en varias casas (borrados por lotes del archivado)"""
+    CollectionVersion.bump_households(household_ids, collection)
+    cache = _cache()
+    if cache is not None:
+        keys = [_cache_key(household_id, collection) for household_id in household_ids]
+        shards.on_commit(lambda: _advance(cache, keys))
+
+
+def _advance(cache, keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Nadie la leyó todavía: la próxima lectura empieza otro contador
+            pass
+
+
+def get_versions(household_id, collections):
+    cache = _cache()
+    if cache is None:
+        return CollectionVersion.get_versions(household_id, collections)
+
+    keys = {collection: _cache_key(household_id, collection) for collection in collections}
+    cached = cache.get_many(keys.values())
+    missing = [keys[collection] for collection in collections if keys[collection] not in cached]
+    if missing:
+        timeout = _options().get('TIMEOUT', 300)
+        for key in missing:
+            cache.add(key, secrets.randbits(62), timeout)
+        # Si otro proceso la creó antes, vale la suya
+        cached.update(cache.get_many(missing))
+    versions = {collection: cached[key] for collection, key in keys.items() if key in cached}
+    uncached = [collection for collection in collections if collection not in versions]
+    if uncached:
+        # Caché que no guarda nada (DummyCache) o desalojo inmediato
+        versions.update(CollectionVersion.get_versions(household_id, uncached))
+    return versions
+
+
+def request_versions(request, collections):
+    """get_versions una sola vez por petición (ETag y caché de respuestas las comparten)"""
+    loaded = getattr(request, '_collection_versions', None)
+    if loaded is None:
+        loaded = request._collection_versions = {}
+    missing = [collection for collection in collections if collection not in loaded]
+    if missing:
+        loaded.update(get_versions(request.household.pk, missing))
+    return {collection: loaded[collection] for collection in collections}
+
+
+def collection_etag(request, collections, per_user=True, extra=()):
+    """ETag débil del listado: versiones, usuario, parámetros y datos extra"""
+    versions = request_versions(request, collections)
+    parts = [
+        ETAG_FORMAT,
+        request.household.pk,
+        request.user.pk if per_user else '',
+        *(f'{collection}={versions[collection]}' for collection in collections),
+        request.META.get('QUERY_STRING', ''),
+        *extra,
+    ]
+    digest = hashlib.sha1(':'.join(str(part) for part in parts).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
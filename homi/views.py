@@ -1,7 +1,8 @@
 from django.shortcuts import render
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
 from django.contrib.auth import authenticate
@@ -13,15 +14,57 @@ from .serializers import (
     CreateTaskSerializer, HouseholdMemberSerializer, PersonalExpenseSerializer,
     CreatePersonalExpenseSerializer, MonthlyExpenseSummarySerializer
 )
-from .models import Household, News, Expense, ExpensePayment, Task, PersonalExpense
-from django.db import transaction
-from django.db.models import Sum
+from .archiving import previous_month, start_archive_job
+from .async_views import async_variant, run_sync
+from .authentication import CachedTokenAuthentication, issue_access_token
+from .decorators import (
+    conditional_list, get_household_context, household_moving_response, household_required, household_shard,
+    read_replica
+)
+from .events import RESYNC, broker, format_event, publish_on_commit
+from .sync import InvalidCursor, changes_since
+from . import batch, metrics, shards
+from .pagination import (
+    EXPENSE_ORDERING, NEWS_ORDERING, NEXT_CURSOR_HEADER, PERSONAL_EXPENSE_ORDERING, TASK_ORDERING,
+    InvalidPage, is_paginated_request, paginate, paginated_response
+)
+from .versions import bump as bump_versions
+from . import response_cache
+from .models import (
+    CollectionVersion, Household, HouseholdChange, HouseholdShard, News, Expense, ExpensePayment, Task,
+    PersonalExpense, PersonalExpenseRollup
+)
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from rest_framework.exceptions import APIException
+from rest_framework.settings import api_settings
+import asyncio
+from django.db.models import F
+from collections import defaultdict
 from decimal import Decimal
 import logging
 from django.utils import timezone
 
 logger = logging.getLogger(__name__)
 
+# Máximo de gastos por llamada a pay-expenses/
+MAX_BULK_PAYMENTS = 200
+
+# Próximas tareas propias que muestra dashboard/
+DASHBOARD_UPCOMING_TASKS = 5
+
+def _signed_token_data(request, user, token):
+    """Tokens de acceso firmados para los clientes que envían token_mode=signed"""
+    if request.data.get('token_mode') != 'signed':
+        return {}
+    return {
+        'access_token': issue_access_token(user),
+        'access_expires_in': settings.HOMI_ACCESS_TOKEN_LIFETIME,
+        'refresh_token': token.key
+    }
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def register(request):
@@ -50,7 +93,8 @@ def register(request):
             'token': token.key,
             'user_id': user.id,
             'username': user.username,
-            'email': user.email
+            'email': user.email,
+            **_signed_token_data(request, user, token)
         }, status=status.HTTP_201_CREATED)
     
     logger.error(f"Registration errors: {serializer.errors}")
@@ -75,11 +119,14 @@ def login(request):
             
             try:
                 profile = user.profile
+                if profile.current_household_id is not None:
+                    # La casa puede vivir en otro shard
+                    shards.attach_household(profile)
                 if profile.current_household:
                     has_household = True
                     current_household = HouseholdSerializer(profile.current_household).data
                     # NUEVO: Agregar información del creador
-                    current_household['is_creator'] = (profile.current_household.created_by == user)
+                    current_household['is_creator'] = (profile.current_household.created_by_id == user.id)
             except:
                 pass
             
@@ -90,7 +137,8 @@ def login(request):
                 'username': user.username,
                 'email': user.email,
                 'has_household': has_household,
-                'current_household': current_household
+                'current_household': current_household,
+                **_signed_token_data(request, user, token)
             })
         else:
             logger.warning(f"Invalid credentials for user: {username}")
@@ -102,6 +150,28 @@ def login(request):
             'error': 'Por favor proporciona usuario y contraseña'
         }, status=status.HTTP_400_BAD_REQUEST)
 
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def refresh_access_token(request):
+    """Emite un nuevo token de acceso firmado a partir del token de siempre"""
+    refresh_token = request.data.get('refresh_token')
+    if not refresh_token:
+        return Response({
+            'error': 'El refresh_token es requerido'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        user, _ = CachedTokenAuthentication().authenticate_credentials(refresh_token)
+    except AuthenticationFailed:
+        return Response({
+            'error': 'Token inválido'
+        }, status=status.HTTP_401_UNAUTHORIZED)
+    
+    return Response({
+        'access_token': issue_access_token(user),
+        'access_expires_in': settings.HOMI_ACCESS_TOKEN_LIFETIME
+    })
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def create_household(request):
@@ -112,12 +182,15 @@ def create_household(request):
             'error': 'El nombre de la casa es requerido'
         }, status=status.HTTP_400_BAD_REQUEST)
     
-    # Crear la casa
-    household = Household.objects.create(
-        name=name,
-        created_by=request.user
-    )
-    household.members.add(request.user)
+    # Crear la casa en el shard con menos casas, con la copia de su creador
+    alias = shards.choose_shard()
+    shards.mirror_users(alias, [request.user])
+    with shards.using(alias):
+        household = Household.objects.create(
+            name=name,
+            created_by=request.user
+        )
+        household.members.add(request.user)
     
     # Actualizar el perfil del usuario
     profile = request.user.profile
@@ -142,16 +215,23 @@ def join_household(request):
         }, status=status.HTTP_400_BAD_REQUEST)
     
     try:
-        household = Household.objects.get(code=code.upper())
-        
-        # Verificar si ya es miembro
-        if request.user in household.members.all():
-            return Response({
-                'error': 'Ya eres miembro de esta casa'
-            }, status=status.HTTP_400_BAD_REQUEST)
+        # El directorio de shards resuelve el código y la base de la casa
+        entry = HouseholdShard.objects.get(code=code.upper())
+        if entry.moving:
+            return household_moving_response()
         
-        # Agregar usuario a la casa
-        household.members.add(request.user)
+        with shards.using(entry.shard):
+            household = Household.objects.select_related('created_by').get(pk=entry.pk)
+            
+            # Verificar si ya es miembro
+            if request.user in household.members.all():
+                return Response({
+                    'error': 'Ya eres miembro de esta casa'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            
+            # Agregar usuario a la casa (y su copia al shard)
+            shards.mirror_users(entry.shard, [request.user])
+            household.members.add(request.user)
         
         # Actualizar el perfil del usuario
         profile = request.user.profile
@@ -161,20 +241,24 @@ def join_household(request):
         serializer = HouseholdSerializer(household)
         response_data = serializer.data
         # NUEVO: Agregar información del creador
-        response_data['is_creator'] = (household.created_by == request.user)
+        response_data['is_creator'] = (household.created_by_id == request.user.id)
         
         return Response(response_data, status=status.HTTP_200_OK)
         
-    except Household.DoesNotExist:
+    except (HouseholdShard.DoesNotExist, Household.DoesNotExist):
         return Response({
             'error': 'Código inválido'
         }, status=status.HTTP_404_NOT_FOUND)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@read_replica
 def get_user_profile(request):
     try:
         profile = request.user.profile
+        if profile.current_household_id is not None:
+            # La casa puede vivir en otro shard
+            shards.attach_household(profile)
         serializer = UserProfileSerializer(profile)
         return Response(serializer.data)
     except:
@@ -184,44 +268,63 @@ def get_user_profile(request):
     
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@read_replica
+@household_required
+@conditional_list(CollectionVersion.NEWS, per_user=False, time_bucket=60)
 def get_household_news(request):
     try:
-        profile = request.user.profile
-        if not profile.current_household:
-            return Response({
-                'error': 'No tienes una casa asignada'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Obtener noticias que no han expirado
-        news = News.objects.filter(
-            household=profile.current_household,
-            expiry_date__gt=timezone.now()
-        ).order_by('-created_at')
+        payload = response_cache.shared_payload(
+            request, 'news', (CollectionVersion.NEWS,), lambda: _news_payload(request), time_bucket=60
+        )
+        return paginated_response(request, payload['data'], payload['next_cursor'])
         
-        serializer = NewsSerializer(news, many=True)
-        return Response(serializer.data)
+    except InvalidPage as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        logger.error(f"Error getting household news: {e}")
+        return Response({
+            'error': 'Error al obtener las noticias'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@async_variant(get_household_news, CollectionVersion.NEWS, per_user=False, time_bucket=60)
+async def get_household_news_async(request):
+    try:
+        payload = await response_cache.shared_payload_async(
+            request, 'news', (CollectionVersion.NEWS,), lambda: run_sync(_news_payload, request), time_bucket=60
+        )
+        return paginated_response(request, payload['data'], payload['next_cursor'])
         
+    except InvalidPage as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         logger.error(f"Error getting household news: {e}")
         return Response({
             'error': 'Error al obtener las noticias'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+def _news_payload(request):
+    # Obtener noticias que no han expirado
+    news = News.objects.filter(
+        household=request.household,
+        expiry_date__gt=timezone.now()
+    ).select_related('created_by')
+    news, next_cursor = paginate(news, NEWS_ORDERING, request)
+    return {'data': NewsSerializer(news, many=True).data, 'next_cursor': next_cursor}
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@household_required
 def create_news(request):
     try:
-        profile = request.user.profile
-        if not profile.current_household:
-            return Response({
-                'error': 'No tienes una casa asignada'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
         serializer = CreateNewsSerializer(data=request.data)
         if serializer.is_valid():
             news = serializer.save(
                 created_by=request.user,
-                household=profile.current_household
+                household=request.household
             )
             
             # Devolver la noticia creada con toda la información
@@ -238,21 +341,16 @@ def create_news(request):
 
 @api_view(['DELETE'])
 @permission_classes([IsAuthenticated])
+@household_required
 def delete_news(request, news_id):
     try:
-        profile = request.user.profile
-        if not profile.current_household:
-            return Response({
-                'error': 'No tienes una casa asignada'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
         news = News.objects.get(
             id=news_id,
-            household=profile.current_household
+            household=request.household
         )
         
         # Solo el creador puede eliminar la noticia
-        if news.created_by != request.user:
+        if news.created_by_id != request.user.id:
             return Response({
                 'error': 'No tienes permisos para eliminar esta noticia'
             }, status=status.HTTP_403_FORBIDDEN)
@@ -272,39 +370,68 @@ def delete_news(request, news_id):
     
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@read_replica
+@household_required
+@conditional_list(CollectionVersion.EXPENSES, CollectionVersion.MEMBERS)
 def get_household_expenses(request):
     try:
-        profile = request.user.profile
-        if not profile.current_household:
-            return Response({
-                'error': 'No tienes una casa asignada'
-            }, status=status.HTTP_400_BAD_REQUEST)
+        payload = response_cache.shared_payload(
+            request, 'expenses', (CollectionVersion.EXPENSES, CollectionVersion.MEMBERS),
+            lambda: _expenses_payload(request)
+        )
+        return paginated_response(request, _with_user_has_paid(request, payload['data']), payload['next_cursor'])
         
-        expenses = Expense.objects.filter(household=profile.current_household)
-        serializer = ExpenseSerializer(expenses, many=True, context={'request': request})
-        return Response(serializer.data)
+    except InvalidPage as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        logger.error(f"Error getting household expenses: {e}")
+        return Response({
+            'error': 'Error al obtener los gastos'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@async_variant(get_household_expenses, CollectionVersion.EXPENSES, CollectionVersion.MEMBERS)
+async def get_household_expenses_async(request):
+    try:
+        payload = await response_cache.shared_payload_async(
+            request, 'expenses', (CollectionVersion.EXPENSES, CollectionVersion.MEMBERS),
+            lambda: run_sync(_expenses_payload, request)
+        )
+        return paginated_response(request, _with_user_has_paid(request, payload['data']), payload['next_cursor'])
         
+    except InvalidPage as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         logger.error(f"Error getting household expenses: {e}")
         return Response({
             'error': 'Error al obtener los gastos'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+def _expenses_payload(request):
+    # Sin el usuario: user_has_paid se calcula después desde los pagos
+    expenses = Expense.get_household_expenses(request.household)
+    expenses, next_cursor = paginate(expenses, EXPENSE_ORDERING, request)
+    return {'data': ExpenseSerializer(expenses, many=True).data, 'next_cursor': next_cursor}
+
+def _with_user_has_paid(request, expenses):
+    return [
+        {**expense, 'user_has_paid': any(payment['user'] == request.user.id for payment in expense['payments'])}
+        for expense in expenses
+    ]
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@household_required
 def create_expense(request):
     try:
-        profile = request.user.profile
-        if not profile.current_household:
-            return Response({
-                'error': 'No tienes una casa asignada'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
         serializer = CreateExpenseSerializer(data=request.data)
         if serializer.is_valid():
             expense = serializer.save(
                 created_by=request.user,
-                household=profile.current_household
+                household=request.household
             )
             
             # Devolver el gasto creado con toda la información
@@ -321,56 +448,59 @@ def create_expense(request):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@household_required
 def pay_expense(request, expense_id):
     try:
-        profile = request.user.profile
-        if not profile.current_household:
-            return Response({
-                'error': 'No tienes una casa asignada'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
-        expense = Expense.objects.get(
-            id=expense_id,
-            household=profile.current_household
-        )
-        
-        # Verificar si el usuario ya pagó
-        if ExpensePayment.objects.filter(expense=expense, user=request.user).exists():
-            return Response({
-                'error': 'Ya has pagado este gasto'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Verificar si el gasto ya está completamente pagado
-        if expense.is_fully_paid():
-            return Response({
-                'error': 'Este gasto ya está completamente pagado'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
-        with transaction.atomic():
-            # Crear el pago
-            payment = ExpensePayment.objects.create(
-                expense=expense,
-                user=request.user,
-                amount_paid=expense.unit_cost
+        with shards.atomic():
+            # Verificar primero si el usuario ya pagó: tiene prioridad sobre el
+            # gasto completamente pagado. Un pago doble simultáneo lo frena la
+            # restricción única más abajo
+            if ExpensePayment.objects.filter(
+                expense_id=expense_id,
+                expense__household=request.household,
+                user=request.user
+            ).exists():
+                return Response({
+                    'error': 'Ya has pagado este gasto'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            
+            # Descontar el pago con un UPDATE condicional antes de leer el gasto:
+            # bloquea la fila (la base completa en SQLite), así los pagos
+            # concurrentes se serializan sin perder cambios
+            updated = Expense.objects.filter(
+                id=expense_id,
+                household=request.household,
+                remaining_amount__gt=0
+            ).update(
+                remaining_amount=F('remaining_amount') - F('unit_cost'),
+                updated_at=timezone.now()
             )
+            if not updated:
+                if not Expense.objects.filter(id=expense_id, household=request.household).exists():
+                    raise Expense.DoesNotExist
+                return Response({
+                    'error': 'Este gasto ya está completamente pagado'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            
+            expense = Expense.objects.get(id=expense_id)
+            expense.household = request.household
             
-            # Actualizar el monto restante
-            expense.remaining_amount -= expense.unit_cost
-            expense.save()
+            # Crear el pago; la restricción única es la última defensa ante un pago doble
+            try:
+                with shards.atomic():
+                    payment = ExpensePayment.objects.create(
+                        expense=expense,
+                        user=request.user,
+                        amount_paid=expense.unit_cost
+                    )
+            except IntegrityError:
+                transaction.set_rollback(True, using=shards.current())
+                return Response({
+                    'error': 'Ya has pagado este gasto'
+                }, status=status.HTTP_409_CONFLICT)
             
             # NUEVO: Crear gasto personal automático
-            now = timezone.now()
-            PersonalExpense.objects.create(
-                title=f"Pago: {expense.title}",
-                description=f"Pago de gasto compartido: {expense.description}",
-                cost=expense.unit_cost,
-                user=request.user,
-                household=profile.current_household,
-                source='shared_payment',
-                shared_payment=payment,
-                month=now.month,
-                year=now.year
-            )
+            _shared_payment_personal_expense(expense, payment, request.user, timezone.now()).save()
             
             # Si es gasto único y está completamente pagado, eliminarlo
             if expense.expense_type == 'unique' and expense.is_fully_paid():
@@ -391,23 +521,137 @@ def pay_expense(request, expense_id):
             'error': 'Error al procesar el pago'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+def _shared_payment_personal_expense(expense, payment, user, now):
+    """Gasto personal (sin guardar) que refleja el pago de un gasto compartido"""
+    return PersonalExpense(
+        title=f"Pago: {expense.title}",
+        description=f"Pago de gasto compartido: {expense.description}",
+        cost=payment.amount_paid,
+        user=user,
+        household_id=expense.household_id,
+        source='shared_payment',
+        shared_payment=payment,
+        month=now.month,
+        year=now.year
+    )
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@household_required
+def pay_expenses(request):
+    """Paga varios gastos compartidos en una sola transacción"""
+    expense_ids = request.data.get('expense_ids')
+    if (not isinstance(expense_ids, list) or not expense_ids
+            or len(expense_ids) > MAX_BULK_PAYMENTS
+            or not all(type(expense_id) is int for expense_id in expense_ids)):
+        return Response({
+            'error': f'expense_ids debe ser una lista de hasta {MAX_BULK_PAYMENTS} ids'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    expense_ids = list(dict.fromkeys(expense_ids))
+    results = {expense_id: 'not_found' for expense_id in expense_ids}
+    
+    try:
+        with shards.atomic():
+            # Bloquear los gastos pedidos (select_for_update no aplica en SQLite,
+            # donde la transacción ya serializa las escrituras)
+            expenses = list(Expense.objects.select_for_update().filter(
+                id__in=expense_ids,
+                household=request.household
+            ))
+            already_paid = set(ExpensePayment.objects.filter(
+                expense_id__in=expense_ids,
+                user=request.user
+            ).values_list('expense_id', flat=True))
+            
+            to_pay = []
+            for expense in expenses:
+                if expense.id in already_paid:
+                    results[expense.id] = 'already_paid'
+                elif expense.is_fully_paid():
+                    results[expense.id] = 'fully_paid'
+                else:
+                    to_pay.append(expense)
+            
+            if to_pay:
+                now = timezone.now()
+                paid_ids = [expense.id for expense in to_pay]
+                
+                # Descontar todos los pagos en una sola sentencia
+                updated = Expense.objects.filter(id__in=paid_ids, remaining_amount__gt=0).update(
+                    remaining_amount=F('remaining_amount') - F('unit_cost'),
+                    updated_at=now
+                )
+                if updated != len(to_pay):
+                    transaction.set_rollback(True, using=shards.current())
+                    return Response({
+                        'error': 'Los gastos cambiaron durante el pago, inténtalo de nuevo'
+                    }, status=status.HTTP_409_CONFLICT)
+                
+                payments = ExpensePayment.objects.bulk_create([
+                    ExpensePayment(expense=expense, user=request.user, amount_paid=expense.unit_cost)
+                    for expense in to_pay
+                ])
+                personal_expenses = PersonalExpense.objects.bulk_create([
+                    _shared_payment_personal_expense(expense, payment, request.user, now)
+                    for expense, payment in zip(to_pay, payments)
+                ])
+                PersonalExpenseRollup.apply_changes(added=personal_expenses)
+                # bulk_create y update() no envían señales
+                bump_versions(
+                    request.household.pk, CollectionVersion.EXPENSES, CollectionVersion.PERSONAL_EXPENSES
+                )
+                HouseholdChange.record(request.household.pk, CollectionVersion.EXPENSES, paid_ids)
+                HouseholdChange.record(
+                    request.household.pk, CollectionVersion.PERSONAL_EXPENSES,
+                    [personal_expense.pk for personal_expense in personal_expenses]
+                )
+                for payment, personal_expense in zip(payments, personal_expenses):
+                    publish_on_commit(
+                        request.household.pk, 'expense.paid', expense_id=payment.expense_id, user_id=request.user.id
+                    )
+                    publish_on_commit(
+                        request.household.pk, 'personal_expense.created',
+                        personal_expense_id=personal_expense.pk, user_id=request.user.id
+                    )
+                
+                # Eliminar en una sola sentencia los gastos únicos que quedaron pagados
+                completed_ids = [
+                    expense.id for expense in to_pay
+                    if expense.expense_type == 'unique' and expense.remaining_amount - expense.unit_cost <= 0
+                ]
+                if completed_ids:
+                    Expense.objects.filter(id__in=completed_ids).delete()
+                
+                for expense in to_pay:
+                    results[expense.id] = 'paid'
+                for expense_id in completed_ids:
+                    results[expense_id] = 'completed'
+        
+        return Response({'results': results})
+        
+    except IntegrityError:
+        return Response({
+            'error': 'Ya has pagado alguno de estos gastos'
+        }, status=status.HTTP_409_CONFLICT)
+    except Exception as e:
+        logger.error(f"Error paying expenses: {e}")
+        return Response({
+            'error': 'Error al procesar los pagos'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 @api_view(['PUT'])
 @permission_classes([IsAuthenticated])
+@household_required
 def update_expense(request, expense_id):
     try:
-        profile = request.user.profile
-        if not profile.current_household:
-            return Response({
-                'error': 'No tienes una casa asignada'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
         expense = Expense.objects.get(
             id=expense_id,
-            household=profile.current_household
+            household=request.household
         )
         
         # Solo el creador puede editar
-        if expense.created_by != request.user:
+        if expense.created_by_id != request.user.id:
             return Response({
                 'error': 'No tienes permisos para editar este gasto'
             }, status=status.HTTP_403_FORBIDDEN)
@@ -420,7 +664,7 @@ def update_expense(request, expense_id):
         
         serializer = UpdateExpenseSerializer(expense, data=request.data, partial=True)
         if serializer.is_valid():
-            with transaction.atomic():
+            with shards.atomic():
                 # Guardar el nuevo total
                 new_total = serializer.validated_data['total_cost']
                 
@@ -432,7 +676,7 @@ def update_expense(request, expense_id):
                 expense.remaining_amount = new_total  # Resetear el monto restante al total
                 
                 # Recalcular el costo unitario
-                members_count = expense.household.members.count()
+                members_count = request.household.member_count
                 if members_count > 0:
                     expense.unit_cost = expense.total_cost / members_count
                 
@@ -455,21 +699,16 @@ def update_expense(request, expense_id):
 
 @api_view(['DELETE'])
 @permission_classes([IsAuthenticated])
+@household_required
 def delete_expense(request, expense_id):
     try:
-        profile = request.user.profile
-        if not profile.current_household:
-            return Response({
-                'error': 'No tienes una casa asignada'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
         expense = Expense.objects.get(
             id=expense_id,
-            household=profile.current_household
+            household=request.household
         )
         
         # Solo el creador puede eliminar
-        if expense.created_by != request.user:
+        if expense.created_by_id != request.user.id:
             return Response({
                 'error': 'No tienes permisos para eliminar este gasto'
             }, status=status.HTTP_403_FORBIDDEN)
@@ -489,43 +728,71 @@ def delete_expense(request, expense_id):
     
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@read_replica
+@household_required
+@conditional_list(CollectionVersion.TASKS, time_bucket=60)
 def get_household_tasks(request):
     try:
-        profile = request.user.profile
-        if not profile.current_household:
-            return Response({
-                'error': 'No tienes una casa asignada'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Obtener todas las tareas de la casa que no están completadas
-        tasks = Task.objects.filter(
-            household=profile.current_household,
-            is_completed=False
-        ).order_by('due_datetime', '-created_at')
+        payload = response_cache.shared_payload(
+            request, 'tasks', (CollectionVersion.TASKS,), lambda: _tasks_payload(request), time_bucket=60
+        )
+        return paginated_response(request, _with_can_complete_task(request, payload['data']), payload['next_cursor'])
         
-        serializer = TaskSerializer(tasks, many=True, context={'request': request})
-        return Response(serializer.data)
+    except InvalidPage as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        logger.error(f"Error getting household tasks: {e}")
+        return Response({
+            'error': 'Error al obtener las tareas'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@async_variant(get_household_tasks, CollectionVersion.TASKS, time_bucket=60)
+async def get_household_tasks_async(request):
+    try:
+        payload = await response_cache.shared_payload_async(
+            request, 'tasks', (CollectionVersion.TASKS,), lambda: run_sync(_tasks_payload, request), time_bucket=60
+        )
+        return paginated_response(request, _with_can_complete_task(request, payload['data']), payload['next_cursor'])
         
+    except InvalidPage as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         logger.error(f"Error getting household tasks: {e}")
         return Response({
             'error': 'Error al obtener las tareas'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+def _tasks_payload(request):
+    # Obtener todas las tareas de la casa que no están completadas
+    tasks = Task.objects.filter(
+        household=request.household,
+        is_completed=False
+    ).select_related('created_by', 'assigned_to')
+    tasks, next_cursor = paginate(tasks, TASK_ORDERING, request)
+    return {'data': TaskSerializer(tasks, many=True).data, 'next_cursor': next_cursor}
+
+def _with_can_complete_task(request, tasks):
+    return [
+        {**task, 'can_complete_task': task['assigned_to'] == request.user.id and not task['is_completed']}
+        for task in tasks
+    ]
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@read_replica
+@household_required
 def get_household_members(request):
     try:
-        profile = request.user.profile
-        if not profile.current_household:
-            return Response({
-                'error': 'No tienes una casa asignada'
-            }, status=status.HTTP_400_BAD_REQUEST)
+        def build():
+            return HouseholdMemberSerializer(request.household.members.all(), many=True).data
         
-        # Obtener todos los miembros de la casa excepto el usuario actual
-        members = profile.current_household.members.exclude(id=request.user.id)
-        serializer = HouseholdMemberSerializer(members, many=True)
-        return Response(serializer.data)
+        # Todos los miembros excepto el usuario actual
+        members = response_cache.shared_payload(request, 'members', (CollectionVersion.MEMBERS,), build)
+        return Response([member for member in members if member['id'] != request.user.id])
         
     except Exception as e:
         logger.error(f"Error getting household members: {e}")
@@ -535,26 +802,21 @@ def get_household_members(request):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@household_required
 def create_task(request):
     try:
-        profile = request.user.profile
-        if not profile.current_household:
-            return Response({
-                'error': 'No tienes una casa asignada'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
         serializer = CreateTaskSerializer(data=request.data)
         if serializer.is_valid():
             # Verificar que el usuario asignado sea miembro de la casa
             assigned_user_id = serializer.validated_data['assigned_to'].id
-            if not profile.current_household.members.filter(id=assigned_user_id).exists():
+            if not request.household.members.filter(id=assigned_user_id).exists():
                 return Response({
                     'error': 'El usuario asignado no es miembro de esta casa'
                 }, status=status.HTTP_400_BAD_REQUEST)
             
             task = serializer.save(
                 created_by=request.user,
-                household=profile.current_household
+                household=request.household
             )
             
             # Devolver la tarea creada con toda la información
@@ -571,21 +833,16 @@ def create_task(request):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@household_required
 def complete_task(request, task_id):
     try:
-        profile = request.user.profile
-        if not profile.current_household:
-            return Response({
-                'error': 'No tienes una casa asignada'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
         task = Task.objects.get(
             id=task_id,
-            household=profile.current_household
+            household=request.household
         )
         
         # Verificar que solo el usuario asignado puede completar la tarea
-        if task.assigned_to != request.user:
+        if task.assigned_to_id != request.user.id:
             return Response({
                 'error': 'Solo el usuario asignado puede completar esta tarea'
             }, status=status.HTTP_403_FORBIDDEN)
@@ -615,21 +872,16 @@ def complete_task(request, task_id):
 
 @api_view(['DELETE'])
 @permission_classes([IsAuthenticated])
+@household_required
 def delete_task(request, task_id):
     try:
-        profile = request.user.profile
-        if not profile.current_household:
-            return Response({
-                'error': 'No tienes una casa asignada'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
         task = Task.objects.get(
             id=task_id,
-            household=profile.current_household
+            household=request.household
         )
         
         # Solo el creador puede eliminar la tarea
-        if task.created_by != request.user:
+        if task.created_by_id != request.user.id:
             return Response({
                 'error': 'No tienes permisos para eliminar esta tarea'
             }, status=status.HTTP_403_FORBIDDEN)
@@ -650,76 +902,127 @@ def delete_task(request, task_id):
 # NUEVAS VISTAS PARA GASTOS PERSONALES
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@read_replica
+@household_required
+@conditional_list(CollectionVersion.PERSONAL_EXPENSES, CollectionVersion.MEMBERS, monthly=True)
 def get_personal_expenses(request):
     """Obtiene los gastos personales del mes actual de todos los miembros de la casa"""
     try:
-        profile = request.user.profile
-        if not profile.current_household:
-            return Response({
-                'error': 'No tienes una casa asignada'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
         now = timezone.now()
         
         # Obtener todos los miembros de la casa
-        members = profile.current_household.members.all()
+        members = request.household.members.all()
         
-        # Construir resumen por cada miembro
-        summary = []
-        household_total = Decimal('0')
-        
-        for member in members:
-            # Obtener gastos del mes actual
-            expenses = PersonalExpense.objects.filter(
-                user=member,
-                household=profile.current_household,
-                month=now.month,
-                year=now.year
-            ).order_by('-created_at')
-            
-            # Calcular total del usuario
-            user_total = expenses.aggregate(total=Sum('cost'))['total'] or Decimal('0')
-            household_total += user_total
-            
-            member_data = {
-                'user_id': member.id,
-                'username': member.username,
-                'expenses': PersonalExpenseSerializer(expenses, many=True).data,
-                'monthly_total': user_total,
-                'expense_count': expenses.count()
-            }
-            summary.append(member_data)
+        rollups = _month_rollups(request, now)
+        page, next_cursor = _month_expenses_page(request, now)
+        return _personal_expenses_response(request, now, members, rollups, page, next_cursor)
         
+    except InvalidPage as e:
         return Response({
-            'month': now.month,
-            'year': now.year,
-            'household_total': household_total,
-            'members_summary': summary
-        })
+            'error': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        logger.error(f"Error getting personal expenses: {e}")
+        return Response({
+            'error': 'Error al obtener los gastos personales'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@async_variant(get_personal_expenses, CollectionVersion.PERSONAL_EXPENSES, CollectionVersion.MEMBERS, monthly=True)
+async def get_personal_expenses_async(request):
+    try:
+        now = timezone.now()
+        
+        # Las tres consultas son independientes: corren a la vez
+        members, rollups, (page, next_cursor) = await asyncio.gather(
+            run_sync(list, request.household.members.all()),
+            run_sync(_month_rollups, request, now),
+            run_sync(_month_expenses_page, request, now),
+        )
+        return _personal_expenses_response(request, now, members, rollups, page, next_cursor)
         
+    except InvalidPage as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         logger.error(f"Error getting personal expenses: {e}")
         return Response({
             'error': 'Error al obtener los gastos personales'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+def _month_rollups(request, now):
+    # Totales y cantidades del mes desde los acumulados mensuales
+    return {
+        rollup.user_id: rollup
+        for rollup in PersonalExpenseRollup.objects.filter(
+            household=request.household,
+            month=now.month,
+            year=now.year
+        )
+    }
+
+def _month_expenses_page(request, now):
+    # Una página de gastos del mes de toda la casa; los totales salen siempre
+    # de los acumulados, no de la página
+    return paginate(
+        PersonalExpense.objects.filter(
+            household=request.household,
+            month=now.month,
+            year=now.year
+        ).select_related('user'),
+        PERSONAL_EXPENSE_ORDERING,
+        request
+    )
+
+def _personal_expenses_response(request, now, members, rollups, page, next_cursor):
+    expenses_by_user = defaultdict(list)
+    for expense in page:
+        expenses_by_user[expense.user_id].append(expense)
+    
+    # Construir resumen por cada miembro
+    summary = []
+    household_total = Decimal('0')
+    
+    for member in members:
+        expenses = expenses_by_user.get(member.id, [])
+        rollup = rollups.get(member.id)
+        user_total = rollup.total if rollup else Decimal('0')
+        household_total += user_total
+        
+        member_data = {
+            'user_id': member.id,
+            'username': member.username,
+            'expenses': PersonalExpenseSerializer(expenses, many=True).data,
+            'monthly_total': user_total,
+            'expense_count': rollup.expense_count if rollup else 0
+        }
+        summary.append(member_data)
+    
+    data = {
+        'month': now.month,
+        'year': now.year,
+        'household_total': household_total,
+        'members_summary': summary
+    }
+    if is_paginated_request(request):
+        data['next_cursor'] = next_cursor
+    response = Response(data)
+    if next_cursor:
+        response[NEXT_CURSOR_HEADER] = next_cursor
+    return response
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@household_required
 def create_personal_expense(request):
     """Crea un nuevo gasto personal manual"""
     try:
-        profile = request.user.profile
-        if not profile.current_household:
-            return Response({
-                'error': 'No tienes una casa asignada'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
         serializer = CreatePersonalExpenseSerializer(data=request.data)
         if serializer.is_valid():
             now = timezone.now()
             expense = serializer.save(
                 user=request.user,
-                household=profile.current_household,
+                household=request.household,
                 source='manual',
                 month=now.month,
                 year=now.year
@@ -738,6 +1041,7 @@ def create_personal_expense(request):
 
 @api_view(['DELETE'])
 @permission_classes([IsAuthenticated])
+@household_shard
 def delete_personal_expense(request, expense_id):
     """Elimina un gasto personal (solo si es manual y del propio usuario)"""
     try:
@@ -767,10 +1071,17 @@ def cleanup_monthly_expenses(request):
     try:
         # Solo admins o un sistema automatizado deberían poder hacer esto
         # Por ahora lo dejamos manual para testing
-        PersonalExpense.cleanup_old_expenses()
+        # Se archiva y borra por lotes en segundo plano (ver archiving.py)
+        year, month = previous_month()
+        if not start_archive_job(year, month):
+            return Response({
+                'error': 'Ya hay una limpieza en curso'
+            }, status=status.HTTP_409_CONFLICT)
         
         return Response({
-            'message': 'Gastos del mes anterior eliminados exitosamente'
+            'message': 'Archivado y limpieza del mes anterior iniciados',
+            'year': year,
+            'month': month
         })
         
     except Exception as e:
@@ -779,39 +1090,160 @@ def cleanup_monthly_expenses(request):
             'error': 'Error al limpiar gastos antiguos'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-# NUEVO ENDPOINT: Obtener información de la casa actual
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
-def get_current_household_info(request):
+@read_replica
+@household_required
+def sync_household(request):
+    """Cambios de la casa desde el cursor since (sincronización incremental, ver sync.py)"""
     try:
-        profile = request.user.profile
-        if not profile.current_household:
-            return Response({
-                'error': 'No tienes una casa asignada'
-            }, status=status.HTTP_400_BAD_REQUEST)
+        return Response(changes_since(request, request.query_params.get('since')))
         
-        household = profile.current_household
-        serializer = HouseholdSerializer(household)
-        response_data = serializer.data
+    except InvalidCursor as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        logger.error(f"Error syncing household: {e}")
+        return Response({
+            'error': 'Error al sincronizar la casa'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def get_metrics(request):
+    """Métricas del proceso por vista en formato de texto de Prometheus (ver metrics.py)"""
+    if not metrics.enabled():
+        return Response({
+            'error': 'Las métricas no están activadas'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    try:
+        return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)
         
-        # Agregar información adicional
-        response_data['is_creator'] = (household.created_by == request.user)
-        response_data['creator_username'] = household.created_by.username
+    except Exception as e:
+        logger.error(f"Error rendering metrics: {e}")
+        return Response({
+            'error': 'Error al obtener las métricas'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@household_shard
+def batch_requests(request):
+    """Ejecuta varias operaciones de la API en una sola petición (ver batch.py)"""
+    try:
+        operations, atomic = batch.parse(request.data)
+    except batch.InvalidBatch as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        # Perfil y casa actual resueltos una vez y compartidos por todas las operaciones
+        profile = get_household_context(request)
+        if profile is not None:
+            request.user.profile = profile
         
-        # Obtener lista de miembros
-        members = household.members.all()
-        members_data = []
-        for member in members:
-            members_data.append({
-                'id': member.id,
-                'username': member.username,
-                'is_creator': (member == household.created_by),
-                'is_current_user': (member == request.user)
-            })
+        if atomic:
+            results, committed = batch.run_atomic(request, operations)
+            return Response({'responses': results, 'committed': committed})
+        return Response({'responses': batch.run(request, operations)})
         
-        response_data['members_detail'] = members_data
+    except Exception as e:
+        logger.error(f"Error running batch: {e}")
+        return Response({
+            'error': 'Error al ejecutar el lote'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@read_replica
+@household_required
+@conditional_list(
+    CollectionVersion.NEWS, CollectionVersion.TASKS, CollectionVersion.EXPENSES,
+    CollectionVersion.PERSONAL_EXPENSES, CollectionVersion.MEMBERS, time_bucket=60, monthly=True
+)
+def get_dashboard(request):
+    """Todo lo que muestra la pantalla de inicio en tres consultas, sin serializar listados"""
+    try:
+        now = timezone.now()
+        household = Household.get_dashboard(request.household.pk, request.user, now)
+        members = household.members.order_by().values('id', 'username')
+        upcoming_tasks = Task.objects.filter(
+            household=household,
+            assigned_to=request.user,
+            is_completed=False
+        ).order_by(*TASK_ORDERING).values('id', 'title', 'priority', 'due_datetime')[:DASHBOARD_UPCOMING_TASKS]
+        
+        household_data = HouseholdSerializer(household).data
+        household_data['is_creator'] = household.created_by_id == request.user.id
+        household_data['creator_username'] = household.created_by.username
+        
+        return Response({
+            'household': household_data,
+            'members': [
+                {
+                    **member,
+                    'is_creator': member['id'] == household.created_by_id,
+                    'is_current_user': member['id'] == request.user.id
+                }
+                for member in members
+            ],
+            'news': {
+                'urgent_count': household.urgent_news_count
+            },
+            'tasks': {
+                'open_count': household.open_task_count,
+                'overdue_count': household.overdue_task_count,
+                'upcoming': [
+                    {**task, 'is_overdue': task['due_datetime'] < now}
+                    for task in upcoming_tasks
+                ]
+            },
+            'expenses': {
+                'owed_count': household.owed_expense_count,
+                'owed_total': household.owed_total
+            },
+            'personal_expenses': {
+                'month': now.month,
+                'year': now.year,
+                'monthly_total': household.month_total,
+                'expense_count': household.month_expense_count
+            }
+        })
+        
+    except Exception as e:
+        logger.error(f"Error getting dashboard: {e}")
+        return Response({
+            'error': 'Error al obtener el resumen de la casa'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+# NUEVO ENDPOINT: Obtener información de la casa actual
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@read_replica
+@household_required
+def get_current_household_info(request):
+    try:
+        shared = response_cache.shared_payload(
+            request, 'household_info', (CollectionVersion.MEMBERS,), lambda: _household_info_payload(request)
+        )
+        return _household_info_response(request, shared)
         
-        return Response(response_data)
+    except Exception as e:
+        logger.error(f"Error getting household info: {e}")
+        return Response({
+            'error': 'Error al obtener información de la casa'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@async_variant(get_current_household_info, CollectionVersion.MEMBERS, conditional=False)
+async def get_current_household_info_async(request):
+    try:
+        shared = await response_cache.shared_payload_async(
+            request, 'household_info', (CollectionVersion.MEMBERS,), lambda: run_sync(_household_info_payload, request)
+        )
+        return _household_info_response(request, shared)
         
     except Exception as e:
         logger.error(f"Error getting household info: {e}")
@@ -819,18 +1251,38 @@ def get_current_household_info(request):
             'error': 'Error al obtener información de la casa'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+def _household_info_payload(request):
+    household = request.household
+    data = HouseholdSerializer(household).data
+    data['creator_username'] = household.created_by.username
+    data['members_detail'] = [
+        {
+            'id': member.id,
+            'username': member.username,
+            'is_creator': member.id == household.created_by_id
+        }
+        for member in household.members.all()
+    ]
+    return data
+
+def _household_info_response(request, shared):
+    # Agregar la información propia del usuario
+    household = request.household
+    response_data = {**shared, 'is_creator': household.created_by_id == request.user.id}
+    response_data['members_detail'] = [
+        {**member, 'is_current_user': member['id'] == request.user.id}
+        for member in shared['members_detail']
+    ]
+    
+    return Response(response_data)
+
 # NUEVO ENDPOINT: Salir de la casa
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@household_required
 def leave_household(request):
     try:
-        profile = request.user.profile
-        if not profile.current_household:
-            return Response({
-                'error': 'No tienes una casa asignada'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
-        household = profile.current_household
+        household = request.household
         
         # Verificar que no sea el creador
         if household.created_by == request.user:
@@ -842,8 +1294,8 @@ def leave_household(request):
         household.members.remove(request.user)
         
         # Limpiar el perfil del usuario
-        profile.current_household = None
-        profile.save()
+        request.profile.current_household = None
+        request.profile.save()
         
         return Response({
             'message': 'Has salido de la casa exitosamente'
@@ -858,15 +1310,10 @@ def leave_household(request):
 # NUEVO ENDPOINT: Eliminar casa (solo creador)
 @api_view(['DELETE'])
 @permission_classes([IsAuthenticated])
+@household_required
 def delete_household(request):
     try:
-        profile = request.user.profile
-        if not profile.current_household:
-            return Response({
-                'error': 'No tienes una casa asignada'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
-        household = profile.current_household
+        household = request.household
         
         # Verificar que sea el creador
         if household.created_by != request.user:
@@ -902,4 +1349,64 @@ def delete_household(request):
         logger.error(f"Error deleting household: {e}")
         return Response({
             'error': 'Error al eliminar la casa'
-        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+# NUEVO ENDPOINT: Eventos de cambios de la casa (Server-Sent Events, requiere ASGI)
+def _event_stream_context(request):
+    """Autentica con las clases de DRF y devuelve (usuario, id de casa) o una respuesta de error"""
+    for authentication_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        try:
+            result = authentication_class().authenticate(request)
+        except APIException as e:
+            return None, JsonResponse({'error': str(e.detail)}, status=status.HTTP_401_UNAUTHORIZED)
+        if result is not None:
+            request.user = result[0]
+            break
+    else:
+        return None, JsonResponse({
+            'error': 'Las credenciales de autenticación no se proveyeron.'
+        }, status=status.HTTP_401_UNAUTHORIZED)
+
+    profile = get_household_context(request)
+    if profile is None or profile.current_household_id is None:
+        return None, JsonResponse({
+            'error': 'No tienes una casa asignada'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    return (request.user, profile.current_household_id), None
+
+
+async def household_events(request):
+    """Transmite los eventos de cambios de la casa actual como text/event-stream"""
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Método no permitido'}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    context, error = await sync_to_async(_event_stream_context)(request)
+    if error is not None:
+        return error
+    user, household_id = context
+    options = getattr(settings, 'HOMI_EVENTS', {})
+    keepalive = options.get('KEEPALIVE', 15)
+
+    async def stream():
+        subscription = broker.subscribe(household_id)
+        try:
+            yield f'retry: {options.get("RETRY_MS", 5000)}\n\n'
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscription.queue.get(), keepalive)
+                except asyncio.TimeoutError:
+                    # Comentario SSE: mantiene viva la conexión a través de proxies
+                    yield ': keepalive\n\n'
+                    continue
+                yield format_event(message)
+                if message['type'] in (RESYNC, 'household.deleted'):
+                    break
+                if message['type'] == 'household.member_left' and message.get('user_id') == user.id:
+                    break
+        finally:
+            broker.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response